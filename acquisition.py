@@ -0,0 +1,63 @@
+import numpy as np
+from mirror_scan import is_phase
+
+# Per-scan acquisition profile: lock-in sampling time, settle delay after each
+# move and the number of samples per pixel with the reduction used to combine
+# them. The standard deviation of the samples is kept next to the result.
+# Phases (deg) are reduced as unit vectors, so that samples around +-180 deg
+# do not average to 0, and get the circular standard deviation.
+
+def trimmed_mean(samples, axis=0, proportion=0.1):
+    # Mean without the lowest and highest proportion of the samples
+    samples = np.sort(samples, axis=axis)
+    n = samples.shape[axis]
+    cut = int(proportion*n)
+    return np.mean(np.take(samples, range(cut, n-cut), axis=axis), axis=axis)
+
+reductions = {
+    'mean': np.mean,
+    'median': np.median,
+    'trimmed mean': trimmed_mean,
+}
+
+class acquisition_profile:
+    def __init__(self, sampling_time=50, settle_time=0, samples=1, reduction='mean'):
+        self.sampling_time = sampling_time      # ms, lock-in sampling time
+        self.settle_time = settle_time          # ms, wait after every move
+        self.samples = samples                  # samples per pixel
+        self.reduction = reduction
+
+    @classmethod
+    def from_dict(cls, values):
+        profile = cls()
+        for key, value in (values or {}).items():
+            if not hasattr(profile, key):
+                raise ValueError(f'Unknown acquisition setting: {key}')
+            setattr(profile, key, value)
+        if profile.reduction not in reductions:
+            raise ValueError(f'Unknown reduction: {profile.reduction}')
+        if not isinstance(profile.samples, int) or profile.samples < 1:
+            raise ValueError(f'samples must be a whole number of at least 1: {profile.samples}')
+        return profile
+
+    def as_dict(self):
+        return {'sampling_time': self.sampling_time, 'settle_time': self.settle_time,
+                'samples': self.samples, 'reduction': self.reduction}
+
+    def reduce(self, samples, channels=None):
+        # samples: (n, channels) -> value and standard deviation per channel;
+        # channels: names of the columns, to find the phases
+        samples = np.asarray(samples, dtype=float)
+        if samples.shape[0] == 1:
+            return samples[0], np.zeros(samples.shape[1])
+        reduction = reductions[self.reduction]
+        values, std = reduction(samples, axis=0), np.std(samples, axis=0)
+        phases = np.array([is_phase(name) for name in channels or []], dtype=bool)
+        if phases.any():
+            angles = np.radians(samples[:,phases])
+            cos, sin = np.cos(angles), np.sin(angles)
+            values[phases] = np.degrees(np.arctan2(reduction(sin, axis=0), reduction(cos, axis=0)))
+            # Length of the mean phasor: 1 for equal phases
+            length = np.hypot(cos.mean(axis=0), sin.mean(axis=0))
+            std[phases] = np.degrees(np.sqrt(-2*np.log(np.clip(length, 1e-12, 1))))
+        return values, std
@@ -0,0 +1,312 @@
+import os
+import sys
+import argparse
+import datetime
+import logging
+import yaml
+from mirror_scan import mirror_scan, default_channels, std_channels, sparse_channels, channel_registry
+from acquisition import acquisition_profile
+from scan_paths import scan_paths
+from focus_search import find_peak
+from scan_engine import Worker
+from motion_profile import motion_profile
+import scan_io
+from nea_session import nea_session
+from PySide6.QtCore import Qt
+
+# Headless batch runner
+#
+# Scan recipes are YAML files in the recipes folder next to config.yaml. A
+# recipe holds a list of scans and optional defaults for all of them; sizes
+# and steps are given in μm like in the GUI:
+#
+#   defaults:
+#     mode: step                # step, fly or adaptive
+#     path: Serpentine
+#     acquisition: {sampling_time: 50, samples: 1}
+#   scans:
+#     - name: coarse
+#       size: [20, 20, 0]
+#       step: [1, 1, 1]
+#
+# Adding a recipe appends one job per scan to the persistent queue
+# (<batch_folder>/queue.yaml). Running the queue measures the pending jobs one
+# after the other with the same Worker as the GUI, streaming every scan to
+# <batch_folder>/results and its status messages to <batch_folder>/logs.
+# Step and fly scans of interrupted jobs continue from their first incomplete
+# row when the job is run again.
+#
+#   python batch_scan.py add recipes/example.yaml
+#   python batch_scan.py run
+#   python batch_scan.py list
+
+scan_defaults = {
+    'name': 'scan',
+    'mode': 'step',
+    'size': [10, 10, 0],        # μm
+    'step': [1, 1, 1],          # μm
+    'path': 'Serpentine',
+    'channels': None,           # default: all, with std channels when oversampling
+    'acquisition': {},
+    'fly_velocity': 5,          # μm/s
+    'sparse': None,             # fraction of the pixels measured by step scans
+    'focus_channel': 'O3A',
+    'resolution': 0.1,          # μm
+}
+modes = ['step', 'fly', 'adaptive']
+
+class batch_queue:
+    def __init__(self, folder):
+        self.folder = folder
+        self.fname = os.path.join(folder, 'queue.yaml')
+        self.results = os.path.join(folder, 'results')
+        self.logs = os.path.join(folder, 'logs')
+        for path in (self.folder, self.results, self.logs):
+            os.makedirs(path, exist_ok=True)
+
+    def load(self):
+        if not os.path.exists(self.fname):
+            return []
+        with open(self.fname, 'r') as file:
+            return yaml.safe_load(file) or []
+
+    def save(self, jobs):
+        # Written to a temporary file first so that an interrupted run never
+        # leaves a truncated queue
+        with open(self.fname + '.tmp', 'w') as file:
+            yaml.safe_dump(jobs, file, sort_keys=False)
+        os.replace(self.fname + '.tmp', self.fname)
+
+    def add(self, recipe_file):
+        scans = read_recipe(recipe_file)
+        jobs = self.load()
+        next_id = max([job['id'] for job in jobs], default=0) + 1
+        added = []
+        for n, scan in enumerate(scans):
+            job_id = next_id + n
+            stem = f'{job_id:04d}_{scan["name"]}'
+            added.append({'id': job_id, 'name': scan['name'], 'recipe': os.path.abspath(recipe_file),
+                          'status': 'pending', 'scan': scan,
+                          'added': datetime.datetime.now().isoformat(),
+                          'started': None, 'finished': None,
+                          'result': os.path.join(self.results, stem),
+                          'log': os.path.join(self.logs, stem + '.log'),
+                          'error': None})
+        self.save(jobs + added)
+        return added
+
+    def update(self, job_id, **values):
+        # Jobs may be added while the queue runs, so it is read again
+        jobs = self.load()
+        for job in jobs:
+            if job['id'] == job_id:
+                job.update(values)
+        self.save(jobs)
+
+    def next_pending(self):
+        for job in self.load():
+            if job['status'] == 'pending':
+                return job
+        return None
+
+    def set_status(self, statuses, status):
+        jobs = self.load()
+        count = 0
+        for job in jobs:
+            if job['status'] in statuses:
+                job['status'] = status
+                count += 1
+        self.save(jobs)
+        return count
+
+def read_recipe(fname):
+    with open(fname, 'r') as file:
+        recipe = yaml.safe_load(file) or {}
+    defaults = dict(scan_defaults)
+    defaults.update(recipe.get('defaults') or {})
+    scans = []
+    for entry in recipe.get('scans') or []:
+        scan = dict(defaults)
+        scan.update(entry)
+        check_scan(scan)
+        scans.append(scan)
+    if not scans:
+        raise ValueError(f'{fname}: no scans in recipe')
+    return scans
+
+def check_scan(scan):
+    for key in scan:
+        if key not in scan_defaults:
+            raise ValueError(f'{scan["name"]}: unknown scan setting: {key}')
+    if scan['mode'] not in modes:
+        raise ValueError(f'{scan["name"]}: unknown mode: {scan["mode"]}')
+    if scan['path'] not in scan_paths:
+        raise ValueError(f'{scan["name"]}: unknown path: {scan["path"]}')
+    if scan['sparse'] is not None and not 0 < scan['sparse'] <= 1:
+        raise ValueError(f'{scan["name"]}: sparse must be a fraction between 0 and 1')
+    for name in scan['channels'] or []:
+        if name not in channel_registry or channel_registry[name]['kind'] == 'error':
+            raise ValueError(f'{scan["name"]}: unknown channel: {name}')
+    # Raises on bad sizes or acquisition settings
+    scan_map, profile = build_scan(scan)
+    if scan_map.Nx < 1 or scan_map.Ny < 1:
+        raise ValueError(f'{scan["name"]}: scan size is smaller than the step size')
+
+def build_scan(scan, optical_dtype='float32'):
+    # Scan map and acquisition profile of a queued scan, as MainWindow.start_scan
+    profile = acquisition_profile.from_dict(scan['acquisition'])
+    channels = scan['channels']
+    if channels is None:
+        channels = default_channels
+        if profile.samples > 1 and scan['mode'] != 'fly':
+            channels = default_channels + std_channels
+    else:
+        # Positions are always recorded
+        channels = ['X', 'Y', 'Z'] + [name for name in channels if name not in ('X', 'Y', 'Z')]
+    if sparse(scan):
+        # Confidence of the reconstructed pixels
+        channels = channels + [name for name in sparse_channels if name not in channels]
+    scan_map = mirror_scan(channels, optical_dtype=optical_dtype)
+    scan_map.sizeX, scan_map.sizeY, scan_map.sizeZ = [float(value)*1000 for value in scan['size']]  # in nm
+    scan_map.step_sizeX, scan_map.step_sizeY, scan_map.step_sizeZ = [float(value)*1000 for value in scan['step']]
+    scan_map.recalc_size()
+    return scan_map, profile
+
+def sparse(scan):
+    # Fraction of a sparse step scan, None for full scans
+    if scan['mode'] != 'step' or scan.get('sparse') is None or scan['sparse'] >= 1:
+        return None
+    return scan['sparse']
+
+def connect(config, log=print):
+    # Connection session of the microscope or the simulation, with the
+    # worker's scans pausing while the link is down
+    session = nea_session(config)
+    # Called in the session thread, there is no event loop
+    session.message.connect(log, Qt.DirectConnection)
+    session.start()
+    if session.wait_online() is None:
+        raise ConnectionError('Connection refused or timeout. Retry to connect again.')
+    return session
+
+def job_logger(job):
+    logger = logging.getLogger(f'batch_scan.{job["id"]}')
+    logger.setLevel(logging.INFO)
+    handler = logging.FileHandler(job['log'])
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    logger.addHandler(handler)
+    logger.addHandler(logging.StreamHandler(sys.stdout))
+    return logger
+
+def close_logger(logger):
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
+
+def load_checkpoint(job):
+    # Rows already measured by an interrupted run of the job, None if the
+    # job has to start over
+    if job['scan']['mode'] == 'adaptive' or not os.path.exists(scan_io.metadata_name(job['result'])):
+        return None
+    try:
+        return scan_io.load_checkpoint(job['result'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def run_job(worker, job, config):
+    scan = job['scan']
+    checkpoint = load_checkpoint(job)
+    if checkpoint is not None:
+        scan_map, metadata, completed = checkpoint
+        profile = acquisition_profile.from_dict(metadata.get('acquisition'))
+    else:
+        scan_map, profile = build_scan(scan, config.get('optical_dtype', 'float32'))
+        scan_map.create_array()
+    worker.scan_map = scan_map
+    worker.scan_path = scan['path']
+    worker.profile = profile
+    worker.save_name = job['result']
+    worker.resume = checkpoint is not None
+    worker.files = []
+    worker.focus_channel = scan['focus_channel']
+    worker.sparse_fraction = sparse(scan)
+    if scan['mode'] == 'adaptive':
+        worker.focus_resolution = scan['resolution']*1000 #in nm
+        worker.do_adaptive_scan()
+        index, position, value = find_peak(worker.scan_levels[-1], worker.focus_channel)
+        return {'levels': len(worker.scan_levels), 'peak': [float(v) for v in position], 'peak_value': float(value)}
+    if scan['mode'] == 'fly':
+        worker.fly_velocity = scan['fly_velocity']*1000 #in nm/s
+        worker.do_fly_scan()
+    else:
+        worker.do_scan()
+    return {}
+
+def run_queue(queue, config):
+    session = connect(config)
+    worker = Worker()
+    worker.session = session
+    worker.use_connection(session.handles)
+    worker.pipelined = config.get('pipelined_moves', True)
+    worker.motion = motion_profile.from_config(config.get('motion'))
+    # Jobs still marked as running were stopped without cleaning up
+    queue.set_status(['running'], 'interrupted')
+    while True:
+        job = queue.next_pending()
+        if job is None:
+            break
+        logger = job_logger(job)
+        worker.status_update.connect(logger.info)
+        queue.update(job['id'], status='running', started=datetime.datetime.now().isoformat(), error=None)
+        logger.info(f'Job {job["id"]} ({job["name"]}): {job["scan"]}')
+        try:
+            summary = run_job(worker, job, config)
+        except KeyboardInterrupt:
+            worker.close_writer(failed=True)
+            logger.info('Interrupted')
+            queue.update(job['id'], status='interrupted', finished=datetime.datetime.now().isoformat())
+            raise
+        except Exception as error:
+            worker.close_writer(failed=True)
+            logger.exception(f'Job {job["id"]} failed')
+            queue.update(job['id'], status='failed', finished=datetime.datetime.now().isoformat(), error=repr(error))
+        else:
+            logger.info(f'Job {job["id"]} done: {job["result"]}')
+            queue.update(job['id'], status='done', finished=datetime.datetime.now().isoformat(), **summary)
+        finally:
+            worker.status_update.disconnect(logger.info)
+            close_logger(logger)
+    session.stop()
+
+def print_queue(queue):
+    for job in queue.load():
+        print(f'{job["id"]:4d}  {job["status"]:<11} {job["scan"]["mode"]:<8} {job["name"]:<20} {job["recipe"]}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run queued mirror scans without the GUI')
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='queue the scans of recipe files')
+    add.add_argument('recipes', nargs='+')
+    commands.add_parser('run', help='measure all pending jobs')
+    commands.add_parser('list', help='show the queue')
+    commands.add_parser('retry', help='queue failed and interrupted jobs again')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as file:
+        config = yaml.safe_load(file)
+    base = os.path.dirname(os.path.abspath(args.config))
+    queue = batch_queue(os.path.join(base, config.get('batch_folder', 'batch')))
+
+    if args.command == 'add':
+        for fname in args.recipes:
+            if not os.path.exists(fname) and os.path.exists(os.path.join(base, 'recipes', fname)):
+                fname = os.path.join(base, 'recipes', fname)
+            for job in queue.add(fname):
+                print(f'Queued job {job["id"]}: {job["name"]}')
+    elif args.command == 'run':
+        run_queue(queue, config)
+    elif args.command == 'list':
+        print_queue(queue)
+    elif args.command == 'retry':
+        print(f'{queue.set_status(["failed", "interrupted"], "pending")} jobs queued again')
@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import datetime
+import numpy as np
+from mirror_scan import mirror_scan, default_channels, mechanical_channels
+from scan_paths import grid_axes
+from acquisition import acquisition_profile
+import scan_io
+import nea_sim
+import focus_analysis
+import regrid
+import sparse_scan
+from pixel_ring import pixel_ring
+from motion_profile import motion_profile
+
+# Benchmark suite
+#
+#   io       save and load of synthetic scans (binary .npy and text .dat,
+#            scan_io functions and the MainWindow load_data/save_data slots)
+#   render   set_display_data + update_image per frame (first_frame: the
+#            first frame of a map, with the plane statistics of the whole
+#            stack) and scrolling through the Z planes of the loaded map
+#   analysis focus analysis of one channel, regridding of one channel
+#            onto the nominal grid and the reconstruction of a sparse scan
+#            of 25% of the pixels
+#   scan     pixels per second of the Worker scan loops on the simulated
+#            microscope, once without latencies (software overhead) and once
+#            with the latencies of nea_sim.default_settings or --sim values;
+#            step_motion uses the default motion profile, step_sparse
+#            measures 25% of the pixels (pixels per second of the map)
+#   startup  startup_benchmark.py
+#
+# Results are written to a JSON report. With --compare the medians are
+# compared to an earlier report, matched by the record names.
+#
+#   python benchmarks.py --output report.json
+#   python benchmarks.py --quick --compare report.json
+
+default_sizes = ['50x50x1', '100x100x10', '250x250x20', '500x500x50']
+quick_sizes = ['50x50x1', '100x100x10']
+# .dat export and parsing are only measured up to this number of pixels
+dat_limit = 1000000
+
+def parse_size(text):
+    Nx, Ny, Nz = [int(n) for n in text.lower().split('x')]
+    return Nx, Ny, Nz
+
+def synthetic_scan(Nx, Ny, Nz, optical_dtype='float32', seed=0):
+    # Gaussian focus spot with noise on a 100 nm grid, positions with
+    # encoder noise, every optical channel filled
+    scan_map = mirror_scan(default_channels, optical_dtype)
+    scan_map.step_sizeX = scan_map.step_sizeY = scan_map.step_sizeZ = 100.0
+    scan_map.sizeX, scan_map.sizeY = Nx*100.0, Ny*100.0
+    scan_map.sizeZ = Nz*100.0 if Nz > 1 else 0
+    scan_map.recalc_size()
+    scan_map.create_array()
+    scan_map.center_point = [0.0, 0.0, 0.0]
+    rng = np.random.default_rng(seed)
+    xs, ys, zs = grid_axes(scan_map)
+    for idz, z in enumerate(zs):
+        scan_map.X[idz] = xs[None,:] + rng.normal(0, 5, (Ny, Nx))
+        scan_map.Y[idz] = ys[:,None] + rng.normal(0, 5, (Ny, Nx))
+        scan_map.Z[idz] = z + rng.normal(0, 5, (Ny, Nx))
+        w = 0.3*scan_map.sizeX*np.sqrt(1 + (z/max(scan_map.sizeZ, 1))**2)
+        spot = np.exp(-2*(xs[None,:]**2 + ys[:,None]**2)/w**2)
+        for order, name in enumerate(scan_map.optical):
+            getattr(scan_map, name)[idz] = spot*10.0**(-(order % 6)) + rng.normal(0, 1e-3, (Ny, Nx))
+    return scan_map
+
+def measure(function, repeat):
+    # Median and minimum wall time of repeated calls
+    times = []
+    for n in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'seconds': statistics.median(times), 'min': min(times), 'runs': repeat}
+
+def record(results, name, timing, **values):
+    entry = {'name': name}
+    entry.update(timing)
+    entry.update(values)
+    results.append(entry)
+    print(f'  {name:<40} {entry["seconds"]*1000:10.2f} ms' + ''.join(f'  {key}={value}' for key, value in values.items()))
+
+def io_benchmarks(results, sizes, folder, repeat, window=None):
+    for size in sizes:
+        Nx, Ny, Nz = parse_size(size)
+        scan_map = synthetic_scan(Nx, Ny, Nz)
+        pixels = Nx*Ny*Nz
+        runs = repeat if pixels <= dat_limit else 1
+        fname = os.path.join(folder, f'bench_{size}')
+        record(results, f'io/save_npy/{size}', measure(lambda: scan_io.save_scan(fname + '.npy', scan_map), runs),
+               pixels=pixels, mbytes=round(scan_map.nbytes()/1e6, 1))
+        record(results, f'io/load_npy/{size}', measure(lambda: scan_io.load_scan(fname + '.npy'), runs), pixels=pixels)
+        record(results, f'io/load_npy_mmap/{size}', measure(lambda: scan_io.load_scan(fname + '.npy', mmap=True), runs), pixels=pixels)
+        if pixels <= dat_limit:
+            record(results, f'io/export_dat/{size}', measure(lambda: scan_io.export_dat(fname + '.dat', scan_map), runs), pixels=pixels)
+            record(results, f'io/load_dat/{size}', measure(lambda: scan_io.load_dat(fname + '.dat', cache=False), runs), pixels=pixels)
+            scan_io.load_dat(fname + '.dat')
+            record(results, f'io/load_dat_cached/{size}', measure(lambda: scan_io.load_dat(fname + '.dat'), runs), pixels=pixels)
+        if window is not None:
+            gui_io_benchmarks(results, window, scan_map, size, fname, folder, runs)
+        del scan_map
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder, name))
+
+def gui_io_benchmarks(results, window, scan_map, size, fname, folder, runs):
+    # load_data includes displaying the first plane, save_data writes to the
+    # working directory
+    window.file_name = fname + '.npy'
+    record(results, f'gui/load_data_npy/{size}', measure(window.load_data, runs), pixels=scan_map.Nx*scan_map.Ny*scan_map.Nz)
+    window.loaded_map = None
+    window.mirror_map = scan_map
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        window.saveFormat_comboBox.setCurrentText('Binary (.npy)')
+        record(results, f'gui/save_data_npy/{size}', measure(window.save_data, runs), pixels=scan_map.Nx*scan_map.Ny*scan_map.Nz)
+    finally:
+        os.chdir(cwd)
+    window.mirror_map = None
+
+def render_benchmarks(results, sizes, window, app, frames):
+    for size in sizes:
+        Nx, Ny, Nz = parse_size(size)
+        scan_map = synthetic_scan(Nx, Ny, Nz)
+        window.loaded_map = scan_map
+        window.mirror_map = None
+        window.currentZindex = 0
+        def frame():
+            window.set_display_data(scan_map)
+            window.update_image()
+            app.processEvents()
+        record(results, f'render/display_frame/{size}', measure(frame, frames), pixels=Nx*Ny)
+        def first_frame():
+            # Without the plane statistics of the display cache
+            window.display_cache.clear()
+            frame()
+        record(results, f'render/first_frame/{size}', measure(first_frame, frames), pixels=Nx*Ny*Nz)
+        if Nz > 1:
+            window.datascroll_spinBox.setRange(0, Nz-1)
+            planes = iter(np.arange(frames) % Nz)
+            def scroll():
+                window.datascroll_spinBox.setValue(int(next(planes)))
+                app.processEvents()
+            record(results, f'render/scroll_plane/{size}', measure(scroll, frames), pixels=Nx*Ny)
+        window.loaded_map = None
+        del scan_map
+
+zero_latency = {'move_latency': 0, 'settle_time': 0, 'refresh_latency': 0, 'readout_latency': 0,
+                'velocity': 1e9, 'encoder_noise': 0, 'positioning_error': 0, 'seed': 0}
+
+def analysis_benchmarks(results, sizes, repeat):
+    for size in sizes:
+        Nx, Ny, Nz = parse_size(size)
+        scan_map = synthetic_scan(Nx, Ny, Nz)
+        pixels = Nx*Ny*Nz
+        runs = repeat if pixels <= dat_limit else 1
+        record(results, f'analysis/focus/{size}', measure(lambda: focus_analysis.analyse(scan_map, 'O1A'), runs), pixels=pixels)
+        record(results, f'analysis/regrid/{size}', measure(lambda: regrid.regrid(scan_map, ['O1A']), runs), pixels=pixels)
+        mask = sparse_scan.sample_mask(Nz, Ny, Nx, 0.25)
+        record(results, f'analysis/sparse_reconstruct/{size}', measure(lambda: sparse_scan.reconstruct(scan_map, mask), runs), pixels=pixels)
+        del scan_map
+
+def scan_worker(settings, Nx, Ny, profile):
+    from scan_engine import Worker
+    context, nea, motors = nea_sim.connect(settings)
+    worker = Worker()
+    worker.context = context
+    worker.nea = nea
+    worker.motors = motors
+    worker.Vector3D = nea.Geometry.Vector3D
+    worker.profile = profile
+    worker.scan_path = 'Serpentine'
+    scan_map = mirror_scan(default_channels)
+    # 1 μm steps, well above the simulated positioning error
+    scan_map.sizeX, scan_map.sizeY, scan_map.sizeZ = Nx*1000.0, Ny*1000.0, 0
+    scan_map.step_sizeX = scan_map.step_sizeY = scan_map.step_sizeZ = 1000.0
+    scan_map.recalc_size()
+    scan_map.create_array()
+    worker.scan_map = scan_map
+    return worker
+
+def scan_benchmarks(results, latency_profiles, Nx, Ny, folder):
+    # Timed from the start of the scan slot to the last completed row, so
+    # the pause and the move back to the center at the end are not included
+    profile = acquisition_profile(sampling_time=1)
+    for profile_name, settings in latency_profiles.items():
+        for mode in ('step', 'step_unpipelined', 'step_motion', 'step_sparse', 'fly'):
+            worker = scan_worker(settings, Nx, Ny, profile)
+            worker.pipelined = mode != 'step_unpipelined'
+            if mode == 'step_motion':
+                # Velocities and settle detection of motion_profile.default_settings
+                worker.motion = motion_profile()
+            if mode == 'step_sparse':
+                worker.sparse_fraction = 0.25
+            worker.save_name = os.path.join(folder, f'bench_scan_{mode}')
+            worker.fly_velocity = 1e9 if profile_name == 'overhead' else settings.get('velocity', 20000)/4
+            stamps = []
+            # The pixels are pushed into a ring buffer as for the GUI
+            worker.ring = pixel_ring([name for name in worker.scan_map.channels if name not in mechanical_channels], Nx*Ny)
+            worker.progress.connect(lambda idz, idy: stamps.append(time.perf_counter()))
+            start = time.perf_counter()
+            if mode == 'fly':
+                worker.do_fly_scan()
+            else:
+                worker.do_scan()
+            pixels = Nx*Ny
+            loop = stamps[-1] - start
+            entry = {'seconds': loop, 'min': loop, 'runs': 1}
+            record(results, f'scan/{mode}/{profile_name}', entry, pixels=pixels,
+                   pixels_per_second=round(pixels/loop, 1), ms_per_pixel=round(loop/pixels*1000, 3))
+            scan_io.remove_scan(worker.save_name)
+
+def startup_benchmarks(results, runs):
+    import startup_benchmark
+    report = startup_benchmark.benchmark(runs)
+    for key in ('engine_import', 'qt_init', 'app_import', 'window', 'startup'):
+        record(results, f'startup/{key}', {'seconds': report[key], 'min': report[key], 'runs': runs})
+
+def environment():
+    values = {'timestamp': datetime.datetime.now().isoformat(), 'python': platform.python_version(),
+              'numpy': np.__version__, 'platform': platform.platform(), 'processor': platform.processor(),
+              'cpus': os.cpu_count()}
+    try:
+        import PySide6, pyqtgraph
+        values['pyside6'] = PySide6.__version__
+        values['pyqtgraph'] = pyqtgraph.__version__
+    except ImportError:
+        pass
+    try:
+        folder = os.path.dirname(os.path.abspath(__file__))
+        values['version'] = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=folder,
+                                           capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        values['version'] = None
+    return values
+
+def compare(report, fname):
+    # Ratio new/old of the median times of records present in both reports
+    with open(fname, 'r') as file:
+        old = {entry['name']: entry for entry in json.load(file)['results']}
+    print(f'\nCompared to {fname}:')
+    for entry in report['results']:
+        if entry['name'] in old and old[entry['name']]['seconds'] > 0:
+            ratio = entry['seconds']/old[entry['name']]['seconds']
+            flag = '  slower' if ratio > 1.2 else '  faster' if ratio < 1/1.2 else ''
+            print(f'  {entry["name"]:<40} {ratio:6.2f}x{flag}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark loading, saving, rendering and scanning')
+    parser.add_argument('--output', default='benchmark_report.json')
+    parser.add_argument('--sizes', nargs='+', help='NxxNyxNz, default: ' + ' '.join(default_sizes))
+    parser.add_argument('--quick', action='store_true', help='only ' + ' '.join(quick_sizes) + ' and a small scan')
+    parser.add_argument('--only', nargs='+', choices=['io', 'render', 'analysis', 'scan', 'startup'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--scan-size', default='20x20', help='NxxNy of the scan loop benchmark')
+    parser.add_argument('--sim', nargs='*', default=[], metavar='KEY=VALUE',
+                        help='latencies of the simulated microscope, see nea_sim.default_settings')
+    parser.add_argument('--compare', help='earlier report')
+    args = parser.parse_args()
+
+    sizes = args.sizes or (quick_sizes if args.quick else default_sizes)
+    only = args.only or ['io', 'render', 'analysis', 'scan', 'startup']
+    Nx, Ny = [int(n) for n in args.scan_size.lower().split('x')]
+    if args.quick:
+        Nx, Ny = min(Nx, 10), min(Ny, 10)
+    settings = {'seed': 0}
+    for item in args.sim:
+        key, _, value = item.partition('=')
+        if key not in nea_sim.default_settings:
+            parser.error(f'unknown simulation setting: {key}')
+        settings[key] = float(value)
+
+    report = {'environment': environment(), 'settings': {'sizes': sizes, 'repeat': args.repeat, 'frames': args.frames,
+              'scan_size': [Nx, Ny], 'simulation': dict(nea_sim.default_settings, **settings)}, 'results': []}
+    results = report['results']
+
+    window = None
+    if 'io' in only or 'render' in only:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PySide6.QtWidgets import QApplication
+        import mirrorApp
+        app = QApplication.instance() or QApplication(sys.argv)
+        config = mirrorApp.load_config()
+        config['simulation'] = {'enabled': False}
+        window = mirrorApp.MainWindow(config)
+        window.show()
+        app.processEvents()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if 'io' in only:
+            print('Save and load')
+            io_benchmarks(results, sizes, folder, args.repeat, window)
+        if 'render' in only:
+            print('Rendering')
+            render_benchmarks(results, sizes, window, app, args.frames)
+        if 'analysis' in only:
+            print('Analysis')
+            analysis_benchmarks(results, sizes, args.repeat)
+        if 'scan' in only:
+            print(f'Scan loop, {Nx}x{Ny} pixels')
+            scan_benchmarks(results, {'overhead': zero_latency, 'simulated': settings}, Nx, Ny, folder)
+    if 'startup' in only:
+        print('Startup')
+        startup_benchmarks(results, args.repeat)
+
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'Report written to {args.output}')
+    if args.compare:
+        compare(report, args.compare)
+    if window is not None:
+        # Stops the worker and motion threads
+        window.close()
@@ -0,0 +1,112 @@
+import warnings
+import numpy as np
+from collections import OrderedDict
+
+# Display cache of the GUI. For every channel of a complete map that is shown
+# it keeps:
+#   statistics  minimum, maximum and percentiles of every Z plane and of the
+#               whole stack, computed once. Percentiles are taken from a
+#               strided sample of at most sample_pixels per plane.
+#   planes      the recently shown planes as contiguous arrays (also for
+#               memory-mapped files), least recently used dropped first
+#   pyramid     planes averaged over 2x2 pixels per level, shown instead of
+#               the full plane when several image pixels fall on one screen
+#               pixel
+# Maps are identified by the object, so a map must not be changed while it is
+# cached; the live map of a running scan is displayed without the cache.
+
+percentiles = [1, 99]
+sample_pixels = 4096
+max_planes = 32
+max_channels = 8
+colour_scales = ['Plane', 'Stack', 'Stack 1-99%']
+
+def downsample(image):
+    # Mean of 2x2 pixels, the last row or column repeated for odd sizes
+    if image.shape[0] % 2:
+        image = np.concatenate([image, image[-1:]], axis=0)
+    if image.shape[1] % 2:
+        image = np.concatenate([image, image[:,-1:]], axis=1)
+    height, width = image.shape
+    return image.reshape(height//2, 2, width//2, 2).mean(axis=(1, 3))
+
+class channel_cache:
+    def __init__(self, scan_map, channel):
+        self.scan_map = scan_map
+        self.channel = channel
+        self.data = getattr(scan_map, channel)
+        flat = np.asarray(self.data).reshape(self.data.shape[0], -1)
+        # fmin/fmax skip NaN (unmeasured pixels); all-NaN planes give NaN
+        self.minimum = np.fmin.reduce(flat, axis=1).astype(float)
+        self.maximum = np.fmax.reduce(flat, axis=1).astype(float)
+        sample = flat[:,::-(-flat.shape[1]//sample_pixels)].astype(float)
+        if np.all(np.isfinite(self.minimum)) and not np.isnan(sample).any():
+            self.percentiles = np.percentile(sample, percentiles, axis=1)
+            self.stack_percentiles = np.percentile(sample, percentiles)
+        else:
+            with warnings.catch_warnings():
+                # All-NaN planes
+                warnings.simplefilter('ignore', RuntimeWarning)
+                self.percentiles = np.nanpercentile(sample, percentiles, axis=1)
+                self.stack_percentiles = np.nanpercentile(sample, percentiles)
+        self.planes = OrderedDict()
+
+    def levels(self, index, scale='Plane'):
+        # Colour scale of plane index, None when it holds no values
+        if scale == 'Stack':
+            low, high = np.fmin.reduce(self.minimum), np.fmax.reduce(self.maximum)
+        elif scale == 'Stack 1-99%':
+            low, high = self.stack_percentiles
+        else:
+            low, high = self.minimum[index], self.maximum[index]
+        if not (np.isfinite(low) and np.isfinite(high)):
+            return None
+        return float(low), float(high)
+
+    def max_level(self):
+        # Coarsest pyramid level with at least 2 pixels along both axes
+        level = 0
+        while min(self.data.shape[1], self.data.shape[2]) >> (level + 1) >= 2:
+            level += 1
+        return level
+
+    def plane(self, index, level=0):
+        key = (index, level)
+        if key in self.planes:
+            self.planes.move_to_end(key)
+            return self.planes[key]
+        if level == 0:
+            image = np.ascontiguousarray(self.data[index])
+        else:
+            image = downsample(self.plane(index, level - 1))
+        self.planes[key] = image
+        while len(self.planes) > max_planes:
+            self.planes.popitem(last=False)
+        return image
+
+class display_cache:
+    def __init__(self):
+        self.channels = OrderedDict()
+
+    def get(self, scan_map, channel):
+        # channel_cache of a map, made on first use
+        key = (id(scan_map), channel)
+        entry = self.channels.get(key)
+        if entry is None or entry.scan_map is not scan_map:
+            entry = channel_cache(scan_map, channel)
+            self.channels[key] = entry
+            while len(self.channels) > max_channels:
+                self.channels.popitem(last=False)
+        self.channels.move_to_end(key)
+        return entry
+
+    def clear(self):
+        self.channels.clear()
+
+def pyramid_level(entry, image_pixel, screen_pixel):
+    # Level at which one image pixel is at least one screen pixel; sizes in
+    # the same unit along X and Y
+    ratio = min(screen_pixel[0]/image_pixel[0], screen_pixel[1]/image_pixel[1])
+    if not np.isfinite(ratio) or ratio < 2:
+        return 0
+    return int(min(np.floor(np.log2(ratio)), entry.max_level()))
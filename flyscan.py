@@ -0,0 +1,48 @@
+import numpy as np
+
+# Sample rows recorded during a fly-scan row are [t, X, Y, Z, channels...]
+
+def row_edges(xs, step):
+    # Bin edges halfway between the nominal pixel positions of a row
+    xs = np.asarray(xs, dtype=float)
+    if xs.size == 1:
+        return np.array([xs[0] - step/2, xs[0] + step/2])
+    mids = (xs[1:] + xs[:-1])/2
+    return np.concatenate(([xs[0] - (xs[1]-xs[0])/2], mids, [xs[-1] + (xs[-1]-xs[-2])/2]))
+
+def bin_row(samples, xs, step, nchannels):
+    # Average timestamped samples of one continuous row onto the nominal X grid.
+    # Returns the mean positions (N,3), mean channel values (N,nchannels) and the
+    # number of samples that fell in each pixel. Pixels without samples are
+    # linearly interpolated from the neighbouring samples along X.
+    samples = np.asarray(samples, dtype=float).reshape(-1, 4 + nchannels)
+    xs = np.asarray(xs, dtype=float)
+    N = xs.size
+    if samples.shape[0] == 0:
+        positions = np.full((N, 3), np.nan)
+        positions[:,0] = xs
+        return positions, np.full((N, nchannels), np.nan), np.zeros(N, dtype=int)
+    edges = row_edges(xs, step)
+    if edges[0] > edges[-1]:
+        # Row recorded in negative X direction
+        idx = N - np.digitize(samples[:,1], edges[::-1])
+    else:
+        idx = np.digitize(samples[:,1], edges) - 1
+    valid = (idx >= 0) & (idx < N)
+    counts = np.bincount(idx[valid], minlength=N)
+
+    values = samples[:,1:]
+    binned = np.empty((N, values.shape[1]))
+    filled = counts > 0
+    for col in range(values.shape[1]):
+        sums = np.bincount(idx[valid], weights=values[valid,col], minlength=N)
+        binned[filled,col] = sums[filled]/counts[filled]
+
+    if not np.all(filled):
+        order = np.argsort(samples[:,1])
+        sx = samples[order,1]
+        binned[~filled,0] = xs[~filled]
+        for col in range(1, values.shape[1]):
+            binned[~filled,col] = np.interp(xs[~filled], sx, values[order,col])
+
+    return binned[:,:3], binned[:,3:], counts
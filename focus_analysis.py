@@ -0,0 +1,149 @@
+import numpy as np
+from scan_paths import grid_axes
+
+# Focus spot analysis of a scan, all Z planes at once. Per plane:
+#   peak       maximum value and its position
+#   centroid   intensity weighted center (background = plane minimum)
+#   moments    second moments of the same weights, given as FWHM along X and
+#              Y and along the principal axes with their angle
+#   fit        2D Gaussian fitted to the pixels above fit_threshold of the
+#              peak by weighted linear least squares on the logarithm
+# and the best focus: the plane with the highest fitted amplitude, refined
+# between planes with a parabola through the peak values. Positions are in nm
+# relative to the scan center, like grid_axes.
+
+fwhm_factor = 2*np.sqrt(2*np.log(2))
+fit_threshold = 0.2
+plane_keys = ['peak', 'peak_x', 'peak_y', 'centroid_x', 'centroid_y',
+              'fwhm_x', 'fwhm_y', 'fwhm_major', 'fwhm_minor', 'angle',
+              'fit_amplitude', 'fit_x', 'fit_y', 'fit_fwhm_major', 'fit_fwhm_minor', 'fit_angle']
+
+def ellipse(cov_xx, cov_yy, cov_xy):
+    # FWHM along the principal axes and angle (deg) of the major axis of
+    # stacked 2x2 covariance matrices
+    mean = (cov_xx + cov_yy)/2
+    diff = np.sqrt(((cov_xx - cov_yy)/2)**2 + cov_xy**2)
+    major = fwhm_factor*np.sqrt(np.maximum(mean + diff, 0))
+    minor = fwhm_factor*np.sqrt(np.maximum(mean - diff, 0))
+    angle = np.degrees(np.arctan2(2*cov_xy, cov_xx - cov_yy)/2)
+    return major, minor, angle
+
+def moments(data, x, y):
+    # data (Nz,Ny,Nx), x (Nx,), y (Ny,)
+    weights = data - np.min(data, axis=(1,2), keepdims=True)
+    total = np.sum(weights, axis=(1,2))
+    total = np.where(total > 0, total, np.nan)
+    wx = np.sum(weights, axis=1)        # (Nz,Nx) projection on X
+    wy = np.sum(weights, axis=2)        # (Nz,Ny) projection on Y
+    cx = wx @ x/total
+    cy = wy @ y/total
+    dx = x[None,:] - cx[:,None]
+    dy = y[None,:] - cy[:,None]
+    cov_xx = np.sum(wx*dx**2, axis=1)/total
+    cov_yy = np.sum(wy*dy**2, axis=1)/total
+    cov_xy = np.einsum('zyx,zy,zx->z', weights, dy, dx)/total
+    return cx, cy, cov_xx, cov_yy, cov_xy
+
+def gaussian_fit(data, x, y):
+    # ln I = a + b x + c y + d x^2 + e y^2 + f xy with weights I^2, solved for
+    # all planes with one batched least squares problem. Coordinates are
+    # scaled to the scan size for a well conditioned system.
+    Nz = data.shape[0]
+    scale = max(np.ptp(x), np.ptp(y), 1)
+    X, Y = np.meshgrid(x/scale, y/scale)
+    X = X.ravel()
+    Y = Y.ravel()
+    A = np.stack([np.ones_like(X), X, Y, X**2, Y**2, X*Y], axis=1)     # (P,6)
+    values = data.reshape(Nz, -1)
+    background = np.min(values, axis=1, keepdims=True)
+    signal = values - background
+    peak = np.max(signal, axis=1, keepdims=True)
+    use = (signal > fit_threshold*peak) & (peak > 0)
+    weights = np.where(use, signal**2, 0)
+    log_signal = np.log(np.where(use, signal, 1))
+    normal = np.einsum('pi,zp,pj->zij', A, weights, A)
+    rhs = np.einsum('pi,zp,zp->zi', A, weights, log_signal)
+    coefficients = np.einsum('zij,zj->zi', np.linalg.pinv(normal), rhs)
+    a, b, c, d, e, f = coefficients.T
+    # Inverse covariance is -[[2d, f], [f, 2e]]
+    det = 4*d*e - f**2
+    valid = (d < 0) & (e < 0) & (det > 0) & (np.sum(use, axis=1) >= 6)
+    det = np.where(valid, det, np.nan)
+    cov_xx = -2*e/det
+    cov_yy = -2*d/det
+    cov_xy = f/det
+    mx = cov_xx*b + cov_xy*c
+    my = cov_xy*b + cov_yy*c
+    amplitude = np.exp(a + (b*mx + c*my)/2) + background[:,0]
+    return amplitude, mx*scale, my*scale, cov_xx*scale**2, cov_yy*scale**2, cov_xy*scale**2
+
+def analyse(scan_map, channel, planes=None):
+    # Per plane arrays (keys of plane_keys) and the best focus of one channel.
+    # planes limits the analysis to the first planes, e.g. the ones measured
+    # so far during a scan.
+    data = np.asarray(getattr(scan_map, channel), dtype=float)
+    if planes is not None:
+        data = data[:planes]
+    data = np.where(np.isfinite(data), data, np.nanmin(data) if np.any(np.isfinite(data)) else 0)
+    xs, ys, zs = grid_axes(scan_map)
+    zs = zs[:data.shape[0]]
+    Nz = data.shape[0]
+    result = {'channel': channel}
+
+    flat = data.reshape(Nz, -1)
+    index = np.argmax(flat, axis=1)
+    iy, ix = np.unravel_index(index, data.shape[1:])
+    result['peak'] = flat[np.arange(Nz), index]
+    result['peak_x'] = xs[ix]
+    result['peak_y'] = ys[iy]
+
+    cx, cy, cov_xx, cov_yy, cov_xy = moments(data, xs, ys)
+    result['centroid_x'] = cx
+    result['centroid_y'] = cy
+    result['fwhm_x'] = fwhm_factor*np.sqrt(cov_xx)
+    result['fwhm_y'] = fwhm_factor*np.sqrt(cov_yy)
+    result['fwhm_major'], result['fwhm_minor'], result['angle'] = ellipse(cov_xx, cov_yy, cov_xy)
+
+    amplitude, mx, my, fit_xx, fit_yy, fit_xy = gaussian_fit(data, xs, ys)
+    result['fit_amplitude'] = amplitude
+    result['fit_x'] = mx
+    result['fit_y'] = my
+    result['fit_fwhm_major'], result['fit_fwhm_minor'], result['fit_angle'] = ellipse(fit_xx, fit_yy, fit_xy)
+
+    result['z'] = zs
+    result['best_plane'], result['best_focus'] = best_focus(result)
+    return result
+
+def best_focus(result):
+    # Plane with the highest fitted amplitude (peak value where the fit
+    # failed) and the focus position: fitted (or centroid) X, Y of that plane
+    # and Z at the vertex of a parabola through the neighbouring peak values
+    strength = np.where(np.isfinite(result['fit_amplitude']), result['fit_amplitude'], result['peak'])
+    best = int(np.nanargmax(strength))
+    zs = result['z']
+    z = zs[best]
+    if 0 < best < len(zs) - 1:
+        p0, p1, p2 = result['peak'][best-1:best+2]
+        curvature = p0 - 2*p1 + p2
+        if curvature < 0:
+            z = z + np.clip((p0 - p2)/(2*curvature), -0.5, 0.5)*(zs[best+1] - zs[best])
+    x, y = result['fit_x'][best], result['fit_y'][best]
+    if not (np.isfinite(x) and np.isfinite(y)):
+        x, y = result['centroid_x'][best], result['centroid_y'][best]
+    return best, [float(x), float(y), float(z)]
+
+def absolute(scan_map, position):
+    # Position relative to the scan center -> mirror coordinates
+    if scan_map.center_point is None:
+        return list(position)
+    return [float(scan_map.center_point[i]) + position[i] for i in range(3)]
+
+def as_dict(result, scan_map=None):
+    # Plain values for the scan metadata
+    values = {'channel': result['channel'], 'best_plane': result['best_plane'],
+              'best_focus': result['best_focus']}
+    if scan_map is not None:
+        values['best_focus_absolute'] = absolute(scan_map, result['best_focus'])
+    for key in plane_keys:
+        values[key] = [None if not np.isfinite(v) else float(v) for v in result[key]]
+    return values
@@ -0,0 +1,33 @@
+import numpy as np
+
+# Helpers of the adaptive (coarse-to-fine) focus search
+
+def find_peak(scan_map, channel):
+    # Pixel index, measured position and value of the maximum of a channel
+    data = np.asarray(getattr(scan_map, channel))
+    index = np.unravel_index(np.nanargmax(data), data.shape)
+    position = [scan_map.X[index], scan_map.Y[index], scan_map.Z[index]]
+    return index, position, data[index]
+
+def refine_window(scan_map, factor, resolution):
+    # Sizes, step sizes and numbers of points of the next, finer map around
+    # the maximum: the window spans at least one step of the current map on
+    # each side and the step is divided by factor, but never below
+    # resolution. The half-width is a whole number of fine steps, so the
+    # window has an odd number of points and the previous maximum is
+    # measured again at its center. Returns None when the current steps
+    # already reached the resolution.
+    steps = [scan_map.step_sizeX, scan_map.step_sizeY]
+    if scan_map.Nz > 1:
+        steps.append(scan_map.step_sizeZ)
+    if all(step <= resolution for step in steps):
+        return None
+    fine_steps = [max(step/factor, resolution) for step in steps]
+    halves = [int(np.ceil(step/fine - 1e-9)) for step, fine in zip(steps, fine_steps)]
+    sizes = [2*n*fine for n, fine in zip(halves, fine_steps)]
+    counts = [2*n + 1 for n in halves]
+    if scan_map.Nz == 1:
+        sizes.append(0)
+        fine_steps.append(scan_map.step_sizeZ)
+        counts.append(1)
+    return sizes, fine_steps, counts
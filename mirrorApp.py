@@ -1,169 +1,71 @@
 import sys
 import yaml
-from PySide6.QtWidgets import QApplication, QFileDialog, QLabel, QVBoxLayout, QWidget, QProgressBar, QMessageBox
-from PySide6.QtCore import QObject, QThread, Signal, Slot
+from PySide6.QtWidgets import QApplication, QMainWindow, QFileDialog, QMessageBox
+from PySide6.QtCore import QThread, QTimer, Signal
 from PySide6.QtGui import QTransform
 import pyqtgraph as pg
 import numpy as np
 import os
-import asyncio
-from time import sleep
-import datetime
-from timeit import default_timer as timer
-
-# load config
-with open('config.yaml', 'r') as file:
-    config = yaml.safe_load(file)
-
-try:
-    import nea_tools
-    offline_mode = False
-except:
-    # TODO replace with logger
-    print("nea_tools module not found, working offline")
-    offline_mode = True
-
-current_folder = os.getcwd()
-ui_file = os.path.join(current_folder,'mirrorApp.ui')
-
-uiclass, baseclass = pg.Qt.loadUiType(ui_file)
-
-######## QT WORKING THREAD CLASS ############
-class Worker(QObject):
-    progress = Signal(int)
-    completed = Signal()
-    started = Signal()
-    status_update = Signal(str)
-    def __init__(self):
-        super().__init__()
-        self.scan_map = []
-        self.nea = None
-        self.context = None
-        self.motors = None
-        self.Vector3D = None
-
-    @Slot()
-    def do_scan_test(self):
-        self.started.emit()
-        # Calculate mirror coordinates for movement
-        xs = np.linspace(-self.scan_map.sizeX/2,self.scan_map.sizeX/2,self.scan_map.Nx)
-        ys = np.linspace(-self.scan_map.sizeY/2,self.scan_map.sizeY/2,self.scan_map.Ny)
-        if self.scan_map.Nz == 1:
-            zs = np.array([0])
-        else:
-            zs = np.linspace(-self.scan_map.sizeZ/2,self.scan_map.sizeZ/2,self.scan_map.Nz)
-
-        print(f"Nz in the working thread scan: {self.scan_map.Nz}")
-
-        # SCANNING LOOP
-        counter = 0
-        for idz, z in enumerate(zs):
-            for idy, y in enumerate(ys):
-                for idx, x in enumerate(xs):
-                    counter += 1
-                    self.scan_map.O1A[idz,idx,idy] = np.random.rand()
-                    self.scan_map.O2A[idz,idx,idy] = np.random.rand()
-                    self.scan_map.O3A[idz,idx,idy] = np.random.rand()
-                    self.scan_map.O4A[idz,idx,idy] = np.random.rand()
-                    self.scan_map.X[idz,idx,idy] = x
-                    self.scan_map.Y[idz,idx,idy] = y
-                    self.scan_map.Z[idz,idx,idy] = z
-                    sleep(0.1)
-                    self.progress.emit(counter)
-        self.completed.emit()
-
-    @Slot()
-    def do_scan(self):
-        self.started.emit()
-        # Create motor object
-        p = self.motors.Mirror()
-        if not p.is_active:
-            p.activate()
-        # Set sampling interval
-        self.context.Microscope.Py.SetSamplingTime(50)
-        # Set motor speed
-        safe_v = self.context.Microscope.Py.MirrorMotorVelocityInContacting
-        v = self.Vector3D(safe_v,safe_v,safe_v)
-        self.context.Microscope.Py.SetActiveMotorVelocityXyz(v)
-        # Update current position
-        self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
-        current_pos = p.absolute_position
-        self.scan_map.center_point = current_pos
-        self.status_update.emit(f'Mirror position BEFORE movement: {current_pos}')
-
-        # Calculate mirror coordinates for movement
-        xs = current_pos[0] + np.linspace(-self.scan_map.sizeX/2,self.scan_map.sizeX/2,self.scan_map.Nx)
-        ys = current_pos[1] + np.linspace(-self.scan_map.sizeY/2,self.scan_map.sizeY/2,self.scan_map.Ny)
-
-        if self.scan_map.Nz == 1:
-            # self.scan_map.Nz = 1
-            zs = np.array([current_pos[2]])
-        else:
-            zs = current_pos[2] + np.linspace(-self.scan_map.sizeZ/2,self.scan_map.sizeZ/2,self.scan_map.Nz)
-
-        # SCANNING LOOP
-        counter = 0
-        counterZ = 0
-        startime = timer()
-        for idz, z in enumerate(zs):
-            for idy, y in enumerate(ys):
-                for idx, x in enumerate(xs):
-                    counter += 1
-                    self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
-                    posx = p.absolute_position[0]
-                    posy = p.absolute_position[1]
-                    posz = p.absolute_position[2]
-                    dx = x-posx
-                    dy = y-posy
-                    dz = z-posz
-                    p.go_relative(dx,dy,dz)
-                    p.await_movement()
-                    # Read optical channels
-                    self.scan_map.O1A[idz,idy,idx] = self.context.Microscope.Py.OpticalAmplitude[1]
-                    self.scan_map.O2A[idz,idy,idx] = self.context.Microscope.Py.OpticalAmplitude[2]
-                    self.scan_map.O3A[idz,idy,idx] = self.context.Microscope.Py.OpticalAmplitude[3]
-                    self.scan_map.O4A[idz,idy,idx] = self.context.Microscope.Py.OpticalAmplitude[4]
-                    # Update real position
-                    self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
-                    newx = p.absolute_position[0]
-                    newy = p.absolute_position[1]
-                    newz = p.absolute_position[2]
-                    self.scan_map.X[idz,idy,idx] = newx
-                    self.scan_map.Y[idz,idy,idx] = newy
-                    self.scan_map.Z[idz,idy,idx] = newz
-                    steptime = timer()
-                    remtime = (steptime-startime)/counter*(self.scan_map.Nx*self.scan_map.Ny*self.scan_map.Nz-counter)
-                    self.progress.emit(counterZ)
-                    self.status_update.emit(f'X: {newx}, Y: {newy}, Z: {newz} Remaining time: {datetime.timedelta(seconds=remtime)}')
-            counterZ += 1
-        sleep(0.5)
-
-        # Go back to the original position
-        self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
-        dx = current_pos[0]-p.absolute_position[0]
-        dy = current_pos[1]-p.absolute_position[1]
-        dz = current_pos[2]-p.absolute_position[2]
-        p.go_relative(dx,dy,dz)
-        p.await_movement()
-        # Check position after going back:
-        self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
-        current_pos = p.absolute_position
-        self.scan_map.center_point = current_pos
-        self.status_update.emit(f'Mirror position AFTER movement: {current_pos}')
-        self.completed.emit()
+import importlib.util
+from mirror_scan import mirror_scan, default_channels, optical_channels, std_channels, sparse_channels, error_channels, mechanical_channels
+import scan_io
+from scan_paths import scan_paths
+from acquisition import acquisition_profile, reductions
+from scan_engine import Worker
+import focus_analysis
+import scan_timing
+import regrid
+from pixel_ring import pixel_ring
+from scan_process import scan_process
+from motion_executor import motion_executor
+from motion_profile import motion_profile
+from nea_session import nea_session
+from display_cache import display_cache, colour_scales, pyramid_level
+import sparse_scan
+# Compiled from mirrorApp.ui with: pyside6-uic mirrorApp.ui -o ui_mirrorApp.py
+from ui_mirrorApp import Ui_MainWindow
+
+# Nothing is read at import: the config is loaded by MainWindow, relative to
+# the application folder and not to the working directory
+package_folder = os.path.dirname(os.path.abspath(__file__))
+config_file = os.path.join(package_folder, 'config.yaml')
+
+def load_config(fname=config_file):
+    with open(fname, 'r') as file:
+        return yaml.safe_load(file) or {}
+
+def nea_tools_available():
+    # nea_tools loads the .NET SDK, so it is only imported when connecting
+    return importlib.util.find_spec('nea_tools') is not None
 
 ######## MAIN APPLICATION WINDOW CLASS ############
-class MainWindow(uiclass, baseclass):
-    work_requested = Signal()
+class MainWindow(QMainWindow, Ui_MainWindow):
+    # Scan mode (step, fly or adaptive) to run in the worker thread
+    scan_requested = Signal(str)
     pg.setConfigOptions(imageAxisOrder='row-major')
 
-    def __init__(self):
+    def __init__(self, config=None):
         super().__init__()
 
         # Load UI
         self.setupUi(self)
 
+        # Settings
+        self.config = load_config() if config is None else config
+        self.simulation = dict(self.config.get('simulation') or {})
+        self.simulate = bool(self.simulation.pop('enabled', False))
+        self.checkpoint_folder = os.path.join(package_folder, self.config.get('checkpoint_folder', 'checkpoints'))
+        self.offline_mode = not nea_tools_available()
+        if self.offline_mode:
+            # TODO replace with logger
+            print("nea_tools module not found, working offline")
+
         # Other attributes and flags
+        # Connection to neaServer (or the simulation), kept in the background
+        self.session = nea_session(self.config)
+        self.session.state_changed.connect(self.session_state)
+        self.session.message.connect(self.status_bar_update)
+        self.session_previous = 'disconnected'
         self.connected = False
         self.click_move_enabled = False
         self.mirror_map = None
@@ -171,12 +73,30 @@ class MainWindow(uiclass, baseclass):
         self.sizes_linked = False
         self.step_sizes_linked = False
         self.currentZindex = 0
+        self.live_plane = 0
+        self.live_levels = [np.inf, -np.inf]
+        self.ring = None
+        self.live_map_id = 0
+        # Scan process (scan_process: true) and whether it runs the current scan
+        self.scan_process = None
+        self.process_scan = False
+        self.checkpoint_only = False
+
+        # Live view is refreshed at a fixed frame rate while scanning
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(int(1000/self.config.get('live_fps', 10)))
+        self.live_timer.timeout.connect(self.refresh_live_view)
         
         # Stylize
         self.setWindowTitle('Focus scanner application')
         # self.setStyleSheet("background-color: white;")
-        self.channel_comboBox.addItems(['O1A', 'O2A', 'O3A','O4A'])
+        self.channel_comboBox.addItems(optical_channels)
         self.channel_comboBox.setCurrentText('O3A')
+        self.scanPath_comboBox.addItems(list(scan_paths))
+        self.scanPath_comboBox.setCurrentText('Serpentine')
+        self.saveFormat_comboBox.addItems(['Binary (.npy)', 'Text (.dat)'])
+        self.reduction_comboBox.addItems(list(reductions))
+        self.colourScale_comboBox.addItems(colour_scales)
 
         # Linking button label correction
         txt = "\U0001F517"
@@ -187,24 +107,34 @@ class MainWindow(uiclass, baseclass):
         # Create the worker thread
         self.worker = Worker()
         self.worker_thread = QThread()
-        self.worker.progress.connect(self.update_scan_progress)
         self.worker.completed.connect(self.scan_complete)
+        self.worker.failed.connect(self.scan_failed)
         self.worker.status_update.connect(self.status_bar_update)
-        self.work_requested.connect(self.worker.do_scan)
+        self.worker.timing_update.connect(self.timing_update)
+        self.scan_requested.connect(self.worker.run)
         self.worker.moveToThread(self.worker_thread)
         self.worker_thread.start()
+
+        # Click-to-move runs in its own thread, the window stays responsive
+        self.motion = motion_executor()
+        self.motion_thread = QThread()
+        self.motion.started.connect(self.move_started)
+        self.motion.moved.connect(self.move_done)
+        self.motion.failed.connect(self.move_failed)
+        self.motion.idle.connect(self.move_idle)
+        self.motion.moveToThread(self.motion_thread)
+        self.motion_thread.start()
         
-        # Create test data
-        testdata = np.fromfunction(lambda i, j: (1+0.3*np.sin(i)) * (i)**2 + (j)**2, (100, 100))
-        testdata = testdata * (1 + 0.2 * np.random.random(testdata.shape) )
-        testdata = testdata.transpose()
-        self.data_to_plot = testdata
+        # Empty image until a scan is loaded or measured
+        self.data_to_plot = np.zeros((100, 100))
         self.center_pos_rel = [0, 0]
-        self.center_pos_abs = [50, 50]
+        # Absolute mirror position at center_pos_rel, None until a scan has
+        # measured it
+        self.center_pos_abs = None
         self.center_marker = [{'pos': [50, 50], 'data': 1}]
 
         # Create plot widget
-        self.imItem = pg.ImageItem(image=testdata)                                                  # create an ImageItem
+        self.imItem = pg.ImageItem(image=self.data_to_plot)                                         # create an ImageItem
         self.plot_area.addItem(self.imItem)                                                         # add it to the PlotWidget
         self.cbar = self.plot_area.addColorBar(self.imItem, colorMap='CET-L9',rounding=0.01)        # Create a colorBarItem and add to the PlotWidget
         self.scatterItem = pg.ScatterPlotItem(size=15,
@@ -212,6 +142,26 @@ class MainWindow(uiclass, baseclass):
                                               brush=pg.mkBrush(255, 255, 255, 120))
         self.scatterItem.addPoints(self.center_marker)
         self.plot_area.addItem(self.scatterItem)
+        # Focus analysis overlay: FWHM ellipse and center of the spot
+        self.focus_result = None
+        self.focus_map = None
+        self.focusCurve = pg.PlotCurveItem(pen=pg.mkPen(color=(255, 60, 60), width=1.5, style=pg.QtCore.Qt.DashLine))
+        self.focusMarker = pg.ScatterPlotItem(size=12, symbol='+', pen=pg.mkPen(color=(255, 60, 60), width=1.5), brush=None)
+        self.focusText = pg.TextItem(color=(255, 60, 60), anchor=(0, 1))
+        for item in (self.focusCurve, self.focusMarker, self.focusText):
+            self.plot_area.addItem(item)
+        # Measured pixels of a sparse scan
+        self.sampleMarkers = pg.ScatterPlotItem(size=3, pen=None, brush=pg.mkBrush(255, 255, 255, 160))
+        self.plot_area.addItem(self.sampleMarkers)
+        self.sample_key = None
+        # Regridded channels of the displayed map, made on demand
+        self.regrid_source = None
+        self.regrid_cache = {}
+        # Plane statistics, recent planes and pyramids of complete maps
+        self.display_cache = display_cache()
+        self.display_channel = None
+        self.display_level = 0
+        self.display_size = (100, 100)
         # self.plot_area.setBackground('w')
         self.plot_area.getAxis('left').setTextPen('black')
         self.plot_area.getAxis('bottom').setTextPen('black')
@@ -224,62 +174,69 @@ class MainWindow(uiclass, baseclass):
         self.choose_file_button.clicked.connect(self.choose_file)
         self.datascroll_spinBox.valueChanged.connect(self.data_scroll)
         self.channel_comboBox.currentIndexChanged.connect(self.channel_change)
+        self.focus_checkBox.toggled.connect(self.toggle_focus_analysis)
+        self.regrid_checkBox.toggled.connect(self.toggle_regrid)
+        self.sparseSamples_checkBox.toggled.connect(self.update_sample_markers)
+        self.colourScale_comboBox.currentIndexChanged.connect(self.colour_scale_change)
+        self.plot_area.getViewBox().sigRangeChanged.connect(self.view_range_change)
         self.linkSizeButton.clicked.connect(self.link_scan_size)
         self.linkStepSizeButton.clicked.connect(self.link_scan_step_size)
 
-        if not offline_mode:
+        if not self.offline_mode or self.simulate:
             self.scan_button.clicked.connect(self.start_scan)
             self.connect_snom_button.clicked.connect(self.connect_to_neasnom)
             self.move_to_button.clicked.connect(self.enable_move_to_point)
+            self.resume_button.clicked.connect(self.resume_scan)
             self.save_button.clicked.connect(self.save_data)
 
-        if offline_mode:
+        if self.simulate:
+            self.statusbar.showMessage(u"\u26A0 Simulated neaSNOM, no microscope will be moved.")
+        elif self.offline_mode:
             self.statusbar.showMessage(u"\u26A0 nea_tools module not found, running in display-only mode.")
             self.connect_snom_button.setEnabled(False)
             self.move_to_button.setEnabled(False)
+            self.resume_button.setEnabled(False)
             self.scan_button.setEnabled(False)
             self.save_button.setEnabled(False)
 
     def connect_to_neasnom(self):
-        if "nea_tools" not in sys.modules:
+        # The session connects in the background; session_state follows it
+        if self.offline_mode and not self.simulate:
             return
-
-        self.path_to_dll = ''# yaml.load('config.yaml')
-        path_to_dll = config['path_to_dll']
-        fingerprint = config['fingerprint']
-        host = 'nea-server'
-        if self.connected:
+        if self.session.active:
             print('\nDisconnecting from neaServer!')
-            nea_tools.disconnect()
-            self.connected = False
-            self.connect_snom_button.setText("Connect to neaSNOM")
-            self.statusbar.showMessage("Disconnected from SNOM")
+            self.stop_scan_process()
+            self.motion.cancel()
+            self.session.stop()
         else:
-            loop = asyncio.get_event_loop()
-            try:
-                loop.run_until_complete(nea_tools.connect(host, fingerprint, path_to_dll))
-            except ConnectionError:
-                print("Disable the WiFi connection!")
-            try:
-                from neaspec import context
-                import Nea.Client.SharedDefinitions as nea
-                from nea_tools.microscope import motors
-                self.Vector3D = nea.Geometry.Vector3D
-                self.Point3D = nea.Geometry.Point3D
-            except ModuleNotFoundError:
-                raise ConnectionError('Connection refused or timeout. Retry to connect again.')
-            else:
-                self.connected = True
-                self.statusbar.showMessage("Connected to neaSNOM")
-                self.connect_snom_button.setText("Disconnect neaSNOM")
+            self.session.start()
 
-            self.context = context
-            self.nea = nea
-            self.motors = motors
-            return context, nea
+    def session_state(self, state):
+        target = 'simulated neaSNOM' if self.simulate else 'neaSNOM'
+        self.connected = state == 'connected'
+        if state == 'connected':
+            self.context, self.nea, self.motors = self.session.handles
+            self.Vector3D = self.nea.Geometry.Vector3D
+            self.Point3D = self.nea.Geometry.Point3D
+            self.statusbar.showMessage(f"Connected to {target}")
+            self.connect_snom_button.setText("Disconnect neaSNOM")
+        elif state == 'connecting':
+            self.statusbar.showMessage(f"Connecting to {target}...")
+            self.connect_snom_button.setText("Cancel connecting")
+        elif state == 'reconnecting':
+            # A running scan is paused until the link is back
+            self.statusbar.showMessage(f"Connection to {target} lost, reconnecting...")
+            self.connect_snom_button.setText("Disconnect neaSNOM")
+        elif state == 'failed':
+            self.status_bar_update(f"Could not connect to {target}, retry to connect again")
+        else:
+            if self.session_previous != 'failed':
+                self.statusbar.showMessage(f"Disconnected from {target}")
+            self.connect_snom_button.setText("Connect to neaSNOM")
+        self.session_previous = state
 
     def choose_file(self):
-        fname = QFileDialog.getOpenFileName(self, "Choose file","","Datatext files (*.txt *.dat)")
+        fname = QFileDialog.getOpenFileName(self, "Choose file","","Scan files (*.npy *.txt *.dat);;Binary scans (*.npy);;Datatext files (*.txt *.dat)")
         self.file_name = fname[0]
         try:
             self.load_data()
@@ -288,42 +245,10 @@ class MainWindow(uiclass, baseclass):
             self.statusbar.showMessage(f'No file was loaded')
     
     def load_data(self):
-        # Create scan object
-        self.loaded_map = mirror_scan()
-        # Read header lines
-        nlines = 6
-        with open(self.file_name, 'r') as file: header_lines = [file.readline().strip() for _ in range(nlines)]
-
-        for header_line in header_lines:
-            idx = header_line.find("=")
-            text = header_line[2:idx-1]
-            number = float(header_line[idx+2:])
-            if text == 'SizeX':
-                self.loaded_map.sizeX = number
-            elif text == 'SizeY':
-                self.loaded_map.sizeY = number
-            elif text == 'SizeZ':
-                self.loaded_map.sizeZ = number
-            elif text == 'StepX':
-                self.loaded_map.step_sizeX = number
-            elif text == 'StepY':
-                self.loaded_map.step_sizeY = number
-            elif text == 'StepZ':
-                self.loaded_map.step_sizeZ = number
-
-        self.loaded_map.recalc_size()
-        self.Zaxis = np.linspace(-self.loaded_map.sizeZ/2,self.loaded_map.sizeZ/2,self.loaded_map.Nz)
-
-        # Load data section of the file and reshape it to the right size
-        data = np.loadtxt(self.file_name)
-        self.loaded_map.X = np.reshape(data[:,0],(self.loaded_map.Nz,self.loaded_map.Nx,self.loaded_map.Ny))
-        self.loaded_map.Y = np.reshape(data[:,1],(self.loaded_map.Nz,self.loaded_map.Nx,self.loaded_map.Ny))
-        self.loaded_map.Z = np.reshape(data[:,2],(self.loaded_map.Nz,self.loaded_map.Nx,self.loaded_map.Ny))
-        self.loaded_map.O1A = np.reshape(data[:,3],(self.loaded_map.Nz,self.loaded_map.Nx,self.loaded_map.Ny))
-        self.loaded_map.O2A = np.reshape(data[:,4],(self.loaded_map.Nz,self.loaded_map.Nx,self.loaded_map.Ny))
-        self.loaded_map.O3A = np.reshape(data[:,5],(self.loaded_map.Nz,self.loaded_map.Nx,self.loaded_map.Ny))
-        self.loaded_map.O4A = np.reshape(data[:,6],(self.loaded_map.Nz,self.loaded_map.Nx,self.loaded_map.Ny))
         # Create map object for the loaded data
+        self.loaded_map = scan_io.load(self.file_name)
+        self.display_cache.clear()
+        self.Zaxis = np.linspace(-self.loaded_map.sizeZ/2,self.loaded_map.sizeZ/2,self.loaded_map.Nz)
 
         self.center_pos_rel = [0,0]
         self.center_marker = [{'pos': self.center_pos_rel, 'data': 1}]
@@ -335,43 +260,157 @@ class MainWindow(uiclass, baseclass):
             pass
         else:
             self.mirror_map = None
+            self.update_focus_analysis()
+
+    def regrid_active(self):
+        # Not while scanning: the map is still being filled
+        return self.regrid_checkBox.isChecked() and not self.live_timer.isActive()
+
+    def channel_names(self, map):
+        if self.regrid_active():
+            return map.display_channels + error_channels
+        return map.display_channels
+
+    def displayed_map(self, map):
+        # The map itself, or its displayed channel regridded onto the nominal grid
+        if not self.regrid_active():
+            return map
+        if map is not self.regrid_source:
+            self.regrid_source = map
+            self.regrid_cache = {}
+        channel = self.channel_comboBox.currentText()
+        if channel not in self.regrid_cache:
+            self.regrid_cache[channel] = regrid.regrid(map, [channel] if channel in map.channels else [])
+            errors = regrid.summary(self.regrid_cache[channel])
+            self.regrid_label.setText(f'RMS error {errors["rms_error"]:.0f} nm, max {errors["max_error"]:.0f} nm')
+        return self.regrid_cache[channel]
+
+    def toggle_regrid(self):
+        if self.live_timer.isActive():
+            self.statusbar.showMessage('The scan is regridded when it is complete')
+            return
+        if not self.regrid_checkBox.isChecked():
+            self.regrid_source = None
+            self.regrid_cache = {}
+            self.regrid_label.setText('')
+        if self.loaded_map is not None or self.mirror_map is not None:
+            self.channel_change()
+
+    def update_channel_list(self, map):
+        # Offer the optical channels recorded in the displayed map
+        names = self.channel_names(map)
+        items = [self.channel_comboBox.itemText(i) for i in range(self.channel_comboBox.count())]
+        if items == names:
+            return
+        current = self.channel_comboBox.currentText()
+        self.channel_comboBox.blockSignals(True)
+        self.channel_comboBox.clear()
+        self.channel_comboBox.addItems(names)
+        if current in names:
+            self.channel_comboBox.setCurrentText(current)
+        elif 'O3A' in map.optical:
+            self.channel_comboBox.setCurrentText('O3A')
+        self.channel_comboBox.blockSignals(False)
 
     def set_display_data(self,map):
-        self.meas_data = np.array(getattr(map,self.channel_comboBox.currentText()))
-        # self.meas_data = self.meas_data.reshape((map.Nz,map.Nx,map.Ny))
-        if map.Nz == 1:
-            self.data_to_plot = self.meas_data[0,:,:]
-            self.datascroll_spinBox.setValue(0)
-            self.datascroll_spinBox.setRange(0,0)
-            self.datascroll_spinBox.setEnabled(False)
-            self.cbar.setLevels(values = (np.min(self.data_to_plot),np.max(self.data_to_plot)))
+        # Channels are views on the scan buffer, no copy is made
+        self.update_channel_list(map)
+        shown = self.displayed_map(map)
+        self.meas_data = getattr(shown,self.channel_comboBox.currentText())
+        # Statistics and planes are cached for complete maps only
+        if self.live_timer.isActive():
+            self.display_channel = None
         else:
-            self.zeroZ_data = self.meas_data[self.currentZindex,:,:]
-            self.data_to_plot = self.zeroZ_data
-            self.datascroll_spinBox.setValue(self.currentZindex) #Here should come counterZ
-            self.datascroll_spinBox.setRange(0, self.currentZindex)
-            self.datascroll_spinBox.setEnabled(True)
-            self.cbar.setLevels(values = (np.min(self.zeroZ_data),np.max(self.zeroZ_data)))
+            self.display_channel = self.display_cache.get(shown, self.channel_comboBox.currentText())
+        # self.meas_data = self.meas_data.reshape((map.Nz,map.Nx,map.Ny))
+        # The scan shows its current plane, otherwise the selected plane is kept
+        last = self.currentZindex if self.live_timer.isActive() else map.Nz - 1
+        index = self.currentZindex if self.live_timer.isActive() else min(self.datascroll_spinBox.value(), last)
+        self.datascroll_spinBox.blockSignals(True)
+        self.datascroll_spinBox.setRange(0, last)
+        self.datascroll_spinBox.setValue(index)
+        self.datascroll_spinBox.setEnabled(map.Nz > 1)
+        self.datascroll_spinBox.blockSignals(False)
+        self.data_to_plot = self.meas_data[index,:,:]
+        levels = self.plane_levels(index)
+        if levels is not None:
+            self.cbar.setLevels(values = levels)
 
         #Set up the axis values by transforming the image
-        tr = QTransform()                                                               # prepare ImageItem transformation:
-        tr.translate(-map.sizeX/2/1000,-map.sizeY/2/1000)                                         # move 3x3 image to locate center at axis origin
-        tr.scale(map.sizeX/map.Nx/1000, map.sizeY/map.Ny/1000)                                    # scale horizontal and vertical axes
-        self.imItem.setTransform(tr)
+        self.display_size = (map.sizeX, map.sizeY)
+        self.display_level = self.view_level()
+        self.set_image_transform(self.data_to_plot.shape)
         self.plot_area.getAxis('bottom').setLabel('X position / μm')
         self.plot_area.getAxis('left').setLabel('Y position / μm')
         self.plot_area.showAxes(True)
         self.plot_area.setAspectLocked(True)
 
+    def plane_levels(self, index):
+        # Colour scale of a plane from the cached statistics, or of the plane
+        # itself while scanning (unmeasured pixels of sparse scans are NaN)
+        if self.display_channel is None:
+            return (np.nanmin(self.data_to_plot),np.nanmax(self.data_to_plot))
+        return self.display_channel.levels(index, self.colourScale_comboBox.currentText())
+
+    def set_image_transform(self, shape):
+        # Image pixels (of the plane or a pyramid level) -> position in μm
+        sizeX, sizeY = self.display_size
+        tr = QTransform()                                                               # prepare ImageItem transformation:
+        tr.translate(-sizeX/2/1000,-sizeY/2/1000)                                       # move 3x3 image to locate center at axis origin
+        tr.scale(sizeX/shape[1]/1000, sizeY/shape[0]/1000)                              # scale horizontal and vertical axes
+        self.imItem.setTransform(tr)
+
+    def view_level(self):
+        # Pyramid level for the current zoom, 0 while scanning
+        if self.display_channel is None:
+            return 0
+        image_pixel = [size/N/1000 for size, N in zip(self.display_size, self.data_to_plot.shape[::-1])]
+        screen_pixel = self.plot_area.getViewBox().viewPixelSize()
+        return pyramid_level(self.display_channel, image_pixel, screen_pixel)
+
+    def display_image(self):
+        if self.display_channel is None:
+            return self.data_to_plot
+        image = self.display_channel.plane(self.datascroll_spinBox.value(), self.display_level)
+        self.set_image_transform(image.shape)
+        return image
+
     def update_image(self):
         lastlevels = self.cbar.levels()
-        self.imItem.setImage(image = self.data_to_plot)
+        self.imItem.setImage(image = self.display_image(), autoLevels = False)
         self.cbar.setLevels(values = lastlevels)
         self.scatterItem.clear()
         self.scatterItem.addPoints(self.center_marker)
+        self.update_sample_markers()
         self.click_move_enabled = False
         self.move_to_button.setEnabled(True)
 
+    def update_sample_markers(self):
+        # Dots on the measured pixels of the displayed plane of a complete
+        # sparse scan
+        map = self.loaded_map if self.loaded_map is not None else self.mirror_map
+        measured = None if map is None or self.live_timer.isActive() else sparse_scan.measured(map)
+        if measured is None:
+            self.sample_key = None
+            self.sampleMarkers.clear()
+            self.sparseSamples_label.setText('')
+            return
+        index = min(self.datascroll_spinBox.value(), map.Nz - 1)
+        key = (id(map), index, self.sparseSamples_checkBox.isChecked())
+        if key == self.sample_key:
+            return
+        self.sample_key = key
+        plane = measured[index]
+        confidence = getattr(map, sparse_scan.confidence_channel)[index]
+        self.sparseSamples_label.setText(f'{plane.mean():.0%} measured, mean confidence {np.mean(confidence):.2f}')
+        self.sampleMarkers.clear()
+        if self.sparseSamples_checkBox.isChecked():
+            idy, idx = np.nonzero(plane)
+            # Pixel centers in μm, as placed by set_image_transform
+            x = ((idx + 0.5)*map.sizeX/map.Nx - map.sizeX/2)/1000
+            y = ((idy + 0.5)*map.sizeY/map.Ny - map.sizeY/2)/1000
+            self.sampleMarkers.setData(x=x, y=y)
+
     def data_scroll(self):
         if (self.loaded_map == None) & (self.mirror_map == None):
             print(f'Error')
@@ -379,7 +418,15 @@ class MainWindow(uiclass, baseclass):
             index = self.datascroll_spinBox.value()
             print(f'Z index: {index}, map size: {np.size(self.meas_data[index,:,:])}')
             self.data_to_plot = self.meas_data[index,:,:]
+            if self.display_channel is not None:
+                levels = self.plane_levels(index)
+                if levels is not None:
+                    self.cbar.setLevels(values = levels)
             self.update_image()
+            self.update_focus_overlay()
+            if self.display_channel is not None:
+                # Neighbouring planes are ready for the next step
+                QTimer.singleShot(0, lambda: self.prefetch_planes(index))
             # self.Zplane_label.setText(f"Displayed Z plane: {self.Zaxis[index]} nm")
     
     def channel_change(self):
@@ -388,19 +435,108 @@ class MainWindow(uiclass, baseclass):
         elif self.loaded_map == None:
             self.set_display_data(self.mirror_map)
             self.update_image()
+            if self.live_timer.isActive():
+                self.live_levels = list(self.cbar.levels())
+                self.update_focus_analysis(self.currentZindex)
+            else:
+                self.update_focus_analysis()
             self.statusbar.showMessage(f"Channel changed to {self.channel_comboBox.currentText()}")
         else:
             self.set_display_data(self.loaded_map)
             self.update_image()
+            self.update_focus_analysis()
             self.statusbar.showMessage(f"Channel changed to {self.channel_comboBox.currentText()}")
 
+    def prefetch_planes(self, index):
+        entry = self.display_channel
+        if entry is None:
+            return
+        for neighbour in (index + 1, index - 1):
+            if 0 <= neighbour < entry.data.shape[0]:
+                entry.plane(neighbour, self.display_level)
+
+    def colour_scale_change(self):
+        if self.display_channel is None:
+            return
+        levels = self.plane_levels(self.datascroll_spinBox.value())
+        if levels is not None:
+            self.cbar.setLevels(values = levels)
+
+    def view_range_change(self):
+        # Coarser or finer pyramid level after zooming
+        if self.display_channel is None:
+            return
+        level = self.view_level()
+        if level != self.display_level:
+            self.display_level = level
+            self.update_image()
+
+    def toggle_focus_analysis(self):
+        if self.live_timer.isActive():
+            self.update_focus_analysis(self.currentZindex)
+        else:
+            self.update_focus_analysis()
+
+    def update_focus_analysis(self, planes=None):
+        # Analyse all planes of the displayed map (or the first planes while
+        # scanning); the overlay shows the displayed plane
+        map = self.loaded_map if self.loaded_map is not None else self.mirror_map
+        if not self.focus_checkBox.isChecked() or map is None or planes == 0:
+            self.focus_result = None
+        else:
+            map = self.displayed_map(map)
+            self.focus_result = focus_analysis.analyse(map, self.channel_comboBox.currentText(), planes)
+            self.focus_map = map
+        self.update_focus_overlay()
+
+    def display_position(self, map, x, y):
+        # Grid position in nm -> image coordinates in μm (pixel centers)
+        dx = (np.asarray(x) + map.sizeX/2)/map.sizeX*(map.Nx-1) if map.Nx > 1 else 0
+        dy = (np.asarray(y) + map.sizeY/2)/map.sizeY*(map.Ny-1) if map.Ny > 1 else 0
+        return (-map.sizeX/2 + (dx+0.5)*map.sizeX/map.Nx)/1000, (-map.sizeY/2 + (dy+0.5)*map.sizeY/map.Ny)/1000
+
+    def update_focus_overlay(self):
+        result = self.focus_result
+        index = self.datascroll_spinBox.value()
+        self.focusCurve.setData([], [])
+        self.focusMarker.clear()
+        self.focusText.setText('')
+        if result is None:
+            self.focus_label.setText('')
+            return
+        map = self.focus_map
+        best = result['best_plane']
+        bx, by, bz = focus_analysis.absolute(map, result['best_focus'])
+        self.focus_label.setText(f'Best: plane {best}, ({bx/1000:.2f}, {by/1000:.2f}, {bz/1000:.2f}) μm')
+        if index >= len(result['peak']):
+            # Plane still being measured
+            return
+        x, y = result['fit_x'][index], result['fit_y'][index]
+        major, minor, angle = result['fit_fwhm_major'][index], result['fit_fwhm_minor'][index], result['fit_angle'][index]
+        source = 'fit'
+        if not np.all(np.isfinite([x, y, major, minor, angle])):
+            x, y = result['centroid_x'][index], result['centroid_y'][index]
+            major, minor, angle = result['fwhm_major'][index], result['fwhm_minor'][index], result['angle'][index]
+            source = 'moments'
+        t = np.linspace(0, 2*np.pi, 100)
+        a = np.radians(angle)
+        ex = x + major/2*np.cos(t)*np.cos(a) - minor/2*np.sin(t)*np.sin(a)
+        ey = y + major/2*np.cos(t)*np.sin(a) + minor/2*np.sin(t)*np.cos(a)
+        self.focusCurve.setData(*self.display_position(map, ex, ey))
+        px, py = self.display_position(map, x, y)
+        self.focusMarker.setData([px], [py])
+        self.focusText.setPos(px, py)
+        self.focusText.setText(f'FWHM {major/1000:.2f} x {minor/1000:.2f} μm ({source})')
+
     def imageHoverEvent(self,event):
         # Show the position, pixel, and value under the mouse cursor.
         if event.isExit():
             self.plot_area.setTitle("")
             return
         pos = event.pos()
-        i, j = pos.y(), pos.x()
+        # Image pixels of a pyramid level -> pixels of the plane
+        shown = self.imItem.image.shape
+        i, j = pos.y()*self.data_to_plot.shape[0]/shown[0], pos.x()*self.data_to_plot.shape[1]/shown[1]
         i = int(np.clip(i, 0, self.data_to_plot.shape[0] - 1))
         j = int(np.clip(j, 0, self.data_to_plot.shape[1] - 1))
         val = self.data_to_plot[i, j]
@@ -409,43 +545,79 @@ class MainWindow(uiclass, baseclass):
         self.plot_area.setTitle("pos: (%0.1f, %0.1f)  pixel: (%d, %d)  value: %.3g" % (x, y, i, j, val))
 
     def imageClickEvent(self, event):
-        if self.click_move_enabled:
-            # Create motor object
-            p = self.motors.Mirror()
-            if not p.is_active:
-                p.activate()
-            self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
-            pos_before = p.absolute_position
-            self.status_bar_update(f"Absolute BEFORE center move: {pos_before}")
+        if self.click_move_enabled and self.scanning():
+            self.status_bar_update('Wait until the scan has finished!')
+        elif self.click_move_enabled and self.center_pos_abs is None:
+            self.status_bar_update('Position of the mirror unknown, scan or resume a scan first')
+        elif self.click_move_enabled:
             # Get mouse position
             pos = event.pos()
             ppos = self.imItem.mapToParent(pos)
             x, y = ppos.x(), ppos.y()
             dx = x - self.center_pos_rel[0]
             dy = y - self.center_pos_rel[1]
-            # Go to position
-            p.go_relative(dx*1000,dy*1000,0)
-            p.await_movement()
+            # Go to position in the motion thread; clicks during the move
+            # replace the target, Z is kept
+            self.motion.context = self.context
+            self.motion.motors = self.motors
+            self.motion.request([self.center_pos_abs[0] + dx*1000, self.center_pos_abs[1] + dy*1000, None])
             self.status_bar_update(f"Relative move to {[x,y]}")
-            # Check new position
-            self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
-            self.center_pos_abs = p.absolute_position
-            self.status_bar_update(f"Absolute AFTER center move: {self.center_pos_abs}")
-            # Replace center marker
-            realdx = (self.center_pos_abs[0] - pos_before[0])/1000
-            realdy = (self.center_pos_abs[1] - pos_before[1])/1000
-            self.center_pos_rel = [self.center_pos_rel[0] + realdx, self.center_pos_rel[1] + realdy]
-            self.center_marker = [{'pos': self.center_pos_rel, 'data': 1}]
-            self.scatterItem.clear()
-            self.scatterItem.addPoints(self.center_marker)
-            self.click_move_enabled = False
+            self.move_to_button.setText('Stop move')
             self.move_to_button.setEnabled(True)
         else:
             pass
 
+    def move_started(self, target):
+        self.statusbar.showMessage(f"Moving to ({target[0]/1000:.2f}, {target[1]/1000:.2f}) μm")
+
+    def move_done(self, target, position):
+        self.status_bar_update(f"Absolute AFTER center move: {position}")
+        # Replace center marker
+        realdx = (position[0] - self.center_pos_abs[0])/1000
+        realdy = (position[1] - self.center_pos_abs[1])/1000
+        self.center_pos_abs = position
+        self.center_pos_rel = [self.center_pos_rel[0] + realdx, self.center_pos_rel[1] + realdy]
+        self.center_marker = [{'pos': self.center_pos_rel, 'data': 1}]
+        self.scatterItem.clear()
+        self.scatterItem.addPoints(self.center_marker)
+
+    def move_failed(self, text):
+        self.status_bar_update(f"Move failed: {text}")
+
+    def move_idle(self):
+        # A request made after the executor went idle is still running
+        if self.motion.busy:
+            return
+        self.click_move_enabled = False
+        self.move_to_button.setText('Move to')
+        self.move_to_button.setEnabled(True)
+
+    def scanning(self):
+        # A scan runs in the worker thread or in the scan process
+        return self.live_timer.isActive() or self.process_scan
+
+    def mirror_moving(self):
+        if self.motion.busy:
+            self.status_bar_update('Wait until the mirror has stopped moving!')
+        return self.motion.busy
+
     def start_scan(self):
+        if self.mirror_moving():
+            return
         # Create map object and set up scan parameters
-        self.mirror_map = mirror_scan()
+        profile = acquisition_profile(sampling_time = self.samplingTime_spinBox.value(),
+                                      settle_time = self.settleTime_spinBox.value(),
+                                      samples = self.samples_spinBox.value(),
+                                      reduction = self.reduction_comboBox.currentText())
+        channels = default_channels
+        if profile.samples > 1 and not self.flyscan_checkBox.isChecked():
+            channels = default_channels + std_channels
+        # Sparse sampling applies to step scans only
+        sparse = (self.sparse_checkBox.isChecked() and self.sparse_spinBox.value() < 100
+                  and not self.adaptive_checkBox.isChecked() and not self.flyscan_checkBox.isChecked())
+        if sparse:
+            channels = channels + sparse_channels
+        self.mirror_map = mirror_scan(channels, optical_dtype=self.config.get('optical_dtype', 'float32'))
         self.mirror_map.step_sizeX = self.stepX_spinBox.value()*1000 #in nm
         self.mirror_map.step_sizeY = self.stepY_spinBox.value()*1000
         self.mirror_map.step_sizeZ = self.stepZ_spinBox.value()*1000
@@ -458,15 +630,34 @@ class MainWindow(uiclass, baseclass):
         print(f'StepX: {self.mirror_map.step_sizeX} StepY: {self.mirror_map.step_sizeY}')
         # Send the map object to worker object
         self.worker.scan_map = self.mirror_map
+        self.worker.scan_path = self.scanPath_comboBox.currentText()
+        self.worker.profile = profile
+        self.worker.focus_channel = self.channel_comboBox.currentText()
+        self.worker.sparse_fraction = self.sparse_spinBox.value()/100 if sparse else None
+        self.worker.resume = False
+        # The scan is always streamed to a file so that it can be resumed;
+        # without autosave the checkpoint is removed when the scan completes
+        if self.AutosaveCheckBox.isChecked():
+            self.worker.save_name = scan_io.scan_file_name(self.mirror_map)
+            self.checkpoint_only = False
+        else:
+            os.makedirs(self.checkpoint_folder, exist_ok=True)
+            self.worker.save_name = os.path.join(self.checkpoint_folder, scan_io.scan_file_name(self.mirror_map))
+            self.checkpoint_only = True
+        self.worker.files = []
         # Check if connected
         if self.connected:
-            # Pass SDK objects to worker thread
-            self.worker.nea = self.nea
-            self.worker.context = self.context
-            self.worker.motors = self.motors
-            self.worker.Vector3D = self.Vector3D
+            self.pass_connection_to_worker()
             # Emit Signal to start scan at worker thread Slot
-            self.work_requested.emit()
+            if self.adaptive_checkBox.isChecked():
+                self.worker.focus_resolution = self.resolution_spinBox.value()*1000 #in nm
+                self.start_live_view()
+                self.scan_requested.emit('adaptive')
+            elif self.flyscan_checkBox.isChecked():
+                self.worker.fly_velocity = self.flyVelocity_spinBox.value()*1000 #in nm/s
+                self.run_scan('fly')
+            else:
+                self.run_scan('step')
             self.connect_snom_button.setEnabled(False)
         else:
             self.status_bar_update('Connect to neaSNOM before scanning!')
@@ -481,37 +672,302 @@ class MainWindow(uiclass, baseclass):
             msg.setInformativeText("Connect to neaSNOM first! Click OK to connect!")
             button = msg.exec_()
             if button == QMessageBox.Ok:
-                self.connect_to_neasnom()
+                self.session.start()
             else:
                 pass
             
-    def update_scan_progress(self, v):
-        self.currentZindex = v
-        self.mirror_map = self.worker.scan_map
+    def pass_connection_to_worker(self):
+        # Pass SDK objects to worker thread; the session gives it new ones
+        # after a reconnect
+        self.worker.use_connection((self.context, self.nea, self.motors))
+        self.worker.session = self.session
+        self.worker.pipelined = self.config.get('pipelined_moves', True)
+        self.worker.motion = motion_profile.from_config(self.config.get('motion'))
+
+    def resume_scan(self):
+        # Continue an interrupted scan from the first incomplete row, around
+        # the center point and with the settings stored in its checkpoint
+        if not self.connected:
+            self.status_bar_update('Connect to neaSNOM before resuming a scan!')
+            return
+        if self.mirror_moving():
+            return
+        fname = QFileDialog.getOpenFileName(self, "Resume scan", self.checkpoint_folder, "Binary scans (*.npy *.yaml)")[0]
+        if fname:
+            self.resume_file(fname)
+
+    def resume_file(self, fname):
+        if not self.connected:
+            self.status_bar_update('Connect to neaSNOM before resuming a scan!')
+            return
+        try:
+            scan_map, metadata, completed = scan_io.load_checkpoint(fname)
+            settings = metadata.get('scan') or {}
+            if settings.get('mode') == 'adaptive':
+                raise ValueError('adaptive scans cannot be resumed')
+            profile = acquisition_profile.from_dict(metadata.get('acquisition'))
+        except (OSError, ValueError, KeyError) as error:
+            self.status_bar_update(f'Cannot resume scan: {error}')
+            return
+        self.mirror_map = scan_map
+        self.worker.scan_map = scan_map
+        self.worker.scan_path = settings.get('path', 'Raster')
+        self.worker.profile = profile
+        self.worker.focus_channel = self.channel_comboBox.currentText()
+        self.worker.save_name = scan_io.stem(fname)
+        self.worker.sparse_fraction = settings.get('sparse')
+        self.worker.resume = True
+        self.worker.files = []
+        self.checkpoint_only = False
+        self.pass_connection_to_worker()
+        if settings.get('mode') == 'fly':
+            self.worker.fly_velocity = settings['fly_velocity']
+            self.run_scan('fly')
+        else:
+            self.run_scan('step')
+        self.connect_snom_button.setEnabled(False)
+
+    def run_scan(self, mode):
+        # Step and fly scans of the prepared worker, in the scan process
+        # when it is enabled
+        if self.config.get('scan_process', False):
+            self.start_process_scan(mode)
+        else:
+            self.start_live_view()
+            self.scan_requested.emit(mode)
+
+    def start_process_scan(self, mode):
+        if self.scan_process is None:
+            self.scan_process = scan_process(self.config)
+        settings = {'mode': mode, 'path': self.worker.scan_path, 'acquisition': self.worker.profile.as_dict(),
+                    'save_name': self.worker.save_name, 'resume': self.worker.resume,
+                    'focus_channel': self.worker.focus_channel, 'fly_velocity': self.worker.fly_velocity,
+                    'sparse': self.worker.sparse_fraction}
+        # The shared map is displayed directly, row by row
+        shared = self.scan_process.start(self.worker.scan_map, settings)
+        self.process_scan = True
+        self.live_timer.start()
+        self.display_cache.clear()
+        self.show_live_map(shared, 0)
+        self.timing_label.setText('')
+        self.regrid_label.setText('')
+
+    def drain_process_messages(self):
+        # Planes with rows completed by the scan process since the last frame
+        planes = set()
+        for message in self.scan_process.messages():
+            kind = message[0]
+            if kind == 'status':
+                self.status_bar_update(message[1])
+            elif kind == 'timing':
+                self.timing_update(message[1])
+            elif kind == 'progress':
+                idz, idy = message[1], message[2]
+                planes.add(idz)
+                if idz != self.currentZindex:
+                    self.currentZindex = idz
+                    self.live_levels = [np.inf, -np.inf]
+                channel = self.channel_comboBox.currentText()
+                if channel in self.mirror_map.channels:
+                    row = getattr(self.mirror_map, channel)[idz,idy]
+                    self.live_levels = [min(self.live_levels[0], np.nanmin(row)), max(self.live_levels[1], np.nanmax(row))]
+            elif kind in ('completed', 'failed'):
+                self.process_scan_finished(message)
+                return set()
+        return planes
+
+    def process_scan_finished(self, message):
+        result = message[1] if message[0] == 'completed' else None
+        scan_map = self.scan_process.finished_map(result)
+        self.process_scan = False
+        # Nothing may keep a view on the shared map
+        self.focus_map = None
+        self.focus_result = None
+        if result is None:
+            self.scan_failed(message[1], scan_map)
+        else:
+            self.scan_complete(scan_map, result['files'])
+        self.scan_process.release()
+
+    def stop_scan_process(self):
+        if self.scan_process is not None:
+            self.scan_process.close()
+            self.scan_process = None
+
+    def closeEvent(self, event):
+        # A running scan stops before its next pixel or row, a paused one
+        # gives up with the session; the checkpoint can be resumed
+        self.worker.cancel()
+        self.stop_scan_process()
+        self.session.stop()
+        self.motion.cancel()
+        self.motion_thread.quit()
+        self.motion_thread.wait()
+        self.worker_thread.quit()
+        if not self.worker_thread.wait(10000):
+            print('The scan did not stop within 10 s')
+        super().closeEvent(event)
+
+    def start_live_view(self):
+        # The worker pushes every measured pixel into a ring buffer, which is
+        # drained into a copy of the scan map at the live frame rate; the
+        # arrays written by the worker are only displayed after the scan.
+        # Started first, the live map is displayed as measured.
+        self.live_timer.start()
+        scan_map = self.worker.scan_map
+        self.ring = pixel_ring([name for name in scan_map.channels if name not in mechanical_channels + sparse_channels],
+                               self.config.get('live_buffer', 65536))
+        self.worker.ring = self.ring
+        self.display_cache.clear()
+        live_map = scan_map.copy()
+        if self.worker.sparse_fraction:
+            # Same pixels as the worker, which starts after the copy
+            sparse_scan.clear_unmeasured(live_map, sparse_scan.sample_mask(live_map.Nz, live_map.Ny, live_map.Nx,
+                                                                         self.worker.sparse_fraction))
+        self.show_live_map(live_map, 0)
+        self.timing_label.setText('')
+        self.regrid_label.setText('')
+
+    def show_live_map(self, map, map_id):
+        self.live_map_id = map_id
+        self.currentZindex = 0
+        self.live_plane = 0
+        self.live_levels = [np.inf, -np.inf]
+        self.mirror_map = map
         self.set_display_data(self.mirror_map)
         self.update_image()
-        # self.statusbar.showMessage(f'X = {self.worker.scan_map.X[-1]}, Y = {self.worker.scan_map.Y[-1]}, Z = {self.worker.scan_map.Z[-1]}')
-        
-    def scan_complete(self):
+        self.update_focus_analysis(0)
+
+    def drain_live_data(self):
+        # Planes with new pixels, all records waiting in the ring in one batch
+        batch = self.ring.drain()
+        if batch is None:
+            return set()
+        index, times, positions, values = batch
+        newest = int(index[-1,0])
+        if newest != self.live_map_id:
+            # Adaptive scans continue on a new map
+            self.show_live_map(self.ring.maps[newest].copy(data=False), newest)
+        keep = index[:,0] == newest
+        idz, idy, idx = index[keep,1], index[keep,2], index[keep,3]
+        for column, name in enumerate(mechanical_channels):
+            getattr(self.mirror_map, name)[idz,idy,idx] = positions[keep,column]
+        for column, name in enumerate(self.ring.channels):
+            getattr(self.mirror_map, name)[idz,idy,idx] = values[keep,column]
+        if not len(idz):
+            return set()
+        if idz[-1] != self.currentZindex:
+            self.currentZindex = int(idz[-1])
+            self.live_levels = [np.inf, -np.inf]
+        channel = self.channel_comboBox.currentText()
+        if channel in self.ring.channels:
+            current = values[keep,self.ring.channels.index(channel)][idz == self.currentZindex]
+            if len(current):
+                self.live_levels = [min(self.live_levels[0], current.min()), max(self.live_levels[1], current.max())]
+        return set(idz.tolist())
+
+    def refresh_live_view(self):
+        planes = self.drain_process_messages() if self.process_scan else self.drain_live_data()
+        if not planes:
+            return
+        if self.currentZindex != self.live_plane:
+            # Follow the scan to the next Z plane
+            self.live_plane = self.currentZindex
+            self.datascroll_spinBox.setRange(0, self.currentZindex)
+            self.datascroll_spinBox.setValue(self.currentZindex)
+            # The planes before the current one are complete
+            self.update_focus_analysis(self.currentZindex)
+        index = self.datascroll_spinBox.value()
+        if index in planes:
+            self.data_to_plot = self.meas_data[index,:,:]
+            self.imItem.setImage(image = self.data_to_plot, autoLevels = False)
+            if index == self.currentZindex and self.live_levels[0] < self.live_levels[1]:
+                self.cbar.setLevels(values = self.live_levels)
+
+    def scan_complete(self, scan_map=None, files=None):
+        # scan_map and files of a scan run in the scan process, by default
+        # those of the worker
+        self.live_timer.stop()
+        self.worker.ring = None
         # Push measured map to display
-        self.mirror_map = self.worker.scan_map
+        self.mirror_map = self.worker.scan_map if scan_map is None else scan_map
         self.center_pos_abs = self.mirror_map.center_point
         self.center_pos_rel = [0,0]
+        end = self.worker.end_position if scan_map is None else None
+        if end is not None:
+            # Adaptive scans end at the maximum, off the center of the map
+            center = self.center_pos_abs
+            self.center_pos_rel = [(end[0] - center[0])/1000, (end[1] - center[1])/1000]
+            self.center_pos_abs = end
         self.center_marker = [{'pos': self.center_pos_rel, 'data': 1}]
         self.set_display_data(self.mirror_map)
         self.update_image()
         self.loaded_map = None
+        self.update_focus_analysis()
         self.connect_snom_button.setEnabled(True)
-        if self.AutosaveCheckBox.isChecked():
+        # Binary scans were already written while scanning
+        if self.AutosaveCheckBox.isChecked() and self.saveFormat_comboBox.currentText() == 'Text (.dat)':
             self.save_data()
+        if self.checkpoint_only:
+            for fname in (self.worker.files if files is None else files):
+                scan_io.remove_scan(fname)
+
+    def scan_failed(self, text, scan_map=None):
+        # Display the measured rows; the checkpoint is neither exported nor
+        # removed, so that it can be resumed
+        self.live_timer.stop()
+        self.worker.ring = None
+        self.mirror_map = self.worker.scan_map if scan_map is None else scan_map
+        # The mirror stopped somewhere in the scan, clicks move relative to
+        # its center point
+        self.center_pos_abs = self.mirror_map.center_point
+        self.center_pos_rel = [0,0]
+        self.center_marker = [{'pos': self.center_pos_rel, 'data': 1}]
+        self.set_display_data(self.mirror_map)
+        self.update_image()
+        self.loaded_map = None
+        self.update_focus_analysis()
+        self.connect_snom_button.setEnabled(True)
+        fname = self.worker.save_name + '.npy'
+        # Adaptive scans (one file per level) cannot be resumed
+        resumable = os.path.exists(scan_io.metadata_name(fname))
+        msg = QMessageBox(self)
+        msg.setWindowTitle("Scan failed!")
+        msg.setText(f"Scan failed: {text}")
+        msg.setIcon(QMessageBox.Critical)
+        if resumable:
+            self.status_bar_update(f'Scan failed: {text}. The measured rows can be resumed.')
+            msg.setStandardButtons(QMessageBox.Ok|QMessageBox.Cancel)
+            msg.button(QMessageBox.Ok).setText('Resume')
+            msg.setInformativeText(f"The measured rows are kept in {fname}. Click Resume to continue the scan.")
+        else:
+            self.status_bar_update(f'Scan failed: {text}')
+            msg.setStandardButtons(QMessageBox.Ok)
+        if msg.exec_() == QMessageBox.Ok and resumable:
+            self.resume_file(fname)
 
     def status_bar_update(self, m):
         self.statusbar.showMessage(m)
         print(m)
 
+    def timing_update(self, summary):
+        self.timing_label.setText(scan_timing.format_summary(summary))
+
     def enable_move_to_point(self):
+        if self.motion.busy:
+            # Stop move: the commanded move is completed, newer clicks dropped
+            self.motion.cancel()
+            self.click_move_enabled = False
+            self.move_to_button.setEnabled(False)
+            self.statusbar.showMessage('Stopping after the current move')
+            return
+        if self.scanning():
+            self.status_bar_update('Wait until the scan has finished!')
+            return
         if self.connected:
-            if self.mirror_map is not None:
+            if self.center_pos_abs is None:
+                self.status_bar_update('Position of the mirror unknown, scan or resume a scan first')
+            elif self.mirror_map is not None:
                 self.click_move_enabled = True
                 self.move_to_button.setEnabled(False)
             else:
@@ -527,18 +983,17 @@ class MainWindow(uiclass, baseclass):
 
     def save_data(self):
         if self.mirror_map is not None:
-            fname = f'{datetime.datetime.now().strftime("%Y.%m.%d-%H.%M")}_2D_Mirror_scan_{self.mirror_map.sizeX}x{self.mirror_map.sizeY}_{self.mirror_map.step_sizeX}um.dat'
-            X = self.mirror_map.X.flatten()
-            Y = self.mirror_map.Y.flatten()
-            Z = self.mirror_map.Z.flatten()
-            O1A = self.mirror_map.O1A.flatten()
-            O2A = self.mirror_map.O2A.flatten()
-            O3A = self.mirror_map.O3A.flatten()
-            O4A = self.mirror_map.O4A.flatten()
-            M = np.array([X,Y,Z,O1A,O2A,O3A,O4A])
-            np.savetxt(fname, M.T,
-                        header='\n'.join([f'SizeX = {self.mirror_map.sizeX}', f'SizeY = {self.mirror_map.sizeY}',f'SizeZ = {self.mirror_map.sizeZ}',
-                        f'StepX = {self.mirror_map.step_sizeX}',f'StepY = {self.mirror_map.step_sizeY}',f'StepZ = {self.mirror_map.step_sizeZ}']))
+            fname = scan_io.scan_file_name(self.mirror_map)
+            if self.saveFormat_comboBox.currentText() == 'Text (.dat)':
+                scan_io.export_dat(fname + '.dat', self.mirror_map)
+            else:
+                metadata = {}
+                if self.focus_result is not None and self.focus_map is self.mirror_map:
+                    metadata['focus'] = focus_analysis.as_dict(self.focus_result, self.mirror_map)
+                scan_io.save_scan(fname + '.npy', self.mirror_map, metadata)
+                # Timing trace of the scan that measured this map
+                if self.worker.timing is not None and self.worker.scan_map is self.mirror_map:
+                    self.worker.export_timing(fname)
 
     def link_scan_size(self):
         if self.sizes_linked:
@@ -576,51 +1031,6 @@ class MainWindow(uiclass, baseclass):
             value = self.sizeX_spinBox.value()
             self.sizeY_spinBox.setValue(value)
         
-class mirror_scan:
-    def __init__(self):
-        # Parameters
-        self.center_point = None
-        self.step_sizeX = None
-        self.step_sizeY = None
-        self.step_sizeZ = None
-
-        self.sizeX = None
-        self.sizeY = None
-        self.sizeZ = None
-
-        self.Nx = None
-        self.Ny = None
-        self.Nz = None
-
-        # Data
-        self.O1A = []
-        self.O2A = []
-        self.O3A = []
-        self.O4A = []
-
-        self.X = []
-        self.Y = []
-        self.Z = []
-
-    def recalc_size(self):
-        self.Nx = int(self.sizeX/self.step_sizeX)
-        self.Ny = int(self.sizeY/self.step_sizeY)
-        self.Nz = int(self.sizeZ/self.step_sizeZ)
-        if self.Nz == 0:
-            self.Nz = 1
-        else:
-            self.Nz = int(self.sizeZ/self.step_sizeZ)
-
-    def create_array(self):
-        self.O1A = np.zeros((self.Nz,self.Nx,self.Ny))
-        self.O2A = np.zeros((self.Nz,self.Nx,self.Ny))
-        self.O3A = np.zeros((self.Nz,self.Nx,self.Ny))
-        self.O4A = np.zeros((self.Nz,self.Nx,self.Ny))
-
-        self.X = np.zeros((self.Nz,self.Nx,self.Ny))
-        self.Y = np.zeros((self.Nz,self.Nx,self.Ny))
-        self.Z = np.zeros((self.Nz,self.Nx,self.Ny))
-
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     w = MainWindow()
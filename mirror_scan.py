@@ -0,0 +1,114 @@
+import numpy as np
+
+# Channel registry: mechanical channels (measured mirror position in nm) and
+# optical amplitude (A) and phase (P) of the demodulation orders 0..5. The
+# optical channels are read from OpticalAmplitude[order] / OpticalPhase[order].
+# With several samples per pixel the standard deviation of an optical channel
+# is stored in <name>_std. Regridded scans (regrid.py) carry error maps of the
+# positioning in nm, sparse scans (sparse_scan.py) the confidence of the
+# reconstructed pixels.
+mechanical_channels = ['X', 'Y', 'Z']
+optical_channels = [f'O{order}A' for order in range(6)] + [f'O{order}P' for order in range(6)]
+std_channels = [f'{name}_std' for name in optical_channels]
+error_channels = ['dX', 'dY', 'dZ', 'gap']
+sparse_channels = ['confidence']
+channel_registry = {name: {'kind': 'mechanical'} for name in mechanical_channels}
+for name in optical_channels:
+    channel_registry[name] = {'kind': 'amplitude' if name[-1] == 'A' else 'phase', 'order': int(name[1])}
+for name in std_channels:
+    channel_registry[name] = {'kind': 'std', 'channel': name[:-4]}
+for name in error_channels:
+    channel_registry[name] = {'kind': 'error'}
+for name in sparse_channels:
+    channel_registry[name] = {'kind': 'confidence'}
+
+default_channels = mechanical_channels + optical_channels
+
+def optical_order(name):
+    return channel_registry[name]['order']
+
+def is_phase(name):
+    return channel_registry[name]['kind'] == 'phase'
+
+class mirror_scan:
+    def __init__(self, channels=None, optical_dtype='float32'):
+        # Parameters
+        self.center_point = None
+        self.step_sizeX = None
+        self.step_sizeY = None
+        self.step_sizeZ = None
+
+        self.sizeX = None
+        self.sizeY = None
+        self.sizeZ = None
+
+        self.Nx = None
+        self.Ny = None
+        self.Nz = None
+
+        # Acquisition profile used for the scan (dict)
+        self.acquisition = None
+
+        # Recorded channels and the dtype of the optical ones; positions
+        # are always float64
+        self.channels = list(default_channels if channels is None else channels)
+        self.optical_dtype = np.dtype(optical_dtype)
+
+        # Data: one contiguous buffer, every channel is a (Nz,Ny,Nx) view on it
+        self.buffer = None
+        for name in self.channels:
+            setattr(self, name, [])
+
+    @property
+    def optical(self):
+        # Channels read from the optical signal
+        return [name for name in self.channels if channel_registry[name]['kind'] in ('amplitude', 'phase')]
+
+    @property
+    def display_channels(self):
+        return [name for name in self.channels if name not in mechanical_channels]
+
+    def channel_dtype(self, name):
+        if name in mechanical_channels:
+            return np.dtype('float64')
+        return self.optical_dtype
+
+    def recalc_size(self):
+        self.Nx = int(self.sizeX/self.step_sizeX)
+        self.Ny = int(self.sizeY/self.step_sizeY)
+        self.Nz = int(self.sizeZ/self.step_sizeZ)
+        if self.Nz == 0:
+            self.Nz = 1
+        else:
+            self.Nz = int(self.sizeZ/self.step_sizeZ)
+
+    def copy(self, data=True):
+        # Same settings and channels in a new buffer, with a copy of the data
+        # or zeros
+        other = mirror_scan(self.channels, self.optical_dtype)
+        for name in ('step_sizeX', 'step_sizeY', 'step_sizeZ', 'sizeX', 'sizeY', 'sizeZ', 'Nx', 'Ny', 'Nz', 'acquisition'):
+            setattr(other, name, getattr(self, name))
+        other.center_point = None if self.center_point is None else list(self.center_point)
+        other.create_array()
+        if data:
+            for name in self.channels:
+                getattr(other, name)[...] = getattr(self, name)
+        return other
+
+    def nbytes(self):
+        return sum(self.channel_dtype(name).itemsize for name in self.channels)*self.Nz*self.Ny*self.Nx
+
+    def create_array(self, buffer=None):
+        # Struct-of-arrays layout, channels stored one after the other.
+        # An existing buffer (e.g. shared memory) of nbytes() can be passed.
+        shape = (self.Nz,self.Ny,self.Nx)
+        if buffer is None:
+            buffer = np.zeros(self.nbytes(), dtype=np.uint8)
+        self.buffer = buffer
+        offset = 0
+        for name in self.channels:
+            dtype = self.channel_dtype(name)
+            size = dtype.itemsize*self.Nz*self.Ny*self.Nx
+            view = np.frombuffer(buffer, dtype=dtype, count=self.Nz*self.Ny*self.Nx, offset=offset)
+            setattr(self, name, view.reshape(shape))
+            offset += size
@@ -0,0 +1,81 @@
+import threading
+from PySide6.QtCore import QObject, Signal, Slot
+
+# Interactive mirror moves (click-to-move) of the GUI, run in their own
+# QThread so that the window stays responsive while the mirror travels.
+#
+# request() only stores the target and wakes the thread. Targets requested
+# while a move is running replace each other, so after the move only the
+# latest one is moved to. cancel() drops the pending target; a move that was
+# already commanded is completed, the SDK has no command to stop it.
+#
+#   started(target)           move to target begins
+#   moved(target, position)   move done, position measured afterwards
+#   failed(text)              the pending target is dropped as well
+#   idle()                    no target left (also after a cancel or failure)
+# Targets and positions are absolute X, Y, Z in nm; a target None for an axis
+# keeps its current position.
+
+class motion_executor(QObject):
+    started = Signal(object)
+    moved = Signal(object, object)
+    failed = Signal(str)
+    idle = Signal()
+    wake = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self.context = None
+        self.motors = None
+        self.lock = threading.Lock()
+        self.pending = None
+        # True from request() until no target is left
+        self.busy = False
+        # Queued: run() is executed in the thread of the executor
+        self.wake.connect(self.run)
+
+    def request(self, target):
+        with self.lock:
+            self.pending = list(target)
+            self.busy = True
+        self.wake.emit()
+
+    def cancel(self):
+        # True when a pending target was dropped
+        with self.lock:
+            dropped = self.pending is not None
+            self.pending = None
+        return dropped
+
+    @Slot()
+    def run(self):
+        while True:
+            with self.lock:
+                target = self.pending
+                self.pending = None
+                if target is None:
+                    self.busy = False
+                    break
+            self.started.emit(target)
+            try:
+                position = self.move_to(target)
+            except Exception as error:
+                with self.lock:
+                    self.pending = None
+                    self.busy = False
+                self.failed.emit(repr(error))
+                break
+            self.moved.emit(target, position)
+        self.idle.emit()
+
+    def move_to(self, target):
+        p = self.motors.Mirror()
+        if not p.is_active:
+            p.activate()
+        self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+        pos = p.absolute_position
+        p.go_relative(*[0 if t is None else t - now for t, now in zip(target, pos)])
+        p.await_movement()
+        # Check position after the movement
+        self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+        return [float(v) for v in p.absolute_position]
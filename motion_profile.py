@@ -0,0 +1,167 @@
+import numpy as np
+from time import sleep
+from timeit import default_timer as timer
+
+# Motion profiles of the step scans (motion: enabled: true in config.yaml).
+#
+# Velocity: every axis moves at a fraction of MirrorMotorVelocityInContacting
+# chosen from the length of its move: fractions[axis][k] for moves up to
+# steps[k] nm, the last fraction for longer moves. Short steps are made slowly
+# so that they overshoot less, long moves (new rows and planes, the return to
+# the center) at full speed. The velocity is only sent when it changes.
+#
+# Settling: instead of awaiting the generic end of the movement, the position
+# is read until the last `readings` values of every axis agree within
+# `tolerance` nm and are within the target tolerance of the target; the last
+# reading is the position of the pixel, so no extra refresh is needed. After
+# `timeout` s the move is awaited as before and counted as a timeout.
+# Readings only count once the stage is closer to the target than to the
+# start of the move, so that a stage which has not started yet is not taken
+# as settled. The target tolerance is `target_tolerance` nm, but at most
+# `target_fraction` of the step (and at least `tolerance`), so that short
+# steps are not settled at the old position.
+#
+# Every settled move is recorded per axis (time until the axis stayed within
+# tolerance of its final reading, and the final distance to the target), so
+# that the tolerances can be tuned; summary() is saved with the scan timing.
+
+axes = ['X', 'Y', 'Z']
+default_settings = {
+    'enabled': False,
+    'steps': [200, 1000],                                       # nm
+    'fractions': {'X': [0.25, 0.5, 1], 'Y': [0.25, 0.5, 1], 'Z': [0.25, 0.5, 1]},
+    'tolerance': 20,                                            # nm
+    'target_tolerance': 100,                                    # nm
+    'target_fraction': 0.5,                                     # of the step
+    'readings': 3,
+    'poll_interval': 0,                                         # s, between readings
+    'timeout': 2,                                               # s
+}
+
+class motion_profile:
+    def __init__(self, settings=None):
+        self.settings = dict(default_settings)
+        if settings:
+            self.settings.update(settings)
+        s = self.settings
+        self.steps = np.asarray(s['steps'], dtype=float)
+        self.fractions = np.array([s['fractions'][axis] for axis in axes], dtype=float)
+        if self.fractions.shape[1] != len(self.steps) + 1:
+            raise ValueError(f'motion: every axis needs {len(self.steps) + 1} velocity fractions')
+        self.velocity = None
+        self.reset_statistics()
+
+    @classmethod
+    def from_config(cls, settings):
+        # None when motion profiles are disabled
+        if not settings or not settings.get('enabled', False):
+            return None
+        return cls(settings)
+
+    def reset_statistics(self):
+        self.settle_times = [[] for axis in axes]
+        self.errors = [[] for axis in axes]
+        self.durations = []
+        self.counts = []
+        self.timeouts = 0
+
+    def start(self, context):
+        # At the start of a scan, after the velocity was set to the safe one
+        self.safe_velocity = float(context.Microscope.Py.MirrorMotorVelocityInContacting)
+        self.velocity = [self.safe_velocity]*3
+        self.reset_statistics()
+
+    def velocities(self, move):
+        # Velocity of every axis for a relative move; axes that do not move
+        # keep theirs
+        band = np.searchsorted(self.steps, np.abs(np.asarray(move, dtype=float)))
+        chosen = self.fractions[np.arange(3), band]*self.safe_velocity
+        return [float(v) if d != 0 else current for v, d, current in zip(chosen, move, self.velocity)]
+
+    def apply(self, context, Vector3D, move):
+        velocity = self.velocities(move)
+        if velocity != self.velocity:
+            context.Microscope.Py.SetActiveMotorVelocityXyz(Vector3D(*velocity))
+            self.velocity = velocity
+
+    def target_tolerance(self, move):
+        step = float(np.max(np.abs(move)))
+        s = self.settings
+        return max(min(s['target_tolerance'], s['target_fraction']*step), s['tolerance'])
+
+    def settle(self, context, p, target, move):
+        # Position once the readings have converged at the target of the
+        # relative move
+        s = self.settings
+        target = np.asarray(target, dtype=float)
+        origin = target - np.asarray(move, dtype=float)
+        target_tolerance = self.target_tolerance(move)
+        start = timer()
+        times = []
+        readings = []
+        # Index of the first reading on the way to the target
+        first = None
+        while True:
+            context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+            readings.append(p.absolute_position)
+            times.append(timer() - start)
+            if first is None:
+                reading = np.asarray(readings[-1], dtype=float)
+                if np.linalg.norm(reading - target) < np.linalg.norm(reading - origin):
+                    first = len(readings) - 1
+            if first is not None and len(readings) - first >= s['readings']:
+                recent = np.asarray(readings[-s['readings']:], dtype=float)
+                if (np.all(np.ptp(recent, axis=0) <= s['tolerance'])
+                        and np.all(np.abs(recent[-1] - target) <= target_tolerance)):
+                    break
+            if times[-1] > s['timeout']:
+                p.await_movement()
+                context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+                readings.append(p.absolute_position)
+                times.append(timer() - start)
+                self.timeouts += 1
+                break
+            if s['poll_interval'] > 0:
+                sleep(s['poll_interval'])
+        self.record(np.asarray(times), np.asarray(readings, dtype=float), target)
+        return readings[-1]
+
+    def record(self, times, readings, target):
+        final = readings[-1]
+        for axis in range(3):
+            # First reading from which the axis stays within tolerance
+            outside = np.flatnonzero(np.abs(readings[:,axis] - final[axis]) > self.settings['tolerance'])
+            first = outside[-1] + 1 if outside.size else 0
+            self.settle_times[axis].append(times[first])
+            self.errors[axis].append(abs(final[axis] - target[axis]))
+        self.durations.append(times[-1])
+        self.counts.append(len(readings))
+
+    def summary(self):
+        # Settle statistics of the moves since start(), times in s, errors in nm
+        values = {'moves': len(self.durations), 'timeouts': self.timeouts,
+                  'settings': {key: self.settings[key] for key in ('steps', 'fractions', 'tolerance', 'target_tolerance',
+                                                                   'target_fraction', 'readings', 'timeout')}}
+        if not self.durations:
+            return values
+        values['settle_time'] = {'mean': float(np.mean(self.durations)), 'p95': float(np.percentile(self.durations, 95)),
+                                 'max': float(np.max(self.durations))}
+        values['readings'] = float(np.mean(self.counts))
+        for axis, name in enumerate(axes):
+            times = np.asarray(self.settle_times[axis])
+            errors = np.asarray(self.errors[axis])
+            values[name] = {'settle_mean': float(times.mean()), 'settle_p95': float(np.percentile(times, 95)),
+                            'error_mean': float(errors.mean()), 'error_p95': float(np.percentile(errors, 95)),
+                            'error_max': float(errors.max())}
+        return values
+
+def format_summary(summary):
+    # One line for the status bar and the log
+    if not summary['moves']:
+        return 'Settling: no moves'
+    text = (f'Settling: {summary["moves"]} moves, {summary["settle_time"]["mean"]*1000:.0f} ms mean, '
+            f'p95 {summary["settle_time"]["p95"]*1000:.0f} ms, {summary["timeouts"]} timeouts')
+    for name in axes:
+        axis = summary[name]
+        text += f'; {name} {axis["settle_mean"]*1000:.0f} ms, error p95 {axis["error_p95"]:.0f} nm'
+    return text
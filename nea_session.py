@@ -0,0 +1,209 @@
+import asyncio
+import threading
+from PySide6.QtCore import QObject, Signal
+import nea_sim
+
+# Connection to neaServer (or to the simulation) owned by a background thread,
+# shared by the GUI, the scan engine and the click-to-move executor.
+#
+# start() returns at once; the thread connects with a timeout per attempt and
+# retries with a growing interval. Once connected, the SDK handles (context,
+# nea, motors) are cached in handles and the link is checked every
+# heartbeat_interval s by reading the safe motor velocity. When the check
+# fails, or a scan reports a failed SDK call (report_lost), the handles are
+# dropped and the thread reconnects until it succeeds or stop() is called.
+# A scan waiting in wait_online() then continues with the new handles.
+#
+#   state_changed(state)   disconnected, connecting, connected, reconnecting
+#                          or failed (initial connect gave up after retries)
+#   message(text)          failed attempts and lost links, for the status bar
+# Signals are emitted from the session thread.
+
+default_settings = {
+    'connect_timeout': 20,          # s, per attempt
+    'retries': 3,                   # attempts of the initial connect
+    'retry_interval': 2,            # s, doubled after every failed attempt
+    'max_retry_interval': 30,       # s
+    'heartbeat_interval': 2,        # s, 0: no heartbeat
+    'reconnect_timeout': 600,       # s a paused scan waits for the link
+}
+
+# Errors that always mean a lost link; other errors of an SDK call are
+# checked with a heartbeat
+link_errors = (ConnectionError, TimeoutError)
+
+def open_connection(config, timeout=None, previous=None, loop=None):
+    # SDK objects (context, nea, motors) of the microscope or the simulation;
+    # previous: handles of a lost connection, loop: event loop of the
+    # connecting thread, which is kept for all attempts
+    simulation = dict(config.get('simulation') or {})
+    if simulation.pop('enabled', False):
+        return nea_sim.connect(simulation, previous[0].Microscope if previous else None)
+    import nea_tools
+    if previous is not None:
+        try:
+            nea_tools.disconnect()
+        except Exception:
+            pass
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(asyncio.wait_for(nea_tools.connect('nea-server', config['fingerprint'], config['path_to_dll']), timeout))
+    except asyncio.TimeoutError:
+        raise TimeoutError(f'no answer from neaServer within {timeout} s')
+    try:
+        from neaspec import context
+        import Nea.Client.SharedDefinitions as nea
+        from nea_tools.microscope import motors
+    except ModuleNotFoundError:
+        raise ConnectionError('Connection refused or timeout. Retry to connect again.')
+    return context, nea, motors
+
+def close_connection(config):
+    if (config.get('simulation') or {}).get('enabled', False):
+        return
+    import nea_tools
+    nea_tools.disconnect()
+
+def probe(handles):
+    # True when neaServer answers
+    try:
+        handles[0].Microscope.Py.MirrorMotorVelocityInContacting
+    except Exception:
+        return False
+    return True
+
+class nea_session(QObject):
+    state_changed = Signal(str)
+    message = Signal(str)
+
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.settings = dict(default_settings)
+        self.settings.update(config.get('session') or {})
+        self.lock = threading.Lock()
+        # Wakes the thread for a stop, a lost link or the next heartbeat
+        self.wake = threading.Event()
+        self.online = threading.Event()
+        self.handles = None
+        self.state = 'disconnected'
+        self.wanted = False
+        self.thread = None
+        # Event loop of the session thread for the asynchronous connect of
+        # nea_tools, shared by all attempts and closed with the thread
+        self.loop = None
+
+    def start(self):
+        with self.lock:
+            self.wanted = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def stop(self):
+        # Disconnects in the background; a waiting scan gives up
+        with self.lock:
+            self.wanted = False
+        self.wake.set()
+
+    @property
+    def active(self):
+        # Connected or trying to connect
+        return self.wanted
+
+    def report_lost(self):
+        # A scan found the link broken; when the session has reconnected
+        # meanwhile, the scan only had the handles of the lost connection
+        handles = self.handles
+        if self.online.is_set() and (handles is None or not probe(handles)):
+            self.online.clear()
+            self.wake.set()
+
+    def link_error(self, error):
+        # Whether an error of an SDK call came from a lost link
+        if isinstance(error, link_errors):
+            return True
+        handles = self.handles
+        return handles is None or not probe(handles)
+
+    def wait_online(self, timeout=None):
+        # Handles once the link is up again, None after timeout or stop()
+        timeout = self.settings['reconnect_timeout'] if timeout is None else timeout
+        waited = 0
+        while self.wanted and waited < timeout:
+            if self.online.wait(min(0.2, timeout - waited)):
+                handles = self.handles
+                if handles is not None:
+                    return handles
+            waited += 0.2
+        return None
+
+    def set_state(self, state):
+        self.state = state
+        self.state_changed.emit(state)
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        while True:
+            if not self.wanted:
+                self.close()
+                # start() may have been called meanwhile
+                with self.lock:
+                    if not self.wanted:
+                        self.loop.close()
+                        self.loop = None
+                        self.thread = None
+                        return
+                continue
+            if not self.online.is_set():
+                self.open()
+                continue
+            interval = self.settings['heartbeat_interval']
+            self.wake.wait(interval if interval > 0 else None)
+            self.wake.clear()
+            if self.wanted and self.online.is_set() and interval > 0 and not probe(self.handles):
+                self.online.clear()
+            if self.wanted and not self.online.is_set():
+                self.message.emit('Connection to neaServer lost, reconnecting')
+
+    def close(self):
+        self.online.clear()
+        if self.handles is not None:
+            try:
+                close_connection(self.config)
+            except Exception as error:
+                self.message.emit(f'Disconnect failed: {error!r}')
+            self.handles = None
+        if self.state != 'disconnected':
+            self.set_state('disconnected')
+
+    def open(self):
+        # Until connected or stopped; the initial connect gives up after
+        # `retries` attempts
+        s = self.settings
+        reconnect = self.handles is not None
+        self.set_state('reconnecting' if reconnect else 'connecting')
+        attempt = 0
+        interval = s['retry_interval']
+        while self.wanted:
+            try:
+                handles = open_connection(self.config, s['connect_timeout'], self.handles, self.loop)
+            except Exception as error:
+                attempt += 1
+                self.message.emit(f'Connection attempt {attempt} failed: {error}')
+                if not reconnect and s['retries'] and attempt >= s['retries']:
+                    with self.lock:
+                        self.wanted = False
+                    self.set_state('failed')
+                    return
+                self.wake.wait(interval)
+                self.wake.clear()
+                interval = min(2*interval, s['max_retry_interval'])
+                continue
+            self.handles = handles
+            self.online.set()
+            self.set_state('connected')
+            return
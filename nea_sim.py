@@ -0,0 +1,205 @@
+import numpy as np
+from types import SimpleNamespace
+from time import sleep
+from timeit import default_timer as timer
+
+# Simulated neaSNOM backend. It implements the part of the nea_tools / neaspec
+# SDK used by the scan engine and the GUI (mirror motor, position refresh,
+# motor velocity, sampling time and optical amplitudes) with a configurable
+# latency model and a Gaussian focus spot, so the acquisition code can run
+# and be profiled without a microscope.
+#
+# With drop_link_after the connection to the simulated neaServer is lost once,
+# that many seconds after the first connect: every SDK call raises
+# ConnectionError and connecting again fails for link_down_time seconds. A
+# reconnect passes the microscope of the old connection, which keeps its
+# position like the real one.
+
+default_settings = {
+    'move_latency': 0.01,           # s, command overhead of go_relative
+    'settle_time': 0.05,            # s, added after every movement
+    'refresh_latency': 0.01,        # s, RefreshActiveMotorPositionXyzAsync
+    'readout_latency': 0.002,       # s, every OpticalAmplitude/OpticalPhase access
+    'velocity': 20000,              # nm/s, MirrorMotorVelocityInContacting
+    'encoder_noise': 5,             # nm, std of the reported position
+    'positioning_error': 20,        # nm, std of the reached position
+    'start_position': [0, 0, 0],    # nm
+    'focus_position': [1500, -800, 300],    # nm
+    'focus_waist': 3000,            # nm, 1/e^2 radius in X-Y
+    'rayleigh_range': 10000,        # nm
+    'amplitudes': [5e-3, 1e-3, 5e-4, 2e-4, 8e-5, 3e-5],  # O0A..O5A at the focus
+    'noise': 0.02,                  # relative amplitude noise at 50 ms sampling
+    'phase_noise': 2,               # deg at 50 ms sampling
+    'seed': None,
+    'drop_link_after': None,        # s after the first connect, None: never
+    'link_down_time': 1,            # s
+}
+
+class Vector3D:
+    def __init__(self, x, y, z):
+        self.X = x
+        self.Y = y
+        self.Z = z
+
+    def __iter__(self):
+        return iter((self.X, self.Y, self.Z))
+
+    def __repr__(self):
+        return f'({self.X}, {self.Y}, {self.Z})'
+
+Point3D = Vector3D
+
+class task:
+    # Stand-in for the .NET Task returned by the *Async methods: the work
+    # starts when the task is created and Wait() blocks until it is done
+    def __init__(self, duration, action):
+        self.done_at = timer() + duration
+        self.action = action
+
+    def Wait(self):
+        remaining = self.done_at - timer()
+        if remaining > 0:
+            sleep(remaining)
+        self.action()
+
+class simulated_microscope:
+    def __init__(self, settings=None):
+        self.settings = dict(default_settings)
+        if settings:
+            self.settings.update(settings)
+        self.rng = np.random.default_rng(self.settings['seed'])
+        self.Py = self
+        self.safe_velocity = self.settings['velocity']
+        self.velocity = np.full(3, float(self.settings['velocity']))
+        self.sampling_time = 50
+        # Motion state: linear movement from start to target between t0 and t1
+        self.start = np.array(self.settings['start_position'], dtype=float)
+        self.target = self.start.copy()
+        self.t0 = self.t1 = timer()
+        self.cached_position = self.start.copy()
+        # Link to the simulated neaServer
+        self.connected = False
+        self.drop_at = None
+        self.down_until = None
+
+    def open_link(self):
+        if self.down_until is not None and timer() < self.down_until:
+            raise ConnectionError('simulated neaServer is not reachable')
+        if self.down_until is None and self.drop_at is None and self.settings['drop_link_after'] is not None:
+            self.drop_at = timer() + self.settings['drop_link_after']
+        self.connected = True
+
+    def check_link(self):
+        if self.drop_at is not None and timer() >= self.drop_at:
+            self.connected = False
+            self.down_until = self.drop_at + self.settings['link_down_time']
+            self.drop_at = None
+        if not self.connected:
+            raise ConnectionError('connection to the simulated neaServer lost')
+
+    @property
+    def MirrorMotorVelocityInContacting(self):
+        self.check_link()
+        return self.safe_velocity
+
+    def SetSamplingTime(self, ms):
+        self.check_link()
+        self.sampling_time = ms
+
+    def SetActiveMotorVelocityXyz(self, v):
+        self.check_link()
+        self.velocity = np.abs(np.array(list(v), dtype=float))
+
+    def RefreshActiveMotorPositionXyzAsync(self):
+        # The position is sampled when the refresh is requested
+        self.check_link()
+        noise = self.rng.normal(0, self.settings['encoder_noise'], 3)
+        position = np.round(self.true_position() + noise)
+        return task(self.settings['refresh_latency'], lambda: self.set_cached_position(position))
+
+    def set_cached_position(self, position):
+        self.cached_position = position
+
+    def true_position(self):
+        now = timer()
+        if now >= self.t1:
+            return self.target.copy()
+        fraction = (now-self.t0)/(self.t1-self.t0)
+        return self.start + fraction*(self.target-self.start)
+
+    def move_relative(self, delta):
+        self.check_link()
+        sleep(self.settings['move_latency'])
+        self.start = self.true_position()
+        error = self.rng.normal(0, self.settings['positioning_error'], 3)
+        self.target = self.start + np.asarray(delta, dtype=float) + error
+        duration = np.max(np.abs(self.target-self.start)/np.maximum(self.velocity, 1e-9))
+        self.t0 = timer()
+        self.t1 = self.t0 + duration
+
+    def await_movement(self):
+        self.check_link()
+        remaining = self.t1 - timer()
+        if remaining > 0:
+            sleep(remaining)
+        sleep(self.settings['settle_time'])
+
+    def focus_profile(self, position):
+        # Gaussian beam intensity around the focus
+        s = self.settings
+        d = position - np.asarray(s['focus_position'], dtype=float)
+        w = s['focus_waist']*np.sqrt(1 + (d[2]/s['rayleigh_range'])**2)
+        return (s['focus_waist']/w)**2*np.exp(-2*(d[0]**2 + d[1]**2)/w**2)
+
+    # Like the SDK arrays, every access returns a snapshot of all orders
+    @property
+    def OpticalAmplitude(self):
+        self.check_link()
+        sleep(self.settings['readout_latency'])
+        amplitudes = np.asarray(self.settings['amplitudes'], dtype=float)
+        value = amplitudes*self.focus_profile(self.true_position())
+        noise = self.settings['noise']*np.sqrt(50/max(self.sampling_time, 1))
+        values = value*(1 + self.rng.normal(0, noise, value.size)) + self.rng.normal(0, noise*amplitudes[-1], value.size)
+        return list(np.abs(values))
+
+    @property
+    def OpticalPhase(self):
+        # Gouy phase of the focused beam, in degrees
+        self.check_link()
+        sleep(self.settings['readout_latency'])
+        s = self.settings
+        dz = self.true_position()[2] - s['focus_position'][2]
+        noise = s['phase_noise']*np.sqrt(50/max(self.sampling_time, 1))
+        values = np.degrees(np.arctan(dz/s['rayleigh_range'])) + self.rng.normal(0, noise, len(s['amplitudes']))
+        return list(values)
+
+class mirror_motor:
+    def __init__(self, microscope):
+        self.microscope = microscope
+        self.is_active = False
+
+    def activate(self):
+        self.is_active = True
+
+    @property
+    def absolute_position(self):
+        self.microscope.check_link()
+        return [float(v) for v in self.microscope.cached_position]
+
+    def go_relative(self, dx, dy, dz):
+        self.microscope.move_relative((dx, dy, dz))
+
+    def await_movement(self):
+        self.microscope.await_movement()
+
+def connect(settings=None, microscope=None):
+    # Returns the simulated counterparts of neaspec.context,
+    # Nea.Client.SharedDefinitions and nea_tools.microscope.motors; a
+    # microscope of an earlier connection is reconnected
+    if microscope is None:
+        microscope = simulated_microscope(settings)
+    microscope.open_link()
+    context = SimpleNamespace(Microscope=microscope)
+    nea = SimpleNamespace(Geometry=SimpleNamespace(Vector3D=Vector3D, Point3D=Point3D))
+    motors = SimpleNamespace(Mirror=lambda: mirror_motor(microscope))
+    return context, nea, motors
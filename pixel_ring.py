@@ -0,0 +1,118 @@
+import numpy as np
+from time import sleep
+from timeit import default_timer as timer
+
+# Single-producer/single-consumer ring buffer of pixel records between the
+# scan worker and the GUI. A record holds the map number, the (idz, idy, idx)
+# index, the time, the measured X, Y, Z and the value of every other channel
+# of the scan map. The records are rows of preallocated arrays (one array per
+# field, like the channels of mirror_scan), so pushing a pixel only writes
+# into them.
+#
+# head is only written by the producer and tail only by the consumer. A
+# record is written before head is advanced past it, and read before tail is
+# advanced, so no lock is needed (plain int assignments under the GIL).
+#
+# Scan maps are announced with start_map before their records are pushed;
+# the consumer looks up the geometry of a record's map in maps. When the
+# buffer is full the producer waits up to block_timeout for the consumer and
+# then drops the record (counted in dropped). After such a timeout the
+# consumer is taken as stalled: records are dropped without waiting until it
+# frees space again, so a stalled display never slows down a scan.
+
+class pixel_ring:
+    def __init__(self, channels, capacity=65536, block_timeout=1.0):
+        # channels: names of the value columns
+        self.channels = list(channels)
+        self.capacity = capacity
+        self.block_timeout = block_timeout
+        self.index = np.zeros((capacity, 4), dtype=np.int32)       # map, idz, idy, idx
+        self.time = np.zeros(capacity)
+        self.position = np.zeros((capacity, 3))
+        self.values = np.zeros((capacity, len(self.channels)))
+        self.head = 0
+        self.tail = 0
+        self.maps = []
+        self.dropped = 0
+        self.stalled = False
+
+    def __len__(self):
+        return self.head - self.tail
+
+    # Producer side
+
+    def start_map(self, scan_map):
+        # Number of the map in the records
+        self.maps.append(scan_map)
+        return len(self.maps) - 1
+
+    def wait_for_space(self, count):
+        if self.head - self.tail + count <= self.capacity:
+            self.stalled = False
+            return True
+        if not self.stalled:
+            deadline = timer() + self.block_timeout
+            while self.head - self.tail + count > self.capacity:
+                if timer() > deadline:
+                    self.stalled = True
+                    break
+                sleep(0.001)
+            else:
+                return True
+        self.dropped += count
+        return False
+
+    def push(self, map_id, idz, idy, idx, position, values):
+        # One pixel; values in the order of channels
+        if not self.wait_for_space(1):
+            return False
+        slot = self.head % self.capacity
+        row = self.index[slot]
+        row[0] = map_id
+        row[1] = idz
+        row[2] = idy
+        row[3] = idx
+        self.time[slot] = timer()
+        self.position[slot] = position
+        self.values[slot] = values
+        self.head += 1
+        return True
+
+    def push_row(self, map_id, idz, idy, positions, values):
+        # A whole row (fly scans): positions (Nx,3), values (Nx,channels)
+        count = len(positions)
+        if count > self.capacity or not self.wait_for_space(count):
+            return False
+        now = timer()
+        start = self.head % self.capacity
+        # At most two contiguous pieces
+        for first, last, offset in ((start, min(start + count, self.capacity), 0),
+                                    (0, max(start + count - self.capacity, 0), self.capacity - start)):
+            if last <= first:
+                continue
+            pieces = slice(first, last)
+            self.index[pieces, 0] = map_id
+            self.index[pieces, 1] = idz
+            self.index[pieces, 2] = idy
+            self.index[pieces, 3] = np.arange(offset, offset + last - first)
+            self.time[pieces] = now
+            self.position[pieces] = positions[offset:offset + last - first]
+            self.values[pieces] = values[offset:offset + last - first]
+        self.head += count
+        return True
+
+    # Consumer side
+
+    def drain(self, limit=None):
+        # Copies of the waiting records (index, time, position, values), or
+        # None when the buffer is empty
+        head = self.head
+        count = head - self.tail
+        if limit is not None:
+            count = min(count, limit)
+        if count <= 0:
+            return None
+        slots = np.arange(self.tail, self.tail + count) % self.capacity
+        batch = self.index[slots], self.time[slots], self.position[slots], self.values[slots]
+        self.tail += count
+        return batch
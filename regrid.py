@@ -0,0 +1,134 @@
+import numpy as np
+from mirror_scan import mirror_scan, mechanical_channels, error_channels, is_phase
+from scan_paths import grid_axes
+
+# Regridding of a scan onto its nominal grid. The mirror does not stop exactly
+# on the planned positions (tens to hundreds of nm, more with loose
+# positioning tolerances or short settling), but the measured X, Y, Z of every
+# pixel are stored with the scan. The channels are interpolated from the
+# measured positions onto the regular grid of grid_axes in two separable
+# linear passes: along X within every row, then along Y within every column
+# of the result. Each pass handles the rows of several planes with a single
+# searchsorted call. Phase channels are interpolated as unit vectors, so they
+# do not jump at +-180 deg.
+# The regridded map also holds error maps in nm:
+#   dX, dY, dZ  measured minus nominal position of every pixel
+#   gap         distance from every grid point to the samples it was
+#               interpolated from; grows where the positions leave holes and
+#               outside the measured area, which takes the nearest edge value
+# Measured positions are relative to the center point of the scan, or to
+# their median offset from the grid for files without one (.dat). Pixels
+# without a measured position (e.g. empty fly scan bins) count as on grid.
+
+chunk_pixels = 2**20
+
+def interp_rows(xp, fp, xq):
+    # Linear interpolation of every row of xp (R,N) with values fp (R,N,C) at
+    # the points xq (Q,). Returns the values (R,Q,C) and the distance of every
+    # point to the nearer of its two samples (R,Q).
+    R, N = xp.shape
+    if np.any(np.diff(xp, axis=1) < 0):
+        order = np.argsort(xp, axis=1, kind='stable')
+        xp = np.take_along_axis(xp, order, axis=1)
+        fp = np.take_along_axis(fp, order[...,None], axis=1)
+    if N == 1:
+        return np.repeat(fp, len(xq), axis=1), np.abs(xq[None,:] - xp)
+    # Rows are shifted apart so that one sorted array holds all of them
+    lo = min(xp.min(), xq.min())
+    span = max(xp.max(), xq.max()) - lo or 1
+    shift = 2*np.arange(R)[:,None]
+    keys = ((xp - lo)/span + shift).ravel()
+    queries = (xq[None,:] - lo)/span + shift
+    start = np.arange(R)[:,None]*N
+    left = np.clip(np.searchsorted(keys, queries.ravel()).reshape(R, -1) - start, 1, N-1) - 1 + start
+    x0 = xp.ravel()[left]
+    x1 = xp.ravel()[left+1]
+    width = x1 - x0
+    t = np.clip(np.divide(xq[None,:] - x0, width, out=np.zeros_like(x0), where=width > 0), 0, 1)
+    flat = fp.reshape(R*N, -1)
+    f0 = flat[left]
+    values = f0 + t[...,None]*(flat[left+1] - f0)
+    gap = np.minimum(np.abs(xq[None,:] - x0), np.abs(xq[None,:] - x1))
+    return values, gap
+
+def measured_offsets(scan_map):
+    # Measured minus nominal X, Y, Z (Nz,Ny,Nx) of every pixel
+    xs, ys, zs = grid_axes(scan_map)
+    nominal = [xs[None,None,:], ys[None,:,None], zs[:,None,None]]
+    offsets = []
+    for axis, grid in zip(mechanical_channels, nominal):
+        measured = np.asarray(getattr(scan_map, axis), dtype=float)
+        finite = np.isfinite(measured)
+        if scan_map.center_point is not None:
+            center = float(scan_map.center_point[mechanical_channels.index(axis)])
+        elif np.any(finite):
+            center = float(np.median((measured - grid)[finite]))
+        else:
+            center = 0.0
+        offsets.append(np.where(finite, measured - center - grid, 0.0))
+    return offsets
+
+def regrid(scan_map, channels=None):
+    # New mirror_scan on the nominal grid with the given channels (default:
+    # all displayed channels) and the error maps
+    if channels is None:
+        channels = [name for name in scan_map.display_channels if name not in error_channels]
+    channels = [name for name in channels if name not in error_channels]
+    result = mirror_scan(mechanical_channels + channels + error_channels, scan_map.optical_dtype)
+    for name in ('center_point', 'step_sizeX', 'step_sizeY', 'step_sizeZ', 'sizeX', 'sizeY', 'sizeZ',
+                 'Nx', 'Ny', 'Nz', 'acquisition'):
+        setattr(result, name, getattr(scan_map, name))
+    result.create_array()
+    Nz, Ny, Nx = scan_map.Nz, scan_map.Ny, scan_map.Nx
+    xs, ys, zs = grid_axes(scan_map)
+    dx, dy, dz = measured_offsets(scan_map)
+    result.dX[...] = dx
+    result.dY[...] = dy
+    result.dZ[...] = dz
+    center = [0, 0, 0] if scan_map.center_point is None else scan_map.center_point
+    result.X[...] = center[0] + xs[None,None,:]
+    result.Y[...] = center[1] + ys[None,:,None]
+    result.Z[...] = center[2] + zs[:,None,None]
+
+    # A few planes at a time to bound the memory of the temporary arrays
+    step = max(1, chunk_pixels//(Ny*Nx))
+    for first in range(0, Nz, step):
+        planes = slice(first, min(first + step, Nz))
+        regrid_planes(scan_map, result, channels, planes, xs, ys, dx[planes], dy[planes])
+    return result
+
+def regrid_planes(scan_map, result, channels, planes, xs, ys, dx, dy):
+    Nz, Ny, Nx = dx.shape
+    # Columns: Y position, then the channels (phases as cos, sin)
+    columns = [ys[None,:,None] + dy]
+    for name in channels:
+        values = np.asarray(getattr(scan_map, name)[planes], dtype=float)
+        if is_phase(name):
+            columns += [np.cos(np.radians(values)), np.sin(np.radians(values))]
+        else:
+            columns.append(values)
+    data = np.stack(columns, axis=-1).reshape(Nz*Ny, Nx, -1)
+
+    # Along X within the rows
+    rows, gap_x = interp_rows((xs[None,None,:] + dx).reshape(Nz*Ny, Nx), data, xs)
+    # Along Y within the columns, carrying the gap of the first pass
+    rows = np.concatenate([rows.reshape(Nz*Ny, Nx, -1), gap_x[...,None]], axis=-1)
+    rows = rows.reshape(Nz, Ny, Nx, -1).transpose(0, 2, 1, 3).reshape(Nz*Nx, Ny, -1)
+    cols, gap_y = interp_rows(rows[...,0], rows[...,1:], ys)
+    values = cols.reshape(Nz, Nx, Ny, -1).transpose(0, 2, 1, 3)
+    result.gap[planes] = np.hypot(values[...,-1], gap_y.reshape(Nz, Nx, Ny).transpose(0, 2, 1))
+
+    column = 0
+    for name in channels:
+        if is_phase(name):
+            getattr(result, name)[planes] = np.degrees(np.arctan2(values[...,column+1], values[...,column]))
+            column += 2
+        else:
+            getattr(result, name)[planes] = values[...,column]
+            column += 1
+
+def summary(result):
+    # RMS and maximum positioning error and the largest gap, in nm
+    distance = np.hypot(result.dX, result.dY)
+    return {'rms_error': float(np.sqrt(np.mean(distance**2))), 'max_error': float(np.max(distance)),
+            'max_gap': float(np.max(result.gap))}
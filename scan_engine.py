@@ -0,0 +1,596 @@
+import numpy as np
+import datetime
+from time import sleep
+from timeit import default_timer as timer
+from PySide6.QtCore import QObject, Signal, Slot
+from mirror_scan import mirror_scan, optical_order, is_phase
+import scan_io
+from flyscan import bin_row
+from scan_paths import grid_axes, plan, planned_travel, row_path
+from focus_search import find_peak, refine_window
+from acquisition import acquisition_profile
+import focus_analysis
+from scan_timing import scan_timer, step_phases, fly_phases
+import motion_profile
+import sparse_scan
+
+# Scan engine shared by the GUI (run in a QThread) and the batch runner. It
+# only depends on QtCore, so it can be used without a display.
+
+class scan_cancelled(Exception):
+    # Raised in the scan loops after Worker.cancel(); the rows written so far
+    # stay in the checkpoint
+    pass
+
+######## QT WORKING THREAD CLASS ############
+class Worker(QObject):
+    # Completed row (idz, idy); the pixels reach the GUI through ring
+    progress = Signal(int, int)
+    completed = Signal()
+    started = Signal()
+    # Error of a scan run with run(); the rows written so far stay in the
+    # checkpoint
+    failed = Signal(str)
+    # Status and timing summary (scan_timer.summary) of the scan loops are
+    # sent at most every report_interval
+    status_update = Signal(str)
+    timing_update = Signal(object)
+    def __init__(self):
+        super().__init__()
+        self.scan_map = []
+        self.nea = None
+        self.context = None
+        self.motors = None
+        self.Vector3D = None
+        self.fly_velocity = None
+        self.scan_path = 'Raster'
+        self.scan_levels = []
+        # Mirror position after the last scan
+        self.end_position = None
+        self.focus_channel = 'O3A'
+        self.focus_resolution = None
+        self.refine_factor = 4
+        self.save_name = None
+        self.writer = None
+        self.pipelined = True
+        self.profile = acquisition_profile()
+        # Continue the scan in save_name (loaded with scan_io.load_checkpoint)
+        self.resume = False
+        # Files written by the scan
+        self.files = []
+        # Phase timing of the last scan loop (scan_timing.scan_timer)
+        self.timing = None
+        self.report_interval = 0.5
+        self.last_report = 0
+        # Every measured pixel is pushed into this pixel_ring when it is set
+        self.ring = None
+        # Velocities and settle detection of the step scans
+        # (motion_profile.motion_profile), None: safe velocity and await_movement
+        self.motion = None
+        # Fraction of the pixels measured by step scans (sparse_scan.py),
+        # None: all
+        self.sparse_fraction = None
+        # Connection manager (nea_session.nea_session); with a session a scan
+        # pauses on a lost link and continues after the reconnect
+        self.session = None
+        # Set from another thread by cancel(), checked before every pixel
+        # and while flying through a row
+        self.cancelled = False
+
+    @Slot()
+    def do_scan_test(self):
+        self.started.emit()
+        # Calculate mirror coordinates for movement
+        xs, ys, zs = grid_axes(self.scan_map)
+        path = plan(self.scan_path, xs, ys, zs, (0, 0, 0))
+
+        print(f"Nz in the working thread scan: {self.scan_map.Nz}")
+
+        # SCANNING LOOP
+        row_counts = np.zeros((self.scan_map.Nz, self.scan_map.Ny), dtype=int)
+        for idz, idy, idx, (x, y, z) in path:
+            for name in self.scan_map.optical:
+                getattr(self.scan_map, name)[idz,idy,idx] = np.random.rand()
+            self.scan_map.X[idz,idy,idx] = x
+            self.scan_map.Y[idz,idy,idx] = y
+            self.scan_map.Z[idz,idy,idx] = z
+            sleep(0.1)
+            row_counts[idz,idy] += 1
+            if row_counts[idz,idy] == self.scan_map.Nx:
+                self.progress.emit(idz, idy)
+        self.completed.emit()
+
+    @Slot(str)
+    def run(self, mode):
+        # Scan started from the GUI: errors are reported with failed instead
+        # of escaping the slot. Batch and the scan process call the do_*
+        # methods directly and handle the errors themselves.
+        scan = {'step': self.do_scan, 'fly': self.do_fly_scan, 'adaptive': self.do_adaptive_scan}[mode]
+        self.cancelled = False
+        try:
+            scan()
+        except scan_cancelled:
+            self.close_writer(failed=True)
+            self.status_update.emit('Scan cancelled, the measured rows can be resumed')
+        except Exception as error:
+            self.close_writer(failed=True)
+            self.failed.emit(f'{type(error).__name__}: {error}')
+
+    @Slot()
+    def do_scan(self):
+        self.started.emit()
+        center, p = self.with_reconnect(self.scan_center)
+        self.open_writer(mode='step')
+        mask = self.sparse_mask()
+        _, p = self.with_reconnect(lambda p: self.measure_map(p, center, mask), p)
+        sleep(0.5)
+
+        # Go back to the original position
+        current_pos, p = self.with_reconnect(lambda p: self.go_to(p, center), p)
+        if mask is not None:
+            self.reconstruct(mask, center)
+        self.scan_map.center_point = current_pos
+        self.end_position = current_pos
+        self.close_writer()
+        self.status_update.emit(f'Mirror position AFTER movement: {current_pos}')
+        self.completed.emit()
+
+    @Slot()
+    def do_adaptive_scan(self):
+        # Coarse-to-fine focus search: measure the configured grid, then
+        # repeatedly measure a finer grid around the maximum of focus_channel
+        # until the steps reach focus_resolution
+        self.started.emit()
+        current_pos, p = self.with_reconnect(self.position)
+        self.scan_levels = []
+        center = current_pos
+        while True:
+            self.scan_map.center_point = center
+            self.status_update.emit(f'Level {len(self.scan_levels)+1}: {self.scan_map.Nx}x{self.scan_map.Ny}x{self.scan_map.Nz} points around {center}')
+            self.open_writer(f'_level{len(self.scan_levels)+1}', mode='adaptive')
+            _, p = self.with_reconnect(lambda p: self.measure_map(p, center), p)
+            self.close_writer()
+            self.scan_levels.append(self.scan_map)
+            index, center, value = find_peak(self.scan_map, self.focus_channel)
+            self.status_update.emit(f'Maximum {self.focus_channel} = {value:.3g} at {center}')
+            window = refine_window(self.scan_map, self.refine_factor, self.focus_resolution)
+            if window is None:
+                break
+            fine_map = mirror_scan(self.scan_map.channels, self.scan_map.optical_dtype)
+            fine_map.sizeX, fine_map.sizeY, fine_map.sizeZ = window[0]
+            fine_map.step_sizeX, fine_map.step_sizeY, fine_map.step_sizeZ = window[1]
+            fine_map.Nx, fine_map.Ny, fine_map.Nz = window[2]
+            fine_map.create_array()
+            fine_map.acquisition = self.scan_map.acquisition
+            self.scan_map = fine_map
+        sleep(0.5)
+
+        # Go to the maximum found on the finest level; the finest map keeps
+        # its center, the maximum of the previous level
+        current_pos, p = self.with_reconnect(lambda p: self.go_to(p, center), p)
+        self.end_position = current_pos
+        self.status_update.emit(f'Mirror position AFTER movement: {current_pos}, maximum {self.focus_channel} at {center}')
+        self.completed.emit()
+
+    def cancel(self):
+        # Called directly, not as a slot: the worker thread is busy scanning
+        self.cancelled = True
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise scan_cancelled('scan cancelled')
+
+    def use_connection(self, handles):
+        # SDK objects (context, nea, motors) of a new connection
+        self.context, self.nea, self.motors = handles
+        self.Vector3D = self.nea.Geometry.Vector3D
+
+    def with_reconnect(self, action, p=None):
+        # Runs action(p) on the prepared mirror p (None: prepare it first).
+        # When the link to neaServer drops, the scan pauses until the session
+        # has reconnected and action runs again on a newly prepared mirror;
+        # measure loops continue from the first incomplete row, like a
+        # resumed scan (the completed rows are known from the writer).
+        # Returns the result of action and the mirror of the last run.
+        while True:
+            try:
+                if p is None:
+                    p = self.prepare_mirror()
+                return action(p), p
+            except scan_cancelled:
+                raise
+            except Exception as error:
+                if self.session is None or not self.session.link_error(error):
+                    raise
+                self.pause(error)
+                p = None
+
+    def pause(self, error):
+        self.status_update.emit(f'Connection lost ({error}), scan paused until neaServer is back')
+        self.session.report_lost()
+        handles = self.session.wait_online()
+        self.check_cancelled()
+        if handles is None:
+            raise ConnectionError(f'neaServer did not come back within {self.session.settings["reconnect_timeout"]} s')
+        self.use_connection(handles)
+        self.status_update.emit('Reconnected, continuing the scan')
+
+    def open_writer(self, suffix='', mode='step'):
+        # Stream the scan to a binary file row by row when a file name is set.
+        # The scan settings are kept in the metadata for resuming.
+        self.timing = None
+        if self.save_name is None:
+            return
+        self.writer = scan_io.scan_writer(self.save_name + suffix, self.scan_map, resume=self.resume)
+        self.files.append(self.writer.fname)
+        if self.resume:
+            self.status_update.emit(f'Resuming {self.save_name}: {len(self.writer.completed)} of {self.scan_map.Nz*self.scan_map.Ny} rows complete')
+        else:
+            self.writer.metadata['scan'] = {'mode': mode, 'path': self.scan_path,
+                                            'fly_velocity': self.fly_velocity if mode == 'fly' else None,
+                                            'sparse': self.sparse_fraction if mode == 'step' else None}
+            self.writer.write_metadata()
+
+    def close_writer(self, failed=False):
+        # failed: the map is only partly measured, it is closed without
+        # focus analysis and timing trace
+        if self.writer is not None:
+            # Focus spot analysis of focus_channel is saved with the scan
+            if not failed and self.focus_channel in self.scan_map.channels:
+                result = focus_analysis.analyse(self.scan_map, self.focus_channel)
+                self.writer.metadata['focus'] = focus_analysis.as_dict(result, self.scan_map)
+                self.status_update.emit(f'Best focus of {self.focus_channel}: plane {result["best_plane"]}, {focus_analysis.absolute(self.scan_map, result["best_focus"])}')
+            # Timing trace next to the scan
+            if not failed and self.timing is not None:
+                self.export_timing(scan_io.stem(self.writer.fname))
+            self.writer.close()
+            self.writer = None
+        self.resume = False
+
+    def export_timing(self, stem):
+        # Timing of the last scan loop, with the settle statistics of the
+        # motion profile
+        extra = {'settle': self.motion.summary()} if self.motion is not None else None
+        self.timing.export(stem, extra)
+
+    def sparse_mask(self):
+        # Pixels measured by a sparse step scan, None for full scans
+        if not self.sparse_fraction or self.sparse_fraction >= 1:
+            return None
+        m = self.scan_map
+        mask = sparse_scan.sample_mask(m.Nz, m.Ny, m.Nx, self.sparse_fraction)
+        sparse_scan.clear_unmeasured(m, mask)
+        self.status_update.emit(f'Sparse scan: {int(mask.sum())} of {mask.size} pixels')
+        return mask
+
+    def reconstruct(self, mask, center):
+        start = timer()
+        sparse_scan.reconstruct(self.scan_map, mask, center)
+        if self.writer is not None:
+            self.writer.write_all()
+        self.status_update.emit(f'Reconstructed {int((~mask).sum())} pixels in {timer() - start:.2f} s')
+
+    def completed_rows(self):
+        # Rows already in the file of a resumed scan
+        if self.writer is None:
+            return set()
+        return self.writer.completed
+
+    def position(self, p):
+        self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+        return p.absolute_position
+
+    def scan_center(self, p):
+        # A new scan is centered on the current position, a resumed scan on
+        # the center point of its checkpoint
+        current_pos = self.position(p)
+        self.status_update.emit(f'Mirror position BEFORE movement: {current_pos}')
+        if self.resume:
+            return list(self.scan_map.center_point)
+        self.scan_map.center_point = current_pos
+        return current_pos
+
+    def optical_readers(self):
+        # (channel array, std array or None, Py attribute, demodulation order)
+        # of every optical channel recorded in the current map
+        readers = []
+        for name in self.scan_map.optical:
+            source = 'OpticalPhase' if is_phase(name) else 'OpticalAmplitude'
+            std = getattr(self.scan_map, f'{name}_std') if f'{name}_std' in self.scan_map.channels else None
+            readers.append((getattr(self.scan_map, name), std, source, optical_order(name)))
+        return readers
+
+    def ring_columns(self):
+        # Map number in the ring and the (value, std) columns of every
+        # optical reader, None without a ring
+        if self.ring is None:
+            return None, None
+        columns = []
+        for name in self.scan_map.optical:
+            std = f'{name}_std'
+            columns.append((self.ring.channels.index(name), self.ring.channels.index(std) if std in self.ring.channels else None))
+        # After a reconnect the scan continues on the map it already announced
+        if self.ring.maps and self.ring.maps[-1] is self.scan_map:
+            return len(self.ring.maps) - 1, columns
+        return self.ring.start_map(self.scan_map), columns
+
+    def read_pixel(self, readers):
+        # Value and standard deviation of every optical channel over the
+        # samples of the acquisition profile, one lock-in sampling time apart
+        samples = []
+        for n in range(self.profile.samples):
+            if n > 0:
+                sleep(self.profile.sampling_time/1000)
+            samples.append(self.read_snapshot(readers))
+        return self.profile.reduce(samples, self.scan_map.optical)
+
+    def prepare_mirror(self):
+        # Create motor object
+        p = self.motors.Mirror()
+        if not p.is_active:
+            p.activate()
+        # Set sampling interval
+        self.context.Microscope.Py.SetSamplingTime(self.profile.sampling_time)
+        self.scan_map.acquisition = self.profile.as_dict()
+        # Set motor speed
+        safe_v = self.context.Microscope.Py.MirrorMotorVelocityInContacting
+        v = self.Vector3D(safe_v,safe_v,safe_v)
+        self.context.Microscope.Py.SetActiveMotorVelocityXyz(v)
+        if self.motion is not None:
+            self.motion.start(self.context)
+        return p
+
+    def go_to(self, p, target):
+        self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+        dx = target[0]-p.absolute_position[0]
+        dy = target[1]-p.absolute_position[1]
+        dz = target[2]-p.absolute_position[2]
+        if self.motion is not None:
+            self.motion.apply(self.context, self.Vector3D, (dx, dy, dz))
+        p.go_relative(dx,dy,dz)
+        p.await_movement()
+        # Check position after the movement
+        self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+        return p.absolute_position
+
+    def measure_map(self, p, center, mask=None):
+        # Calculate mirror coordinates for movement; sparse scans visit the
+        # pixels of mask in the order of the path
+        xs, ys, zs = grid_axes(self.scan_map, center)
+        path = plan(self.scan_path, xs, ys, zs, center)
+        done = self.completed_rows()
+        path = [point for point in path if (point[0], point[1]) not in done]
+        if mask is not None:
+            path = [point for point in path if mask[point[:3]]]
+            row_sizes = mask.sum(axis=2)
+        else:
+            row_sizes = np.full((self.scan_map.Nz, self.scan_map.Ny), self.scan_map.Nx)
+        if not path:
+            return
+        self.status_update.emit(f'{self.scan_path} path, planned travel: {planned_travel(path, center)/1000:.1f} μm')
+
+        # SCANNING LOOP
+        # The position measured after a move is the starting point of the
+        # next relative move. With pipelined moves the position refresh of a
+        # pixel is requested before the optical snapshot, and the move to the
+        # next pixel is commanded before the refresh has returned; that move
+        # is then based on the last verified position plus the commanded
+        # step, so a positioning error is corrected one pixel later.
+        readers = self.optical_readers()
+        row_counts = np.zeros((self.scan_map.Nz, self.scan_map.Ny), dtype=int)
+        self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+        pos = p.absolute_position
+        x, y, z = path[0][3]
+        self.apply_motion((x-pos[0],y-pos[1],z-pos[2]))
+        p.go_relative(x-pos[0],y-pos[1],z-pos[2])
+        estimate = [x, y, z]
+        # With motion profiles the position read when the move has settled
+        # is the position of the pixel
+        settled = self.await_move(p, path[0][3], (x-pos[0],y-pos[1],z-pos[2]))
+        settle = self.profile.settle_time/1000
+        # Every pixel is timed phase by phase, from the end of the previous one
+        timing = self.timing = scan_timer(step_phases, [point[:3] for point in path])
+        self.last_report = timer()
+        map_id, columns = self.ring_columns()
+        if columns is not None:
+            record = np.zeros(len(self.ring.channels))
+        for n, (idz, idy, idx, target) in enumerate(path):
+            self.check_cancelled()
+            if settle > 0:
+                sleep(settle)
+            timing.mark('settle')
+            refresh = self.context.Microscope.RefreshActiveMotorPositionXyzAsync() if settled is None else None
+            # Read optical channels
+            means, stds = self.read_pixel(readers)
+            for (values, std, _, _), mean, deviation in zip(readers, means, stds):
+                values[idz,idy,idx] = mean
+                if std is not None:
+                    std[idz,idy,idx] = deviation
+            timing.mark('readout')
+            move = None
+            if n+1 < len(path):
+                x, y, z = path[n+1][3]
+                if self.pipelined:
+                    move = (x-estimate[0], y-estimate[1], z-estimate[2])
+                    self.apply_motion(move)
+                    p.go_relative(*move)
+            timing.mark('move_command')
+            # Update real position
+            if refresh is not None:
+                refresh.Wait()
+                pos = p.absolute_position
+            else:
+                pos = settled
+            newx, newy, newz = pos[0], pos[1], pos[2]
+            self.scan_map.X[idz,idy,idx] = newx
+            self.scan_map.Y[idz,idy,idx] = newy
+            self.scan_map.Z[idz,idy,idx] = newz
+            timing.mark('refresh')
+            if n+1 < len(path):
+                if not self.pipelined:
+                    move = (x-newx, y-newy, z-newz)
+                    self.apply_motion(move)
+                    p.go_relative(*move)
+                estimate = [newx+move[0], newy+move[1], newz+move[2]]
+            timing.mark('move_command')
+            if columns is not None:
+                for (value_column, std_column), mean, deviation in zip(columns, means, stds):
+                    record[value_column] = mean
+                    if std_column is not None:
+                        record[std_column] = deviation
+                self.ring.push(map_id, idz, idy, idx, pos, record)
+            row_counts[idz,idy] += 1
+            if row_counts[idz,idy] == row_sizes[idz,idy]:
+                if self.writer is not None:
+                    self.writer.write_row(idz, idy)
+                self.progress.emit(idz, idy)
+            timing.mark('write')
+            if self.report_due():
+                self.status_update.emit(f'X: {newx}, Y: {newy}, Z: {newz} Remaining time: {self.remaining_time()}')
+            timing.mark('other')
+            if move is not None:
+                settled = self.await_move(p, path[n+1][3], move)
+            timing.mark('move')
+            timing.end_step()
+        self.report_due(final=True)
+        if self.motion is not None:
+            self.status_update.emit(motion_profile.format_summary(self.motion.summary()))
+
+    def apply_motion(self, move):
+        if self.motion is not None:
+            self.motion.apply(self.context, self.Vector3D, move)
+
+    def await_move(self, p, target, move):
+        # Settled position with motion profiles, None after the generic wait
+        if self.motion is None:
+            p.await_movement()
+            return None
+        return self.motion.settle(self.context, p, target, move)
+
+    def remaining_time(self):
+        eta = self.timing.eta() if self.timing is not None else None
+        if eta is None:
+            return 'unknown'
+        return datetime.timedelta(seconds=round(eta))
+
+    def report_due(self, final=False):
+        # True (and the timing summary is sent) at most every report_interval,
+        # always for the final report after the loop
+        now = timer()
+        if not final and now - self.last_report < self.report_interval:
+            return False
+        self.last_report = now
+        self.timing_update.emit(self.timing.summary())
+        return True
+
+    def read_snapshot(self, readers):
+        # Values of all optical channels with one access per SDK array
+        # (OpticalAmplitude, OpticalPhase) instead of one per channel
+        snapshots = {}
+        values = []
+        for _, _, source, order in readers:
+            if source not in snapshots:
+                snapshots[source] = getattr(self.context.Microscope.Py, source)
+            values.append(snapshots[source][order])
+        return values
+
+    @Slot()
+    def do_fly_scan(self):
+        # Continuous acquisition: every X row is a single move at fly_velocity
+        # while positions and optical amplitudes are sampled with timestamps.
+        # The samples are binned onto the nominal grid after each row.
+        self.started.emit()
+        center, p = self.with_reconnect(self.scan_center)
+        self.open_writer(mode='fly')
+        _, p = self.with_reconnect(lambda p: self.fly_map(p, center), p)
+        sleep(0.5)
+
+        # Go back to the original position
+        current_pos, p = self.with_reconnect(lambda p: self.go_to(p, center), p)
+        self.scan_map.center_point = current_pos
+        self.end_position = current_pos
+        self.close_writer()
+        self.status_update.emit(f'Mirror position AFTER movement: {current_pos}')
+        self.completed.emit()
+
+    def fly_map(self, p, center):
+        safe_v = self.context.Microscope.Py.MirrorMotorVelocityInContacting
+        safe_vector = self.Vector3D(safe_v,safe_v,safe_v)
+        fly_vector = self.Vector3D(self.fly_velocity,safe_v,safe_v)
+        xs, ys, zs = grid_axes(self.scan_map, center)
+        done = self.completed_rows()
+        rows = [row for row in row_path(self.scan_path, self.scan_map.Ny, self.scan_map.Nz) if row[:2] not in done]
+
+        # Each row starts and ends half a pixel outside the grid so that the
+        # border pixels are sampled over their full width
+        step = self.scan_map.step_sizeX
+        row_duration = (xs[-1]-xs[0]+step)/self.fly_velocity
+        tolerance = step/10
+
+        # SCANNING LOOP
+        readers = self.optical_readers()
+        # Every row is timed phase by phase
+        timing = self.timing = scan_timer(fly_phases, [row[:2] for row in rows], pixels_per_step=self.scan_map.Nx)
+        self.last_report = timer()
+        map_id, columns = self.ring_columns()
+        if columns is not None:
+            block = np.zeros((self.scan_map.Nx, len(self.ring.channels)))
+        for idz, idy, forward in rows:
+            self.check_cancelled()
+            y = ys[idy]
+            z = zs[idz]
+            if forward:
+                row_xs = xs
+                row_start, row_end = xs[0] - step/2, xs[-1] + step/2
+            else:
+                row_xs = xs[::-1]
+                row_start, row_end = xs[-1] + step/2, xs[0] - step/2
+            # Go to row start at safe speed
+            self.context.Microscope.Py.SetActiveMotorVelocityXyz(safe_vector)
+            self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+            pos = p.absolute_position
+            p.go_relative(row_start-pos[0],y-pos[1],z-pos[2])
+            p.await_movement()
+            timing.mark('move_to_row')
+            # Fly through the row and sample until the end is reached
+            self.context.Microscope.Py.SetActiveMotorVelocityXyz(fly_vector)
+            self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+            pos = p.absolute_position
+            p.go_relative(row_end-pos[0],0,0)
+            samples = []
+            rowtime = timer()
+            while True:
+                # A cancelled row is not written, the stage completes the move
+                self.check_cancelled()
+                self.context.Microscope.RefreshActiveMotorPositionXyzAsync().Wait()
+                pos = p.absolute_position
+                t = timer()
+                samples.append([t-rowtime,pos[0],pos[1],pos[2]] + self.read_snapshot(readers))
+                if abs(row_end-pos[0]) < tolerance or t-rowtime > 1.5*row_duration + 1:
+                    break
+            p.await_movement()
+            timing.mark('fly')
+            # Bin the samples onto the nominal pixels of this row
+            positions, channels, counts = bin_row(samples, row_xs, step, len(readers))
+            if not forward:
+                positions, channels = positions[::-1], channels[::-1]
+            self.scan_map.X[idz,idy,:] = positions[:,0]
+            self.scan_map.Y[idz,idy,:] = positions[:,1]
+            self.scan_map.Z[idz,idy,:] = positions[:,2]
+            for column, (values, _, _, _) in enumerate(readers):
+                values[idz,idy,:] = channels[:,column]
+            if columns is not None:
+                for column, (value_column, _) in enumerate(columns):
+                    block[:,value_column] = channels[:,column]
+                self.ring.push_row(map_id, idz, idy, positions, block)
+            timing.mark('binning')
+            if self.writer is not None:
+                self.writer.write_row(idz, idy)
+            self.progress.emit(idz, idy)
+            timing.mark('write')
+            if self.report_due():
+                self.status_update.emit(f'Row {idy+1}/{self.scan_map.Ny}: {len(samples)} samples, {np.count_nonzero(counts == 0)} empty pixels Remaining time: {self.remaining_time()}')
+            timing.end_step()
+        self.report_due(final=True)
+        # Back to the safe velocity for the following moves
+        self.context.Microscope.Py.SetActiveMotorVelocityXyz(safe_vector)
@@ -0,0 +1,350 @@
+import os
+import re
+import json
+import struct
+import zlib
+import hashlib
+import sqlite3
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import yaml
+import scan_io
+import focus_analysis
+
+# Index of archived scans
+#
+# Walks a folder tree for scan files (.dat text scans and binary .npy scans
+# with their .yaml) and stores per scan the grid, the maximum and mean of
+# every channel, the best focus of the focus channel and a thumbnail of its
+# best plane in an SQLite database (index_file in config.yaml). The scans are
+# loaded and analysed in a pool of processes; only the main process writes
+# the database. The archive itself is not modified (no .dat caches are
+# written).
+#
+# Indexing again only loads new and changed files: a file whose mtime and
+# size match the index is skipped, a file with a new mtime is hashed and only
+# analysed again when the hash differs. Entries of files that were removed
+# from the folder are deleted.
+#
+#   python scan_index.py index D:/archive
+#   python scan_index.py search --since 2023-05-01 --channel O3A --min-max 0.5
+#   python scan_index.py thumbnail D:/archive/<scan>.dat thumbnail.png
+
+thumbnail_size = 64         # pixels, longer side
+timestamp_pattern = re.compile(r'(\d{4})\.(\d{2})\.(\d{2})-(\d{2})\.(\d{2})_2D_Mirror_scan_')
+commit_interval = 100       # files
+
+schema = '''
+create table if not exists scans (
+    path text primary key, name text, format text, mtime real, size integer, hash text,
+    timestamp text, complete integer, Nx integer, Ny integer, Nz integer,
+    sizeX real, sizeY real, sizeZ real, step_sizeX real, step_sizeY real, step_sizeZ real,
+    center_point text, focus_channel text, focus_plane integer,
+    focus_x real, focus_y real, focus_z real, error text, indexed text);
+create table if not exists channels (
+    path text, channel text, max real, mean real, primary key (path, channel));
+create table if not exists thumbnails (
+    path text primary key, channel text, width integer, height integer, png blob);
+create index if not exists channels_max on channels (channel, max);
+'''
+
+def open_index(fname):
+    connection = sqlite3.connect(fname)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(schema)
+    return connection
+
+def scan_files(folder):
+    # Scan files below folder: .dat files and .npy files with a .yaml (not
+    # the binary caches of .dat files)
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        names = set(files)
+        for name in sorted(files):
+            if name.endswith('.dat'):
+                yield os.path.abspath(os.path.join(root, name))
+            elif name.endswith('.npy') and not name.endswith('.dat.npy') and scan_io.metadata_name(name) in names:
+                yield os.path.abspath(os.path.join(root, name))
+
+def parts(fname):
+    # Files making up the scan
+    if fname.endswith('.npy'):
+        return [fname, scan_io.metadata_name(fname)]
+    return [fname]
+
+def signature(fname):
+    # mtime and size, compared before hashing
+    status = [os.stat(name) for name in parts(fname)]
+    return max(s.st_mtime for s in status), sum(s.st_size for s in status)
+
+def file_hash(fname):
+    digest = hashlib.sha1()
+    for name in parts(fname):
+        with open(name, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def file_timestamp(fname, metadata):
+    # Measuring time: from the name given by save_data, the metadata of
+    # binary scans, or the mtime
+    match = timestamp_pattern.search(os.path.basename(fname))
+    if match:
+        return '{}-{}-{}T{}:{}'.format(*match.groups())
+    if metadata.get('started'):
+        return str(metadata['started'])[:16]
+    return datetime.datetime.fromtimestamp(os.stat(fname).st_mtime).isoformat()[:16]
+
+def load(fname):
+    # Scan map and metadata, without writing a .dat cache into the archive
+    if fname.endswith('.npy'):
+        with open(scan_io.metadata_name(fname), 'r') as file:
+            metadata = yaml.safe_load(file)
+        return scan_io.load_scan(fname, mmap=True), metadata
+    scan_map = scan_io.load_cache(fname)
+    if scan_map is None:
+        scan_map = scan_io.load_dat(fname, cache=False)
+    return scan_map, {'complete': True}
+
+def png(image):
+    # 8 bit grayscale PNG of a 2D uint8 array
+    height, width = image.shape
+    raw = b''.join(b'\x00' + row.tobytes() for row in np.ascontiguousarray(image, dtype=np.uint8))
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+def thumbnail(plane):
+    # Plane scaled to at most thumbnail_size pixels and 0..255, positive Y up
+    plane = np.asarray(plane, dtype=float)
+    rows = np.linspace(0, plane.shape[0] - 1, min(plane.shape[0], thumbnail_size)).round().astype(int)
+    columns = np.linspace(0, plane.shape[1] - 1, min(plane.shape[1], thumbnail_size)).round().astype(int)
+    plane = plane[np.ix_(rows, columns)][::-1]
+    finite = np.isfinite(plane)
+    if not np.any(finite):
+        return np.zeros(plane.shape, dtype=np.uint8)
+    low, high = plane[finite].min(), plane[finite].max()
+    scaled = (np.where(finite, plane, low) - low)/((high - low) or 1)
+    return (scaled*255).round().astype(np.uint8)
+
+def focus_channel_of(scan_map, channel):
+    if channel in scan_map.channels:
+        return channel
+    amplitudes = [name for name in scan_map.optical if name.endswith('A')]
+    return amplitudes[-1] if amplitudes else None
+
+def analyse(fname, channel):
+    # Index entry of one scan: columns of scans, channel statistics and the
+    # thumbnail
+    scan_map, metadata = load(fname)
+    entry = {'name': os.path.basename(scan_io.stem(fname)), 'format': 'npy' if fname.endswith('.npy') else 'dat',
+             'timestamp': file_timestamp(fname, metadata), 'complete': bool(metadata.get('complete', False)),
+             'center_point': json.dumps(scan_io.to_list(scan_map.center_point))}
+    for name in scan_io.parameters:
+        entry[name] = scan_io.plain(getattr(scan_map, name))
+    channels = []
+    for name in scan_map.display_channels:
+        values = np.asarray(getattr(scan_map, name), dtype=float)
+        finite = values[np.isfinite(values)]
+        if finite.size:
+            channels.append((name, float(finite.max()), float(finite.mean())))
+    channel = focus_channel_of(scan_map, channel)
+    image = None
+    if channel is not None:
+        result = focus_analysis.analyse(scan_map, channel)
+        entry['focus_channel'] = channel
+        entry['focus_plane'] = result['best_plane']
+        entry['focus_x'], entry['focus_y'], entry['focus_z'] = result['best_focus']
+        image = thumbnail(getattr(scan_map, channel)[result['best_plane']])
+    return entry, channels, (channel, image.shape[1], image.shape[0], png(image)) if image is not None else None
+
+def index_file(task):
+    # Runs in the pool: (path, hash in the index or None, focus channel)
+    fname, known_hash, channel = task
+    digest = file_hash(fname)
+    if digest == known_hash:
+        return fname, digest, None
+    try:
+        return fname, digest, analyse(fname, channel)
+    except Exception as error:
+        return fname, digest, error
+
+def store(connection, fname, stamp, digest, result):
+    mtime, size = stamp
+    now = datetime.datetime.now().isoformat()
+    if result is None:
+        # Touched but unchanged
+        connection.execute('update scans set mtime = ?, size = ?, indexed = ? where path = ?', (mtime, size, now, fname))
+        return
+    connection.execute('delete from channels where path = ?', (fname,))
+    connection.execute('delete from thumbnails where path = ?', (fname,))
+    if isinstance(result, Exception):
+        entry, channels, image = {'name': os.path.basename(scan_io.stem(fname)), 'error': repr(result)}, [], None
+    else:
+        entry, channels, image = result
+    entry = dict(entry, path=fname, mtime=mtime, size=size, hash=digest, indexed=now)
+    connection.execute(f'insert or replace into scans ({", ".join(entry)}) values ({", ".join("?"*len(entry))})',
+                       list(entry.values()))
+    connection.executemany('insert into channels values (?, ?, ?, ?)', [(fname,) + row for row in channels])
+    if image is not None:
+        connection.execute('insert into thumbnails values (?, ?, ?, ?, ?)', (fname,) + image)
+
+def update_index(connection, folder, channel='O3A', workers=None, full=False, report=print):
+    # Indexes the scans below folder; returns the numbers of analysed,
+    # unchanged and removed files and of errors
+    known = {row['path']: row for row in connection.execute('select path, mtime, size, hash from scans')}
+    found = list(scan_files(folder))
+    tasks = []
+    stamps = {}
+    for fname in found:
+        stamps[fname] = signature(fname)
+        row = known.get(fname)
+        if full or row is None:
+            tasks.append((fname, None, channel))
+        elif (row['mtime'], row['size']) != stamps[fname]:
+            tasks.append((fname, row['hash'], channel))
+    counts = {'analysed': 0, 'unchanged': len(found) - len(tasks), 'removed': 0, 'errors': 0}
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        pool = ProcessPoolExecutor(min(workers, len(tasks)))
+        results = pool.map(index_file, tasks, chunksize=max(1, min(16, len(tasks)//(4*workers))))
+    else:
+        pool = None
+        results = map(index_file, tasks)
+    try:
+        for done, (fname, digest, result) in enumerate(results, 1):
+            store(connection, fname, stamps[fname], digest, result)
+            if result is None:
+                counts['unchanged'] += 1
+            elif isinstance(result, Exception):
+                counts['errors'] += 1
+                report(f'{fname}: {result!r}')
+            else:
+                counts['analysed'] += 1
+            if done % commit_interval == 0:
+                connection.commit()
+                report(f'{done}/{len(tasks)} files')
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        connection.commit()
+
+    root = os.path.join(os.path.abspath(folder), '')
+    removed = [path for path in known if path.startswith(root) and path not in stamps]
+    for path in removed:
+        for table in ('scans', 'channels', 'thumbnails'):
+            connection.execute(f'delete from {table} where path = ?', (path,))
+    connection.commit()
+    counts['removed'] = len(removed)
+    return counts
+
+def search(connection, name=None, since=None, until=None, channel=None, min_max=None, max_max=None,
+           min_points=None, complete=None, folder=None, limit=None):
+    # Indexed scans matching all given conditions, newest first, as dicts with
+    # the columns of scans and the channel maxima ('max': {channel: value})
+    #   name        part of the file name
+    #   since/until ISO dates or times, e.g. '2023-05-01' (until is inclusive)
+    #   channel     scans recording this channel, with min_max <= max <= max_max
+    #   min_points  minimum number of pixels
+    conditions, values = ['error is null'], []
+    if name:
+        conditions.append('name like ?')
+        values.append(f'%{name}%')
+    if since:
+        conditions.append('timestamp >= ?')
+        values.append(since)
+    if until:
+        conditions.append('timestamp <= ?')
+        values.append(until + '\uffff')
+    if folder:
+        conditions.append('path like ?')
+        values.append(os.path.join(os.path.abspath(folder), '') + '%')
+    if complete is not None:
+        conditions.append('complete = ?')
+        values.append(int(complete))
+    if min_points:
+        conditions.append('Nx*Ny*Nz >= ?')
+        values.append(min_points)
+    if channel:
+        limits = ['channel = ?']
+        values.append(channel)
+        if min_max is not None:
+            limits.append('max >= ?')
+            values.append(min_max)
+        if max_max is not None:
+            limits.append('max <= ?')
+            values.append(max_max)
+        conditions.append(f'path in (select path from channels where {" and ".join(limits)})')
+    query = f'select * from scans where {" and ".join(conditions)} order by timestamp desc'
+    if limit:
+        query += f' limit {int(limit)}'
+    results = []
+    for row in connection.execute(query, values).fetchall():
+        scan = dict(row)
+        scan['center_point'] = json.loads(scan['center_point']) if scan['center_point'] else None
+        scan['max'] = {r['channel']: r['max'] for r in connection.execute('select channel, max from channels where path = ?', (scan['path'],))}
+        results.append(scan)
+    return results
+
+def get_thumbnail(connection, fname):
+    # PNG bytes of an indexed scan, None without thumbnail
+    row = connection.execute('select png from thumbnails where path = ?', (os.path.abspath(fname),)).fetchone()
+    return None if row is None else bytes(row['png'])
+
+def print_scans(scans):
+    for scan in scans:
+        grid = f'{scan["Nx"]}x{scan["Ny"]}x{scan["Nz"]}'
+        focus = ''
+        if scan['focus_channel']:
+            focus = f'{scan["focus_channel"]} max {scan["max"].get(scan["focus_channel"], float("nan")):.4g}  ' \
+                    f'focus ({scan["focus_x"]/1000:.2f}, {scan["focus_y"]/1000:.2f}, {scan["focus_z"]/1000:.2f}) μm'
+        print(f'{scan["timestamp"]:<17} {grid:<12} {focus:<48} {scan["path"]}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index archived mirror scans and search the index')
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    index = commands.add_parser('index', help='index the scans below folders')
+    index.add_argument('folders', nargs='+')
+    index.add_argument('--workers', type=int, help='processes (default: number of CPUs)')
+    index.add_argument('--channel', default='O3A', help='focus and thumbnail channel')
+    index.add_argument('--full', action='store_true', help='analyse unchanged files again')
+    find = commands.add_parser('search', help='list indexed scans')
+    find.add_argument('--name')
+    find.add_argument('--since')
+    find.add_argument('--until')
+    find.add_argument('--folder')
+    find.add_argument('--channel')
+    find.add_argument('--min-max', type=float)
+    find.add_argument('--max-max', type=float)
+    find.add_argument('--min-points', type=int)
+    find.add_argument('--limit', type=int)
+    picture = commands.add_parser('thumbnail', help='write the thumbnail of an indexed scan')
+    picture.add_argument('scan')
+    picture.add_argument('output')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as file:
+        config = yaml.safe_load(file)
+    base = os.path.dirname(os.path.abspath(args.config))
+    connection = open_index(os.path.join(base, config.get('index_file', 'scan_index.sqlite')))
+
+    if args.command == 'index':
+        for folder in args.folders:
+            counts = update_index(connection, folder, args.channel, args.workers, args.full)
+            print(f'{folder}: {counts["analysed"]} analysed, {counts["unchanged"]} unchanged, '
+                  f'{counts["removed"]} removed, {counts["errors"]} errors')
+    elif args.command == 'search':
+        print_scans(search(connection, args.name, args.since, args.until, args.channel, args.min_max, args.max_max,
+                           args.min_points, folder=args.folder, limit=args.limit))
+    elif args.command == 'thumbnail':
+        data = get_thumbnail(connection, args.scan)
+        if data is None:
+            raise SystemExit(f'{args.scan} is not indexed')
+        with open(args.output, 'wb') as file:
+            file.write(data)
+    connection.close()
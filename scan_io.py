@@ -0,0 +1,289 @@
+import os
+import datetime
+import numpy as np
+import yaml
+from mirror_scan import mirror_scan
+
+# Scan files
+#
+# Binary scans are stored as a pair of files with the same name:
+#   <name>.npy   structured array of shape (Nz, Ny, Nx) with one field per
+#                recorded channel, written in place row by row while scanning
+#   <name>.yaml  scan parameters, channels, timestamps and progress
+#   <name>.rows  journal of the completed (idz, idy) rows, one per line,
+#                appended after the row data is flushed; removed when the
+#                scan is complete. An interrupted scan is resumed from it.
+# The text format (.dat) with the columns of dat_channels is kept for export.
+
+file_format = 'MirrorScan binary 1'
+dat_channels = ['X', 'Y', 'Z', 'O1A', 'O2A', 'O3A', 'O4A']
+parameters = ['sizeX', 'sizeY', 'sizeZ', 'step_sizeX', 'step_sizeY', 'step_sizeZ', 'Nx', 'Ny', 'Nz']
+
+def scan_file_name(scan_map, now=None):
+    # File name without extension, as used for saving since the first version
+    if now is None:
+        now = datetime.datetime.now()
+    return f'{now.strftime("%Y.%m.%d-%H.%M")}_2D_Mirror_scan_{scan_map.sizeX}x{scan_map.sizeY}_{scan_map.step_sizeX}um'
+
+def stem(fname):
+    # Scan names contain dots (date, sizes), so only known extensions are removed
+    for extension in ('.npy', '.yaml', '.dat', '.txt'):
+        if fname.endswith(extension):
+            return fname[:-len(extension)]
+    return fname
+
+def metadata_name(fname):
+    return stem(fname) + '.yaml'
+
+def journal_name(fname):
+    return stem(fname) + '.rows'
+
+def plain(value):
+    # numpy scalars are not accepted by yaml.safe_dump
+    return value.item() if hasattr(value, 'item') else value
+
+def to_list(position):
+    if position is None:
+        return None
+    return [float(position[i]) for i in range(3)]
+
+class scan_writer:
+    def __init__(self, fname, scan_map, resume=False):
+        self.fname = stem(fname) + '.npy'
+        self.scan_map = scan_map
+        self.journal = None
+        if resume:
+            # Continue writing an interrupted scan loaded with load_checkpoint
+            self.data = np.load(self.fname, mmap_mode='r+')
+            with open(metadata_name(self.fname), 'r') as file:
+                self.metadata = yaml.safe_load(file)
+            self.completed = read_journal(self.fname)
+            self.metadata.setdefault('resumed', []).append(datetime.datetime.now().isoformat())
+            self.metadata['finished'] = None
+            self.write_metadata()
+            return
+        self.completed = set()
+        if os.path.exists(journal_name(self.fname)):
+            os.remove(journal_name(self.fname))
+        dtype = np.dtype([(channel, scan_map.channel_dtype(channel)) for channel in scan_map.channels])
+        self.data = np.lib.format.open_memmap(self.fname, mode='w+', dtype=dtype,
+                                              shape=(scan_map.Nz, scan_map.Ny, scan_map.Nx))
+        self.metadata = {'format': file_format, 'channels': list(scan_map.channels),
+                         'optical_dtype': scan_map.optical_dtype.name}
+        for name in parameters:
+            self.metadata[name] = plain(getattr(scan_map, name))
+        self.metadata['center_point'] = to_list(scan_map.center_point)
+        self.metadata['acquisition'] = scan_map.acquisition
+        self.metadata['started'] = datetime.datetime.now().isoformat()
+        self.metadata['finished'] = None
+        self.metadata['rows_completed'] = 0
+        self.metadata['complete'] = False
+        self.write_metadata()
+
+    def write_row(self, idz, idy):
+        for channel in self.scan_map.channels:
+            self.data[channel][idz,idy,:] = getattr(self.scan_map, channel)[idz,idy,:]
+        self.data.flush()
+        if self.journal is None:
+            self.journal = open(journal_name(self.fname), 'a')
+        self.journal.write(f'{idz} {idy}\n')
+        self.journal.flush()
+        self.completed.add((idz, idy))
+        self.metadata['rows_completed'] = len(self.completed)
+        self.write_metadata()
+
+    def write_all(self):
+        for channel in self.scan_map.channels:
+            self.data[channel][...] = getattr(self.scan_map, channel)
+        self.data.flush()
+        self.completed = {(idz, idy) for idz in range(self.scan_map.Nz) for idy in range(self.scan_map.Ny)}
+        self.metadata['rows_completed'] = len(self.completed)
+
+    def write_metadata(self):
+        with open(metadata_name(self.fname), 'w') as file:
+            yaml.safe_dump(self.metadata, file, sort_keys=False)
+
+    def close(self):
+        self.data.flush()
+        self.metadata['center_point'] = to_list(self.scan_map.center_point)
+        self.metadata['finished'] = datetime.datetime.now().isoformat()
+        self.metadata['complete'] = self.metadata['rows_completed'] >= self.scan_map.Nz*self.scan_map.Ny
+        self.write_metadata()
+        if self.journal is not None:
+            self.journal.close()
+        if self.metadata['complete'] and os.path.exists(journal_name(self.fname)):
+            os.remove(journal_name(self.fname))
+        del self.data
+
+def save_scan(fname, scan_map, metadata=None):
+    # metadata: additional entries, e.g. analysis results
+    writer = scan_writer(fname, scan_map)
+    writer.metadata.update(metadata or {})
+    writer.write_all()
+    writer.close()
+
+def load_scan(fname, mmap=False):
+    # With mmap the channels are read-only views on the file
+    with open(metadata_name(fname), 'r') as file:
+        metadata = yaml.safe_load(file)
+    data = np.load(stem(fname) + '.npy', mmap_mode='r')
+    scan_map = mirror_scan(metadata['channels'], metadata.get('optical_dtype', 'float64'))
+    for name in parameters:
+        setattr(scan_map, name, metadata[name])
+    scan_map.center_point = metadata.get('center_point')
+    scan_map.acquisition = metadata.get('acquisition')
+    if mmap:
+        for channel in scan_map.channels:
+            setattr(scan_map, channel, data[channel])
+    else:
+        scan_map.create_array()
+        for channel in scan_map.channels:
+            getattr(scan_map, channel)[...] = data[channel]
+    return scan_map
+
+def read_journal(fname):
+    completed = set()
+    if os.path.exists(journal_name(fname)):
+        with open(journal_name(fname), 'r') as file:
+            for line in file:
+                fields = line.split()
+                # A line cut off by a crash is ignored, that row is measured again
+                if len(fields) == 2:
+                    completed.add((int(fields[0]), int(fields[1])))
+    return completed
+
+def load_checkpoint(fname):
+    # Interrupted scan: the map with all rows written so far, the metadata
+    # (center_point, acquisition, scan settings) and the completed rows
+    with open(metadata_name(fname), 'r') as file:
+        metadata = yaml.safe_load(file)
+    if metadata.get('complete'):
+        raise ValueError(f'{stem(fname)} is complete')
+    completed = read_journal(fname)
+    if metadata.get('rows_completed') and not completed:
+        raise ValueError(f'{stem(fname)} has no row journal')
+    return load_scan(fname), metadata, completed
+
+def remove_scan(fname):
+    for name in (stem(fname) + '.npy', metadata_name(fname), journal_name(fname),
+                 stem(fname) + '.timing.csv', stem(fname) + '.timing.json'):
+        if os.path.exists(name):
+            os.remove(name)
+
+def export_dat(fname, scan_map):
+    M = np.array([getattr(scan_map, channel).flatten() for channel in dat_channels])
+    np.savetxt(fname, M.T,
+                header='\n'.join([f'SizeX = {scan_map.sizeX}', f'SizeY = {scan_map.sizeY}',f'SizeZ = {scan_map.sizeZ}',
+                f'StepX = {scan_map.step_sizeX}',f'StepY = {scan_map.step_sizeY}',f'StepZ = {scan_map.step_sizeZ}']))
+
+header_names = {'SizeX': 'sizeX', 'SizeY': 'sizeY', 'SizeZ': 'sizeZ',
+                'StepX': 'step_sizeX', 'StepY': 'step_sizeY', 'StepZ': 'step_sizeZ'}
+
+def read_dat(fname):
+    # Header values and the data block of a text scan. The data block is
+    # parsed in a single np.fromstring call on the raw bytes.
+    header = {}
+    with open(fname, 'rb') as file:
+        text = file.read()
+    body_start = 0
+    while text.startswith(b'#', body_start):
+        line_end = text.find(b'\n', body_start)
+        if line_end < 0:
+            line_end = len(text)
+        key, _, value = text[body_start+1:line_end].decode().partition('=')
+        if key.strip() in header_names:
+            header[header_names[key.strip()]] = float(value)
+        body_start = line_end + 1
+    data = np.fromstring(text[body_start:], dtype=float, sep=' ')
+    if data.size % len(dat_channels) != 0:
+        raise ValueError(f'{fname}: {data.size} values do not fit {len(dat_channels)} columns')
+    return header, data.reshape(-1, len(dat_channels))
+
+def detect_grid(data):
+    # Nx, Ny, Nz from the coordinate columns. Rows are stored with X running
+    # fastest, so a new row starts where X jumps back by more than half the
+    # X range, and a new plane where Y jumps back at the start of a row.
+    n = data.shape[0]
+    X = data[:,0]
+    Y = data[:,1]
+    breaks = np.flatnonzero(np.diff(X) < -np.ptp(X)/2)
+    Nx = int(breaks[0]) + 1 if breaks.size else n
+    if n % Nx != 0 or np.any((breaks+1) % Nx != 0):
+        return None
+    row_y = Y[::Nx]
+    plane_breaks = np.flatnonzero(np.diff(row_y) < -np.ptp(row_y)/2)
+    Ny = int(plane_breaks[0]) + 1 if plane_breaks.size else row_y.size
+    if row_y.size % Ny != 0:
+        return None
+    return Nx, Ny, row_y.size//Ny
+
+def grid_from_positions(scan_map, data, Nx, Ny, Nz):
+    # Sizes and step sizes consistent with mirror_scan.recalc_size: the
+    # measured span of N points equals the size, and size/step equals N
+    cube = data[:,:3].reshape(Nz, Ny, Nx, 3)
+    spans = [np.median(np.ptp(cube[...,0], axis=2)),
+             np.median(np.ptp(cube[...,1], axis=1)),
+             np.median(np.ptp(cube[...,2], axis=0)) if Nz > 1 else 0]
+    for axis, N, span in zip('XYZ', (Nx, Ny, Nz), spans):
+        setattr(scan_map, f'size{axis}', float(span))
+        setattr(scan_map, f'step_size{axis}', float(span)/N if span > 0 else 1000.0)
+    scan_map.Nx, scan_map.Ny, scan_map.Nz = Nx, Ny, Nz
+
+def load_dat(fname, cache=True):
+    # A binary copy of the parsed file is kept next to it (<fname>.npy and
+    # <fname>.yaml) and memory-mapped when the file is opened again
+    if cache:
+        cached = load_cache(fname)
+        if cached is not None:
+            return cached
+
+    header, data = read_dat(fname)
+    scan_map = mirror_scan(dat_channels, 'float64')
+    header_ok = len(header) == len(header_names)
+    if header_ok:
+        for name, value in header.items():
+            setattr(scan_map, name, value)
+        scan_map.recalc_size()
+        header_ok = scan_map.Nx*scan_map.Ny*scan_map.Nz == data.shape[0]
+    if not header_ok:
+        grid = detect_grid(data)
+        if grid is None:
+            raise ValueError(f'{fname}: scan size could not be determined')
+        grid_from_positions(scan_map, data, *grid)
+
+    scan_map.create_array()
+    for column, channel in enumerate(dat_channels):
+        getattr(scan_map, channel)[...] = np.reshape(data[:,column],(scan_map.Nz,scan_map.Ny,scan_map.Nx))
+
+    if cache:
+        write_cache(fname, scan_map)
+    return scan_map
+
+def source_info(fname):
+    status = os.stat(fname)
+    return {'file': os.path.basename(fname), 'mtime': status.st_mtime, 'size': status.st_size}
+
+def load_cache(fname):
+    try:
+        with open(metadata_name(fname + '.npy'), 'r') as file:
+            metadata = yaml.safe_load(file)
+        if metadata.get('source') != source_info(fname):
+            return None
+        return load_scan(fname + '.npy', mmap=True)
+    except (OSError, ValueError, KeyError, AttributeError, yaml.YAMLError):
+        return None
+
+def write_cache(fname, scan_map):
+    try:
+        writer = scan_writer(fname + '.npy', scan_map)
+        writer.metadata['source'] = source_info(fname)
+        writer.write_all()
+        writer.close()
+    except OSError:
+        # Read-only location, the file is parsed again next time
+        pass
+
+def load(fname):
+    if fname.endswith('.npy') or fname.endswith('.yaml'):
+        return load_scan(fname)
+    return load_dat(fname)
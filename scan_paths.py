@@ -0,0 +1,106 @@
+import numpy as np
+
+# Scan-path planners. Every planner takes the X, Y, Z coordinates of the grid
+# and the current mirror position and yields (idz, idy, idx, (x, y, z)) in
+# the order the points should be visited.
+
+def grid_axes(scan_map, center=(0, 0, 0)):
+    xs = center[0] + np.linspace(-scan_map.sizeX/2,scan_map.sizeX/2,scan_map.Nx)
+    ys = center[1] + np.linspace(-scan_map.sizeY/2,scan_map.sizeY/2,scan_map.Ny)
+    if scan_map.Nz == 1:
+        zs = np.array([center[2]])
+    else:
+        zs = center[2] + np.linspace(-scan_map.sizeZ/2,scan_map.sizeZ/2,scan_map.Nz)
+    return xs, ys, zs
+
+def raster(xs, ys, zs, center=None):
+    # Every row from negative to positive X (original scanning order)
+    for idz, z in enumerate(zs):
+        for idy, y in enumerate(ys):
+            for idx, x in enumerate(xs):
+                yield idz, idy, idx, (x, y, z)
+
+def serpentine(xs, ys, zs, center=None):
+    # Boustrophedon: every second row runs backwards, planes restart at -Y
+    for idz, z in enumerate(zs):
+        for idy, y in enumerate(ys):
+            xorder = range(len(xs)) if idy % 2 == 0 else range(len(xs)-1, -1, -1)
+            for idx in xorder:
+                yield idz, idy, idx, (xs[idx], y, z)
+
+def z_serpentine(xs, ys, zs, center=None):
+    # Serpentine rows, and every second plane runs backwards in Y so the
+    # plane change is a single Z step
+    row = 0
+    for idz, z in enumerate(zs):
+        yorder = range(len(ys)) if idz % 2 == 0 else range(len(ys)-1, -1, -1)
+        for idy in yorder:
+            xorder = range(len(xs)) if row % 2 == 0 else range(len(xs)-1, -1, -1)
+            for idx in xorder:
+                yield idz, idy, idx, (xs[idx], ys[idy], z)
+            row += 1
+
+def spiral(xs, ys, zs, center=None):
+    # Square spiral outward from the grid point closest to the current position
+    if center is None:
+        center = (np.mean(xs), np.mean(ys))
+    cx = int(np.argmin(np.abs(np.asarray(xs)-center[0])))
+    cy = int(np.argmin(np.abs(np.asarray(ys)-center[1])))
+    jj, ii = np.meshgrid(np.arange(len(xs)), np.arange(len(ys)))
+    ring = np.maximum(np.abs(jj-cx), np.abs(ii-cy))
+    angle = np.mod(np.arctan2(ii-cy, jj-cx), 2*np.pi)
+    order = np.lexsort((angle.ravel(), ring.ravel()))
+    for idz, z in enumerate(zs):
+        for k in order:
+            idy, idx = divmod(int(k), len(xs))
+            yield idz, idy, idx, (xs[idx], ys[idy], z)
+
+def random_order(xs, ys, zs, center=None, seed=None):
+    # Random visiting order inside every plane, planes in ascending Z
+    rng = np.random.default_rng(seed)
+    for idz, z in enumerate(zs):
+        for k in rng.permutation(len(xs)*len(ys)):
+            idy, idx = divmod(int(k), len(xs))
+            yield idz, idy, idx, (xs[idx], ys[idy], z)
+
+scan_paths = {
+    'Raster': raster,
+    'Serpentine': serpentine,
+    'Z-serpentine': z_serpentine,
+    'Spiral': spiral,
+    'Random': random_order,
+}
+
+def plan(name, xs, ys, zs, center=None):
+    return list(scan_paths[name](xs, ys, zs, center))
+
+def planned_travel(path, start=None):
+    # Total euclidean distance of the path, including the move from start
+    # to the first point when a start position is given
+    targets = np.array([target for _, _, _, target in path], dtype=float)
+    if start is not None:
+        targets = np.vstack((np.asarray(start, dtype=float)[:3], targets))
+    if len(targets) < 2:
+        return 0.0
+    return float(np.sum(np.linalg.norm(np.diff(targets, axis=0), axis=1)))
+
+def row_path(name, Ny, Nz):
+    # Row sequence (idz, idy, forward) for row-wise acquisition such as the
+    # fly-scan. Planners that are not row based fall back to serpentine rows.
+    rows = []
+    row = 0
+    for idz in range(Nz):
+        if name == 'Z-serpentine' and idz % 2 == 1:
+            yorder = range(Ny-1, -1, -1)
+        else:
+            yorder = range(Ny)
+        for idy in yorder:
+            if name == 'Raster':
+                forward = True
+            elif name == 'Z-serpentine':
+                forward = row % 2 == 0
+            else:
+                forward = idy % 2 == 0
+            rows.append((idz, idy, forward))
+            row += 1
+    return rows
@@ -0,0 +1,175 @@
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+from mirror_scan import mirror_scan
+
+# Scan engine in a separate process (scan_process: true in config.yaml). The
+# motor loop then does not share the GIL with rendering and mouse events of
+# the GUI, so the GUI load does not show up in the pixel timing.
+#
+# The channels of the scan map live in a multiprocessing.shared_memory block
+# created by the GUI. The scan process writes them, the GUI maps the same
+# block read-only and redraws a row when the process reports it complete.
+# When the scan is finished the GUI keeps a private copy and releases the
+# block. Messages go over a multiprocessing Pipe:
+#   GUI -> process   ('scan', settings), ('quit',)
+#   process -> GUI   ('ready',), ('status', text), ('timing', summary),
+#                    ('progress', idz, idy), ('completed', result),
+#                    ('failed', text)
+# The process connects to the microscope (or to its own simulation) like
+# batch_scan, with its own session, so its scans pause and continue when the
+# link drops. Step and fly scans run in the process; adaptive scans create a
+# new map at every level and stay in the GUI's worker thread.
+
+geometry = ['step_sizeX', 'step_sizeY', 'step_sizeZ', 'sizeX', 'sizeY', 'sizeZ', 'Nx', 'Ny', 'Nz',
+            'center_point', 'acquisition']
+
+def describe(scan_map):
+    # Picklable settings to rebuild the map on a buffer
+    values = {name: getattr(scan_map, name) for name in geometry}
+    if values['center_point'] is not None:
+        values['center_point'] = [float(v) for v in values['center_point']]
+    values['channels'] = list(scan_map.channels)
+    values['optical_dtype'] = scan_map.optical_dtype.str
+    return values
+
+def attach(description, buffer):
+    scan_map = mirror_scan(description['channels'], description['optical_dtype'])
+    for name in geometry:
+        setattr(scan_map, name, description[name])
+    scan_map.create_array(buffer)
+    return scan_map
+
+def release(scan_map):
+    # Drop the views on a shared buffer so that it can be closed
+    for name in scan_map.channels:
+        setattr(scan_map, name, [])
+    scan_map.buffer = None
+
+def serve(conn, config):
+    # Entry point of the scan process
+    from scan_engine import Worker
+    from acquisition import acquisition_profile
+    from motion_profile import motion_profile
+    import batch_scan
+    try:
+        # Session messages are not forwarded: the pipe is written by the
+        # worker only
+        session = batch_scan.connect(config, log=lambda text: None)
+    except Exception as error:
+        conn.send(('failed', f'connection failed: {error}'))
+        return
+    worker = Worker()
+    worker.session = session
+    worker.use_connection(session.handles)
+    worker.pipelined = config.get('pipelined_moves', True)
+    worker.motion = motion_profile.from_config(config.get('motion'))
+    worker.status_update.connect(lambda text: conn.send(('status', text)))
+    worker.timing_update.connect(lambda summary: conn.send(('timing', summary)))
+    worker.progress.connect(lambda idz, idy: conn.send(('progress', idz, idy)))
+    conn.send(('ready',))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] != 'scan':
+            break
+        settings = message[1]
+        # The block belongs to the GUI, which unlinks it; the spawned process
+        # shares the resource tracker of the GUI
+        memory = shared_memory.SharedMemory(name=settings['memory'])
+        scan_map = attach(settings['map'], memory.buf)
+        worker.scan_map = scan_map
+        worker.scan_path = settings['path']
+        worker.save_name = settings['save_name']
+        worker.resume = settings['resume']
+        worker.focus_channel = settings['focus_channel']
+        worker.fly_velocity = settings['fly_velocity']
+        worker.sparse_fraction = settings['sparse']
+        worker.files = []
+        try:
+            worker.profile = acquisition_profile.from_dict(settings['acquisition'])
+            if settings['mode'] == 'fly':
+                worker.do_fly_scan()
+            else:
+                worker.do_scan()
+        except Exception:
+            # The rows written so far stay in the file and can be resumed
+            worker.close_writer(failed=True)
+            conn.send(('failed', traceback.format_exc(limit=2).strip().splitlines()[-1]))
+        else:
+            conn.send(('completed', {'center_point': [float(v) for v in scan_map.center_point],
+                                     'acquisition': scan_map.acquisition, 'files': worker.files}))
+        finally:
+            worker.scan_map = []
+            release(scan_map)
+            del scan_map
+            memory.close()
+    session.stop()
+
+class scan_process:
+    def __init__(self, config):
+        # Spawned, a forked copy of the GUI process would inherit its Qt state
+        context = multiprocessing.get_context('spawn')
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=serve, args=(child, config), daemon=True)
+        self.process.start()
+        child.close()
+        self.memory = None
+        self.scan_map = None
+
+    def start(self, scan_map, settings):
+        # Shared copy of scan_map (with its data, e.g. the rows of a resumed
+        # scan), read-only for the GUI, and the scan command
+        self.memory = shared_memory.SharedMemory(create=True, size=max(scan_map.nbytes(), 1))
+        shared = attach(describe(scan_map), self.memory.buf)
+        for name in shared.channels:
+            getattr(shared, name)[...] = getattr(scan_map, name)
+            getattr(shared, name).flags.writeable = False
+        self.conn.send(('scan', dict(settings, memory=self.memory.name, map=describe(scan_map))))
+        self.scan_map = shared
+        return shared
+
+    def messages(self):
+        # Messages waiting from the process, without blocking
+        messages = []
+        while self.conn.poll():
+            try:
+                messages.append(self.conn.recv())
+            except EOFError:
+                break
+        if not messages and self.scan_map is not None and not self.process.is_alive():
+            messages.append(('failed', f'scan process exited with code {self.process.exitcode}'))
+        return messages
+
+    def finished_map(self, result=None):
+        # Private copy of the shared map with the center point and acquisition
+        # of the result
+        scan_map = self.scan_map.copy()
+        if result is not None:
+            scan_map.center_point = result['center_point']
+            scan_map.acquisition = result['acquisition']
+        return scan_map
+
+    def release(self):
+        # Once the GUI does not display the shared map any more
+        release(self.scan_map)
+        self.scan_map = None
+        try:
+            self.memory.close()
+        except BufferError:
+            # Still referenced, freed by the garbage collector
+            pass
+        self.memory.unlink()
+        self.memory = None
+
+    def close(self):
+        try:
+            self.conn.send(('quit',))
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
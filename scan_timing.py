@@ -0,0 +1,133 @@
+import json
+import numpy as np
+from timeit import default_timer as timer
+
+# Timing of the scan loops. Every step of a loop (a pixel, or a row in a fly
+# scan) is split into phases: the loop calls mark(phase) at the end of each
+# phase and the time since the previous mark is booked on it; end_step()
+# closes the step. The remaining time is estimated from exponentially
+# weighted means of the step time, separately for steps within a row, the
+# first step of a row and the first step of a Z plane, so the estimate
+# follows changes of step size and the extra moves between rows and planes.
+
+step_phases = ['settle', 'readout', 'move_command', 'refresh', 'write', 'move', 'other']
+fly_phases = ['move_to_row', 'fly', 'binning', 'write', 'other']
+step_kinds = ['pixel', 'row', 'plane']
+histogram_edges = np.logspace(-5, 1, 31)       # s
+
+class scan_timer:
+    def __init__(self, phases, path_index, pixels_per_step=1, alpha=0.1):
+        # path_index: (idz, idy[, idx]) of every step in measuring order
+        self.phases = list(phases)
+        self.index = np.asarray(path_index, dtype=int).reshape(len(path_index), -1) if len(path_index) else np.zeros((0, 2), dtype=int)
+        self.pixels_per_step = pixels_per_step
+        self.alpha = alpha
+        n = len(self.index)
+        self.durations = np.zeros((n, len(self.phases)))
+        self.ends = np.zeros(n)
+        # Kind of every step: 0 within a row, 1 first of a row, 2 first of a plane
+        new_plane = np.ones(n, dtype=bool)
+        new_row = np.ones(n, dtype=bool)
+        new_plane[1:] = self.index[1:,0] != self.index[:-1,0]
+        new_row[1:] = np.any(self.index[1:,:2] != self.index[:-1,:2], axis=1)
+        self.kinds = np.where(new_plane, 2, np.where(new_row, 1, 0))
+        # remaining[k, n]: steps of kind k from step n on
+        counts = np.zeros((len(step_kinds), n + 1), dtype=int)
+        for kind in range(len(step_kinds)):
+            counts[kind,:n] = np.cumsum((self.kinds == kind)[::-1])[::-1]
+        self.remaining = counts
+        self.ewma = [None]*len(step_kinds)
+        self.count = 0
+        self.start()
+
+    def start(self):
+        self.started = self.last = timer()
+
+    def mark(self, phase):
+        now = timer()
+        self.durations[self.count, self.phases.index(phase)] += now - self.last
+        self.last = now
+
+    def end_step(self):
+        self.mark('other')
+        n = self.count
+        self.ends[n] = self.last - self.started
+        total = self.durations[n].sum()
+        kind = self.kinds[n]
+        if self.ewma[kind] is None:
+            self.ewma[kind] = total
+        else:
+            self.ewma[kind] += self.alpha*(total - self.ewma[kind])
+        self.count += 1
+
+    def eta(self):
+        # Remaining time in s, None before the first step
+        known = [value for value in self.ewma if value is not None]
+        if not known:
+            return None
+        fallback = self.ewma[0] if self.ewma[0] is not None else min(known)
+        return float(sum(self.remaining[kind, self.count]*(fallback if value is None else value)
+                         for kind, value in enumerate(self.ewma)))
+
+    def pixel_rate(self):
+        # Pixels per second of the steps within a row (or of all steps)
+        value = self.ewma[0] if self.ewma[0] is not None else next((v for v in self.ewma if v is not None), None)
+        if not value:
+            return None
+        return self.pixels_per_step/value
+
+    def summary(self, histograms=False):
+        done = self.durations[:self.count]
+        totals = done.sum(axis=1)
+        values = {'steps': self.count, 'total_steps': len(self.index), 'pixels_per_step': self.pixels_per_step,
+                  'elapsed': float(self.ends[self.count-1]) if self.count else 0.0,
+                  'eta': self.eta(), 'pixel_rate': self.pixel_rate(), 'phases': {}}
+        for column, phase in enumerate(self.phases):
+            times = done[:,column]
+            stats = {'total': float(times.sum()),
+                     'share': float(times.sum()/totals.sum()) if totals.sum() > 0 else 0.0}
+            if self.count:
+                stats.update({'mean': float(times.mean()), 'p50': float(np.percentile(times, 50)),
+                              'p95': float(np.percentile(times, 95)), 'max': float(times.max())})
+            if histograms:
+                stats['histogram'] = np.histogram(times, histogram_edges)[0].tolist()
+            values['phases'][phase] = stats
+        if histograms:
+            values['histogram_edges'] = histogram_edges.tolist()
+            values['step_histogram'] = np.histogram(totals, histogram_edges)[0].tolist()
+            values['rows'] = self.row_totals()
+        return values
+
+    def row_totals(self):
+        # [idz, idy, steps, time] of every measured row
+        done = self.index[:self.count,:2]
+        if not len(done):
+            return []
+        rows, inverse = np.unique(done, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        times = np.bincount(inverse, weights=self.durations[:self.count].sum(axis=1), minlength=len(rows))
+        steps = np.bincount(inverse, minlength=len(rows))
+        return [[int(row[0]), int(row[1]), int(step), float(time)] for row, step, time in zip(rows, steps, times)]
+
+    def export(self, stem, extra=None):
+        # <stem>.timing.csv: one line per step, <stem>.timing.json: summary,
+        # histograms, row totals and the entries of extra
+        columns = ['idz', 'idy', 'idx'][:self.index.shape[1]] + ['end', 'total'] + self.phases
+        done = self.durations[:self.count]
+        table = np.column_stack([self.index[:self.count], self.ends[:self.count], done.sum(axis=1), done])
+        formats = ['%d']*self.index.shape[1] + ['%.6f']*(2 + len(self.phases))
+        np.savetxt(stem + '.timing.csv', table, fmt=formats, delimiter=',', header=','.join(columns), comments='')
+        with open(stem + '.timing.json', 'w') as file:
+            json.dump(dict(self.summary(histograms=True), **(extra or {})), file, indent=1)
+
+def format_summary(summary):
+    # Text of the live stats panel
+    lines = []
+    for phase, stats in summary['phases'].items():
+        if 'mean' in stats and stats['total'] > 0:
+            lines.append(f'{phase:<12} {stats["mean"]*1000:7.1f} ms  p95 {stats["p95"]*1000:7.1f}  {stats["share"]*100:3.0f}%')
+    rate = summary['pixel_rate']
+    eta = summary['eta']
+    lines.append(f'{summary["steps"]}/{summary["total_steps"]} steps' + (f', {rate:.1f} px/s' if rate else '')
+                 + (f', ETA {eta:.0f} s' if eta is not None else ''))
+    return '\n'.join(lines)
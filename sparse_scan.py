@@ -0,0 +1,116 @@
+import numpy as np
+from mirror_scan import mechanical_channels, sparse_channels, is_phase
+from scan_paths import grid_axes
+from regrid import interp_rows
+
+# Sparse step scans: only a fraction of the grid points is measured and the
+# other pixels are reconstructed afterwards.
+#
+# Sampling: every row gets round(fraction*Nx) pixels (at least one), one at a
+# random position in each of as many equal segments of the row, so the
+# samples are spread over the plane and every row is completed, written and
+# resumed like in a full scan. The selection only depends on the grid, the
+# fraction and the seed, so a resumed scan measures the same pixels. The
+# samples are visited in the order of the scan path (Worker.measure_map):
+# the travel is about that of a full scan, the time saved is the settling and
+# readout of the skipped pixels. A nearest neighbour order across rows would
+# shorten the travel little and leave rows incomplete until the end.
+#
+# Reconstruction: every channel is interpolated linearly between the samples
+# of each row and, separately, of each column (regrid.interp_rows on the
+# pixel indices). The two estimates are averaged with weights 1/gap^2, gap
+# being the distance to the nearer sample along the row or column, so the
+# closer samples dominate. Phases are interpolated as unit vectors. Measured
+# pixels keep their values, unmeasured pixels get the nominal grid position.
+#
+# The confidence channel is 1 for measured pixels and exp(-d^2/2) for the
+# others, d being the distance in pixels to the nearest sample along the row
+# or column.
+
+default_seed = 0
+confidence_channel = sparse_channels[0]
+
+def sample_mask(Nz, Ny, Nx, fraction, seed=default_seed):
+    # (Nz,Ny,Nx) True for the pixels to measure
+    k = int(np.clip(round(fraction*Nx), 1, Nx))
+    rng = np.random.default_rng(seed)
+    edges = np.linspace(0, Nx, k + 1)
+    offsets = rng.random((Nz, Ny, k))
+    columns = np.floor(edges[:-1] + offsets*(edges[1:] - edges[:-1])).astype(int)
+    mask = np.zeros((Nz, Ny, Nx), dtype=bool)
+    np.put_along_axis(mask, columns, True, axis=2)
+    return mask
+
+def clear_unmeasured(scan_map, mask):
+    # Unmeasured pixels are NaN until they are reconstructed, so that the
+    # live view and checkpoints only show measured values
+    for name in scan_map.display_channels:
+        getattr(scan_map, name)[~mask] = np.nan
+    if confidence_channel in scan_map.channels:
+        getattr(scan_map, confidence_channel)[mask] = 1
+
+def axis_pass(mask, values):
+    # Interpolation along the last pixel axis of mask (R,N) with values
+    # (R,N,C); returns the values (R,N,C) and the gap (R,N) in pixels, inf in
+    # lines without samples
+    R, N = mask.shape
+    counts = mask.sum(axis=1)
+    K = max(int(counts.max()), 1)
+    # Indices of the samples, ascending, the last one repeated as padding
+    order = np.argsort(~mask, axis=1, kind='stable')
+    take = np.minimum(np.arange(K)[None,:], np.maximum(counts - 1, 0)[:,None])
+    index = np.take_along_axis(order, take, axis=1)
+    samples = np.take_along_axis(values, index[...,None], axis=1)
+    result, gap = interp_rows(index.astype(float), samples, np.arange(N, dtype=float))
+    # Lines without samples get no weight
+    result[counts == 0] = 0
+    gap[counts == 0] = np.inf
+    return result, gap
+
+def reconstruct(scan_map, mask, center=None):
+    # Fills the unmeasured pixels of all channels of scan_map and its
+    # confidence channel in place
+    if center is None:
+        center = scan_map.center_point if scan_map.center_point is not None else (0, 0, 0)
+    xs, ys, zs = grid_axes(scan_map, center)
+    missing = ~mask
+    for name, nominal in zip(mechanical_channels, (xs[None,None,:], ys[None,:,None], zs[:,None,None])):
+        values = getattr(scan_map, name)
+        values[...] = np.where(missing, nominal, values)
+    channels = [name for name in scan_map.display_channels if name != confidence_channel]
+    for idz in range(scan_map.Nz):
+        columns = []
+        for name in channels:
+            values = np.asarray(getattr(scan_map, name)[idz], dtype=float)
+            if is_phase(name):
+                columns += [np.cos(np.radians(values)), np.sin(np.radians(values))]
+            else:
+                columns.append(values)
+        data = np.stack(columns, axis=-1)
+        along_x, gap_x = axis_pass(mask[idz], data)
+        along_y, gap_y = axis_pass(mask[idz].T, data.transpose(1, 0, 2))
+        along_y, gap_y = along_y.transpose(1, 0, 2), gap_y.T
+        with np.errstate(divide='ignore'):
+            weight_x = 1/np.maximum(gap_x, 1e-3)**2
+            weight_y = 1/np.maximum(gap_y, 1e-3)**2
+        estimate = (weight_x[...,None]*along_x + weight_y[...,None]*along_y)/(weight_x + weight_y)[...,None]
+        plane_missing = missing[idz]
+        column = 0
+        for name in channels:
+            values = getattr(scan_map, name)[idz]
+            if is_phase(name):
+                filled = np.degrees(np.arctan2(estimate[...,column+1], estimate[...,column]))
+                column += 2
+            else:
+                filled = estimate[...,column]
+                column += 1
+            values[plane_missing] = filled[plane_missing]
+        if confidence_channel in scan_map.channels:
+            distance = np.minimum(gap_x, gap_y)
+            getattr(scan_map, confidence_channel)[idz] = np.where(plane_missing, np.exp(-distance**2/2), 1)
+
+def measured(scan_map):
+    # Mask of the measured pixels of a reconstructed scan, None for full scans
+    if confidence_channel not in scan_map.channels:
+        return None
+    return np.asarray(getattr(scan_map, confidence_channel)) >= 1
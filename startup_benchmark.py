@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+import statistics
+
+# Startup time of the application and checks that keep it fast:
+#   - the scan engine and the file IO import without QtWidgets
+#   - importing mirrorApp reads no files, so it works from any folder
+#   - nea_tools is not imported before connecting
+#   - ui_mirrorApp.py is up to date with mirrorApp.ui
+# Every run starts a fresh interpreter in an empty temporary folder. The exit
+# status is 1 when a check fails or the median startup exceeds the budget.
+#
+#   python startup_benchmark.py --runs 5 --budget 1.5
+
+package_folder = os.path.dirname(os.path.abspath(__file__))
+
+engine_script = '''
+import sys, time
+t0 = time.perf_counter()
+import scan_engine, scan_io, focus_analysis, batch_scan
+t1 = time.perf_counter()
+print(json_dump({'engine_import': t1 - t0, 'engine_loads_widgets': 'PySide6.QtWidgets' in sys.modules}))
+'''
+
+gui_script = '''
+import sys, time
+t0 = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+t1 = time.perf_counter()
+import mirrorApp
+t2 = time.perf_counter()
+w = mirrorApp.MainWindow()
+w.show()
+app.processEvents()
+t3 = time.perf_counter()
+print(json_dump({'qt_init': t1 - t0, 'app_import': t2 - t1, 'window': t3 - t2,
+                 'startup': t3 - t1, 'nea_tools_imported': 'nea_tools' in sys.modules}))
+sys.stdout.flush()
+# Skip the teardown of the worker thread
+import os
+os._exit(0)
+'''
+
+def run_script(script):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = package_folder + os.pathsep + env.get('PYTHONPATH', '')
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    code = 'import json\njson_dump = json.dumps\n' + script
+    with tempfile.TemporaryDirectory() as folder:
+        result = subprocess.run([sys.executable, '-c', code], cwd=folder, env=env,
+                                capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f'exit status {result.returncode}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def ui_up_to_date():
+    # None when pyside6-uic is not available
+    try:
+        result = subprocess.run(['pyside6-uic', os.path.join(package_folder, 'mirrorApp.ui')],
+                                capture_output=True, text=True)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    with open(os.path.join(package_folder, 'ui_mirrorApp.py'), 'r', encoding='utf-8') as file:
+        compiled = file.read()
+    # The header contains the version of the compiler
+    strip = lambda text: [line for line in text.splitlines() if not line.startswith('##')]
+    return strip(result.stdout) == strip(compiled)
+
+def benchmark(runs):
+    engine = [run_script(engine_script) for n in range(runs)]
+    gui = [run_script(gui_script) for n in range(runs)]
+    report = {'runs': runs}
+    for key in ('engine_import',):
+        report[key] = statistics.median(run[key] for run in engine)
+    for key in ('qt_init', 'app_import', 'window', 'startup'):
+        report[key] = statistics.median(run[key] for run in gui)
+    report['engine_loads_widgets'] = any(run['engine_loads_widgets'] for run in engine)
+    report['nea_tools_imported'] = any(run['nea_tools_imported'] for run in gui)
+    report['ui_up_to_date'] = ui_up_to_date()
+    return report
+
+def check(report, budget):
+    problems = []
+    if report['startup'] > budget:
+        problems.append(f'startup {report["startup"]:.3f} s exceeds the budget of {budget} s')
+    if report['engine_loads_widgets']:
+        problems.append('the scan engine imports QtWidgets')
+    if report['nea_tools_imported']:
+        problems.append('nea_tools is imported before connecting')
+    if report['ui_up_to_date'] is False:
+        problems.append('ui_mirrorApp.py is out of date, run: pyside6-uic mirrorApp.ui -o ui_mirrorApp.py')
+    return problems
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the startup time of the application')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=1.5, help='s, import of mirrorApp and first window')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    try:
+        report = benchmark(args.runs)
+    except RuntimeError as error:
+        print(f'Startup failed: {error}')
+        sys.exit(1)
+    problems = check(report, args.budget)
+    if args.json:
+        print(json.dumps(dict(report, problems=problems), indent=2))
+    else:
+        print(f'Median of {report["runs"]} runs')
+        print(f'  scan engine import      {report["engine_import"]*1000:8.1f} ms')
+        print(f'  QApplication            {report["qt_init"]*1000:8.1f} ms')
+        print(f'  mirrorApp import        {report["app_import"]*1000:8.1f} ms')
+        print(f'  MainWindow shown        {report["window"]*1000:8.1f} ms')
+        print(f'  startup (import+window) {report["startup"]*1000:8.1f} ms (budget {args.budget*1000:.0f} ms)')
+        for problem in problems:
+            print(f'FAILED: {problem}')
+    sys.exit(1 if problems else 0)
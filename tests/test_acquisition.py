@@ -0,0 +1,49 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acquisition import acquisition_profile, trimmed_mean
+
+channels = ['O3A', 'O3P']
+
+def test_phases_around_180_deg():
+    # The mean of 170 and -170 deg is 180 deg, not 0
+    samples = [[1.0, 170.0], [3.0, -170.0], [2.0, 180.0], [2.0, -180.0]]
+    for reduction in ('mean', 'median', 'trimmed mean'):
+        values, std = acquisition_profile(samples=4, reduction=reduction).reduce(samples, channels)
+        assert np.isclose(abs(values[1]), 180), reduction
+        assert std[1] < 10, reduction
+    assert np.isclose(values[0], 2)
+
+def test_circular_std():
+    values, std = acquisition_profile(samples=3).reduce([[0, 10], [0, 10], [0, 10]], channels)
+    assert np.allclose(values, [0, 10])
+    assert np.allclose(std, 0, atol=1e-4)
+    # Small spreads match the linear standard deviation
+    phases = np.array([-2.0, 0.0, 2.0])
+    values, std = acquisition_profile(samples=3).reduce(np.column_stack([phases, phases]), channels)
+    assert np.isclose(std[1], np.std(phases), rtol=1e-3)
+    assert np.isclose(std[0], np.std(phases))
+
+def test_amplitudes_are_not_circular():
+    samples = [[170.0, 0.0], [-170.0, 0.0]]
+    values, _ = acquisition_profile(samples=2).reduce(samples, channels)
+    assert values[0] == 0
+    values, _ = acquisition_profile(samples=2).reduce(samples)
+    assert values[0] == 0
+
+def test_single_sample():
+    values, std = acquisition_profile().reduce([[1.0, -179.0]], channels)
+    assert list(values) == [1.0, -179.0] and list(std) == [0, 0]
+
+def test_trimmed_mean():
+    assert trimmed_mean(np.array([100.0] + [1.0]*8 + [-100.0])) == 1
+
+def test_from_dict():
+    profile = acquisition_profile.from_dict({'samples': 4, 'reduction': 'median', 'settle_time': 5})
+    assert profile.as_dict() == {'sampling_time': 50, 'settle_time': 5, 'samples': 4, 'reduction': 'median'}
+    for values in ({'samples': 0}, {'samples': 2.5}, {'reduction': 'mode'}, {'averages': 3}):
+        with pytest.raises(ValueError):
+            acquisition_profile.from_dict(values)
@@ -0,0 +1,45 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flyscan import bin_row
+
+def row_samples(x, channel):
+    # (t, x, y, z, channel) of every sample
+    x = np.asarray(x, dtype=float)
+    return np.column_stack([np.arange(x.size), x, np.full(x.size, 50.0), np.zeros(x.size), channel])
+
+def test_samples_are_averaged_per_pixel():
+    xs = np.array([0.0, 100.0, 200.0])
+    samples = row_samples([-40, 10, 60, 90, 140, 199, 240, 400], [1, 3, 10, 20, 30, 5, 7, 99])
+    positions, values, counts = bin_row(samples, xs, 100, 1)
+    # 400 is outside the row and dropped, 140 belongs to the second pixel
+    assert list(counts) == [2, 3, 2]
+    assert np.allclose(values[:,0], [2, 20, 6])
+    assert np.allclose(positions[:,0], [-15, 96.666666, 219.5])
+    assert np.allclose(positions[:,1], 50)
+
+def test_backward_row():
+    # Rows measured towards negative X are binned on descending xs
+    xs = np.array([200.0, 100.0, 0.0])
+    samples = row_samples([230, 180, 110, 60, 20, -30], [1, 3, 5, 7, 9, 11])
+    positions, values, counts = bin_row(samples, xs, 100, 1)
+    assert list(counts) == [2, 2, 2]
+    assert np.allclose(values[:,0], [2, 6, 10])
+    assert np.allclose(positions[:,0], [205, 85, -5])
+
+def test_empty_pixels_are_interpolated():
+    xs = np.array([0.0, 100.0, 200.0, 300.0])
+    samples = row_samples([0, 300], [[1, 10], [4, 40]])
+    positions, values, counts = bin_row(samples, xs, 100, 2)
+    assert list(counts) == [1, 0, 0, 1]
+    assert np.allclose(positions[:,0], xs)
+    assert np.allclose(values, [[1, 10], [2, 20], [3, 30], [4, 40]])
+
+def test_row_without_samples():
+    xs = np.array([0.0, 100.0])
+    positions, values, counts = bin_row(np.zeros((0, 5)), xs, 100, 1)
+    assert list(counts) == [0, 0]
+    assert np.allclose(positions[:,0], xs)
+    assert np.all(np.isnan(values))
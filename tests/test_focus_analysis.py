@@ -0,0 +1,65 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import focus_analysis
+from mirror_scan import mirror_scan
+from scan_paths import grid_axes
+
+def spot_scan(amplitudes, x0=230.0, y0=-140.0, sigma_major=300.0, sigma_minor=200.0, angle=30.0):
+    # Z stack of a rotated Gaussian spot on a background of 0.1
+    scan_map = mirror_scan(['X', 'Y', 'Z', 'O3A'])
+    scan_map.sizeX = scan_map.sizeY = 4000
+    scan_map.sizeZ = 500*len(amplitudes)
+    scan_map.step_sizeX = scan_map.step_sizeY = 100
+    scan_map.step_sizeZ = 500
+    scan_map.recalc_size()
+    scan_map.center_point = [1000, 2000, 3000]
+    scan_map.create_array()
+    xs, ys, _ = grid_axes(scan_map)
+    X, Y = np.meshgrid(xs - x0, ys - y0)
+    c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+    u = c*X + s*Y
+    v = -s*X + c*Y
+    spot = np.exp(-u**2/(2*sigma_major**2) - v**2/(2*sigma_minor**2))
+    for idz, amplitude in enumerate(amplitudes):
+        scan_map.O3A[idz] = 0.1 + amplitude*spot
+    return scan_map
+
+def test_spot_parameters():
+    scan_map = spot_scan([1.0, 2.0])
+    result = focus_analysis.analyse(scan_map, 'O3A')
+    fwhm = focus_analysis.fwhm_factor
+    assert np.allclose(result['fit_amplitude'], [1.1, 2.1])
+    assert np.allclose(result['fit_x'], 230) and np.allclose(result['fit_y'], -140)
+    assert np.allclose(result['fit_fwhm_major'], fwhm*300) and np.allclose(result['fit_fwhm_minor'], fwhm*200)
+    assert np.allclose(result['fit_angle'], 30)
+    # Moments of the sampled spot, away from the border
+    assert np.allclose(result['centroid_x'], 230, atol=1) and np.allclose(result['centroid_y'], -140, atol=1)
+    assert np.allclose(result['fwhm_major'], fwhm*300, rtol=0.01)
+    assert np.allclose(result['angle'], 30, atol=0.5)
+    # Peak at the grid point closest to the center of the spot
+    xs, ys, _ = grid_axes(scan_map)
+    assert np.allclose(result['peak_x'], xs[np.argmin(np.abs(xs - 230))])
+    assert np.allclose(result['peak_y'], ys[np.argmin(np.abs(ys + 140))])
+
+def test_best_focus_between_planes():
+    # Peak values of a parabola with its vertex a quarter plane above plane 2
+    z = np.arange(5) - 2.25
+    scan_map = spot_scan(3 - z**2/4)
+    result = focus_analysis.analyse(scan_map, 'O3A')
+    assert result['best_plane'] == 2
+    _, _, zs = grid_axes(scan_map)
+    assert np.allclose(result['best_focus'], [230, -140, zs[2] + 0.25*(zs[3] - zs[2])])
+    values = focus_analysis.as_dict(result, scan_map)
+    assert np.allclose(values['best_focus_absolute'], [1230, 1860, 3000 + 0.25*(zs[3] - zs[2])])
+    assert len(values['fit_fwhm_major']) == 5
+
+def test_failed_fit_uses_centroid():
+    # Flat planes have no spot to fit
+    scan_map = spot_scan([0.0, 1.0])
+    result = focus_analysis.analyse(scan_map, 'O3A')
+    assert not np.isfinite(result['fit_x'][0])
+    assert focus_analysis.as_dict(result)['fit_x'][0] is None
+    assert result['best_plane'] == 1
@@ -0,0 +1,30 @@
+import os
+import sys
+import numpy as np
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pixel_ring import pixel_ring
+
+def test_stalled_consumer_drops_without_blocking():
+    # Without a consumer only the first push on a full buffer waits
+    ring = pixel_ring(['O3A'], capacity=16, block_timeout=0.2)
+    start = timer()
+    accepted = [ring.push(0, 0, 0, idx, (0, 0, 0), (idx,)) for idx in range(1000)]
+    elapsed = timer() - start
+    assert sum(accepted) == 16
+    assert ring.dropped == 1000 - 16
+    assert elapsed < 0.2 + 0.3
+
+def test_push_resumes_after_drain():
+    ring = pixel_ring(['O3A'], capacity=4, block_timeout=0.05)
+    for idx in range(6):
+        ring.push(0, 0, 0, idx, (0, 0, 0), (idx,))
+    index, _, _, values = ring.drain()
+    assert list(values[:,0]) == [0, 1, 2, 3]
+    # Space again: the next pushes are stored and waiting is enabled again
+    assert ring.push(0, 0, 1, 0, (0, 0, 0), (7,))
+    assert not ring.stalled
+    row = np.zeros((3, 3)), np.ones((3, 1))
+    assert ring.push_row(0, 0, 2, *row)
+    assert len(ring) == 4
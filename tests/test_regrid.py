@@ -0,0 +1,73 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import regrid
+from mirror_scan import mirror_scan
+from scan_paths import grid_axes
+
+def measured_scan(center=(1000.0, 2000.0, 3000.0), Nz=2):
+    # Channels linear in the measured position: O1A = x + 2y, and a phase
+    # crossing +-180 deg along X
+    scan_map = mirror_scan(['X', 'Y', 'Z', 'O1A', 'O1P'], 'float64')
+    scan_map.sizeX, scan_map.sizeY, scan_map.sizeZ = 1000, 800, 200*Nz if Nz > 1 else 0
+    scan_map.step_sizeX = scan_map.step_sizeY = scan_map.step_sizeZ = 100
+    scan_map.recalc_size()
+    scan_map.center_point = None if center is None else list(center)
+    scan_map.create_array()
+    xs, ys, zs = grid_axes(scan_map)
+    rng = np.random.default_rng(2)
+    shape = (scan_map.Nz, scan_map.Ny, scan_map.Nx)
+    x = xs[None,None,:] + rng.uniform(-30, 30, shape)
+    y = ys[None,:,None] + rng.uniform(-30, 30, shape)
+    offset = (0, 0, 0) if center is None else center
+    scan_map.X[...] = offset[0] + x
+    scan_map.Y[...] = offset[1] + y
+    scan_map.Z[...] = offset[2] + zs[:,None,None]
+    scan_map.O1A[...] = x + 2*y
+    scan_map.O1P[...] = (180 + 0.05*x + 180) % 360 - 180
+    return scan_map, x, y
+
+def test_interp_rows():
+    xp = np.array([[0.0, 1.0, 2.0], [2.0, 0.0, 1.0]])
+    fp = np.array([[0.0, 10.0, 20.0], [200.0, 0.0, 100.0]])[...,None]
+    values, gap = regrid.interp_rows(xp, fp, np.array([-1.0, 0.25, 1.5, 3.0]))
+    # Rows are sorted first, outside the samples the edge value is kept
+    assert np.allclose(values[0,:,0], [0, 2.5, 15, 20])
+    assert np.allclose(values[1,:,0], [0, 25, 150, 200])
+    assert np.allclose(gap, [[1, 0.25, 0.5, 1]]*2)
+
+def test_linear_channels_on_the_grid():
+    scan_map, x, y = measured_scan()
+    result = regrid.regrid(scan_map)
+    xs, ys, zs = grid_axes(scan_map)
+    assert np.allclose(result.dX, x - xs[None,None,:])
+    assert np.allclose(result.dY, y - ys[None,:,None])
+    assert np.allclose(result.X[0,0], 1000 + xs)
+    assert np.allclose(result.Z[:,0,0], 3000 + zs)
+    # Linear values are reproduced inside the measured area
+    inside = (slice(None), slice(1, -1), slice(1, -1))
+    expected = xs[None,None,:] + 2*ys[None,:,None] + np.zeros(x.shape)
+    assert np.allclose(result.O1A[inside], expected[inside], atol=20)
+    assert np.max(result.gap[inside]) < 100
+    summary = regrid.summary(result)
+    assert summary['max_error'] <= 30*np.sqrt(2) and summary['rms_error'] > 0
+
+def test_phase_does_not_jump():
+    scan_map, x, y = measured_scan()
+    result = regrid.regrid(scan_map, ['O1P'])
+    xs, _, _ = grid_axes(scan_map)
+    expected = (0.05*xs + 360) % 360 - 180
+    difference = (result.O1P[:,1:-1] - expected[None,None,:] + 180) % 360 - 180
+    assert np.max(np.abs(difference)) < 2
+    assert result.channels == ['X', 'Y', 'Z', 'O1P', 'dX', 'dY', 'dZ', 'gap']
+
+def test_scan_without_center_point():
+    # .dat files: the positions are relative to their median offset
+    scan_map, x, y = measured_scan(center=None, Nz=1)
+    scan_map.X[...] += 5000
+    result = regrid.regrid(scan_map)
+    offsets = x - grid_axes(scan_map)[0]
+    assert np.allclose(result.dX, offsets - np.median(offsets))
+    assert np.allclose(result.X[0,0], grid_axes(scan_map)[0])
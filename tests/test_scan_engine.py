@@ -0,0 +1,72 @@
+import os
+import sys
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import nea_sim
+import scan_io
+from scan_engine import Worker
+from mirror_scan import mirror_scan
+from acquisition import acquisition_profile
+
+settings = dict(move_latency=0, settle_time=0, refresh_latency=0, readout_latency=0, velocity=1e7, seed=1)
+
+def simulated_worker(scan_map, save_name, path='Serpentine'):
+    worker = Worker()
+    worker.context, worker.nea, worker.motors = nea_sim.connect(settings)
+    worker.Vector3D = worker.nea.Geometry.Vector3D
+    worker.scan_map = scan_map
+    worker.scan_path = path
+    worker.save_name = save_name
+    worker.fly_velocity = 2e6
+    worker.profile = acquisition_profile(sampling_time=1)
+    worker.rows = []
+    worker.errors = []
+    worker.progress.connect(lambda idz, idy: worker.rows.append((idz, idy)))
+    worker.failed.connect(worker.errors.append)
+    return worker
+
+def new_map():
+    scan_map = mirror_scan()
+    scan_map.sizeX = scan_map.sizeY = 5000
+    scan_map.sizeZ = 2000
+    scan_map.step_sizeX = scan_map.step_sizeY = scan_map.step_sizeZ = 1000
+    scan_map.recalc_size()
+    scan_map.create_array()
+    return scan_map
+
+def interrupt(worker, mode, rows):
+    # Cancels the scan once the given number of rows is written
+    def row_done(idz, idy):
+        if len(worker.rows) == rows:
+            worker.cancel()
+    worker.progress.connect(row_done)
+    worker.run(mode)
+
+def resume_only_missing_rows(tmp_path, mode):
+    save_name = str(tmp_path / 'scan')
+    worker = simulated_worker(new_map(), save_name)
+    interrupt(worker, mode, 4)
+    scan_map, metadata, completed = scan_io.load_checkpoint(save_name)
+    assert len(worker.rows) == 4 and completed == set(worker.rows)
+    assert not metadata['complete']
+
+    resumed = simulated_worker(scan_map, save_name, metadata['scan']['path'])
+    resumed.resume = True
+    resumed.run(mode)
+    assert worker.errors == [] and resumed.errors == []
+    all_rows = {(idz, idy) for idz in range(scan_map.Nz) for idy in range(scan_map.Ny)}
+    assert sorted(resumed.rows) == sorted(all_rows - completed)
+    with open(scan_io.metadata_name(save_name)) as file:
+        metadata = yaml.safe_load(file)
+    assert metadata['complete'] and metadata['rows_completed'] == len(all_rows)
+    final = scan_io.load_scan(save_name)
+    assert np.all(final.O3A != 0)
+    assert not os.path.exists(save_name + '.rows')
+
+def test_step_scan_resumes_missing_rows(tmp_path):
+    resume_only_missing_rows(tmp_path, 'step')
+
+def test_fly_scan_resumes_missing_rows(tmp_path):
+    resume_only_missing_rows(tmp_path, 'fly')
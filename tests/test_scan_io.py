@@ -0,0 +1,166 @@
+import os
+import sys
+import shutil
+import numpy as np
+import pytest
+
+tests = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(tests))
+import scan_io
+from mirror_scan import mirror_scan
+
+def example_map(Nx=4, Ny=3, Nz=2, channels=scan_io.dat_channels):
+    # Scan of Nz planes with measured positions around the grid and distinct values
+    scan_map = mirror_scan(channels, 'float64')
+    scan_map.step_sizeX, scan_map.step_sizeY, scan_map.step_sizeZ = 100.0, 200.0, 300.0
+    scan_map.sizeX, scan_map.sizeY, scan_map.sizeZ = 100.0*Nx, 200.0*Ny, 300.0*Nz if Nz > 1 else 0.0
+    scan_map.recalc_size()
+    scan_map.center_point = [1000.0, 2000.0, 3000.0]
+    scan_map.create_array()
+    rng = np.random.default_rng(1)
+    zz, yy, xx = np.meshgrid(np.arange(Nz), np.arange(Ny), np.arange(Nx), indexing='ij')
+    scan_map.X[...] = 1000 + 100*xx + rng.normal(0, 5, xx.shape)
+    scan_map.Y[...] = 2000 + 200*yy + rng.normal(0, 5, xx.shape)
+    scan_map.Z[...] = 3000 + 300*zz + rng.normal(0, 5, xx.shape)
+    for n, channel in enumerate(scan_map.display_channels):
+        getattr(scan_map, channel)[...] = n + zz*100 + yy*10 + xx
+    return scan_map
+
+def write_dat(fname, scan_map, header=True):
+    scan_io.export_dat(fname, scan_map)
+    if not header:
+        with open(fname) as file:
+            lines = [line for line in file if not line.startswith('#')]
+        with open(fname, 'w') as file:
+            file.writelines(lines)
+
+def test_grid_of_headerless_dat(tmp_path):
+    # Nx, Ny, Nz are recovered from the positions
+    scan_map = example_map(Nx=5, Ny=3, Nz=4)
+    fname = str(tmp_path / 'scan.dat')
+    write_dat(fname, scan_map, header=False)
+    loaded = scan_io.load_dat(fname, cache=False)
+    assert (loaded.Nx, loaded.Ny, loaded.Nz) == (5, 3, 4)
+    assert (loaded.Nx, loaded.Ny, loaded.Nz) == (int(loaded.sizeX/loaded.step_sizeX),
+                                                 int(loaded.sizeY/loaded.step_sizeY),
+                                                 int(loaded.sizeZ/loaded.step_sizeZ))
+    for channel in scan_io.dat_channels:
+        assert np.allclose(getattr(loaded, channel), getattr(scan_map, channel))
+
+def test_grid_of_measured_dat(tmp_path):
+    fname = str(tmp_path / 'real_image.dat')
+    shutil.copy(os.path.join(tests, 'real_image.dat'), fname)
+    loaded = scan_io.load_dat(fname, cache=False)
+    assert (loaded.Nx, loaded.Ny, loaded.Nz) == (51, 51, 1)
+    data = np.loadtxt(fname)
+    assert np.array_equal(loaded.O3A.ravel(), data[:,5])
+
+def test_header_is_used(tmp_path):
+    scan_map = example_map(Nz=1)
+    fname = str(tmp_path / 'scan.dat')
+    write_dat(fname, scan_map)
+    loaded = scan_io.load_dat(fname, cache=False)
+    assert (loaded.sizeX, loaded.step_sizeY) == (scan_map.sizeX, scan_map.step_sizeY)
+    assert (loaded.Nx, loaded.Ny, loaded.Nz) == (4, 3, 1)
+
+def test_cache_is_used_and_invalidated(tmp_path):
+    scan_map = example_map()
+    fname = str(tmp_path / 'scan.dat')
+    write_dat(fname, scan_map, header=False)
+    first = scan_io.load_dat(fname)
+    assert os.path.exists(fname + '.npy') and os.path.exists(fname + '.yaml')
+    cached = scan_io.load_dat(fname)
+    assert isinstance(cached.O1A, np.memmap)
+    assert np.array_equal(cached.O1A, first.O1A)
+
+    # A changed file is parsed again and the cache is rewritten
+    scan_map.O1A[...] += 1000
+    del cached
+    write_dat(fname, scan_map, header=False)
+    status = os.stat(fname)
+    os.utime(fname, (status.st_atime, status.st_mtime + 10))
+    changed = scan_io.load_dat(fname)
+    assert not isinstance(changed.O1A, np.memmap)
+    assert np.allclose(changed.O1A, scan_map.O1A)
+    assert np.allclose(scan_io.load_dat(fname).O1A, scan_map.O1A)
+
+def test_undetectable_grid(tmp_path):
+    fname = str(tmp_path / 'scan.dat')
+    data = np.column_stack([[0, 100, 200, 0, 100], np.zeros((5, 6))])
+    np.savetxt(fname, data)
+    with pytest.raises(ValueError, match='scan size'):
+        scan_io.load_dat(fname, cache=False)
+
+def test_rows_are_streamed_to_the_file(tmp_path):
+    scan_map = example_map()
+    fname = str(tmp_path / 'scan')
+    writer = scan_io.scan_writer(fname, scan_map)
+    writer.write_row(1, 2)
+    # The row is in the file before the scan is closed
+    data = np.load(fname + '.npy', mmap_mode='r')
+    assert np.array_equal(data['O2A'][1,2], scan_map.O2A[1,2])
+    assert np.all(data['O2A'][0] == 0)
+    assert scan_io.load_checkpoint(fname)[1]['rows_completed'] == 1
+    for idz in range(scan_map.Nz):
+        for idy in range(scan_map.Ny):
+            if (idz, idy) != (1, 2):
+                writer.write_row(idz, idy)
+    writer.close()
+    loaded = scan_io.load_scan(fname + '.yaml')
+    for channel in scan_map.channels:
+        assert np.array_equal(getattr(loaded, channel), getattr(scan_map, channel))
+    assert loaded.center_point == scan_map.center_point
+    assert (loaded.Nx, loaded.Ny, loaded.Nz, loaded.step_sizeZ) == (4, 3, 2, 300.0)
+    with pytest.raises(ValueError, match='complete'):
+        scan_io.load_checkpoint(fname)
+
+def test_save_and_remove_scan(tmp_path):
+    scan_map = example_map(channels=['X', 'Y', 'Z', 'O3A', 'O3P'])
+    fname = str(tmp_path / '2026.10.18-08.16_2D_Mirror_scan_400.0x600.0_100.0um')
+    scan_io.save_scan(fname + '.npy', scan_map, {'focus': {'best_plane': 1}})
+    assert scan_io.stem(fname + '.yaml') == fname
+    loaded = scan_io.load_scan(fname + '.npy', mmap=True)
+    assert loaded.channels == ['X', 'Y', 'Z', 'O3A', 'O3P']
+    assert np.array_equal(loaded.O3P, scan_map.O3P)
+    del loaded
+    scan_io.remove_scan(fname + '.yaml')
+    assert os.listdir(tmp_path) == []
+
+def interrupted_scan(fname, rows):
+    # Checkpoint of a scan that stopped after the given rows, while writing
+    # the journal line of the next one
+    scan_map = example_map()
+    writer = scan_io.scan_writer(fname, scan_map)
+    for idz, idy in rows:
+        writer.write_row(idz, idy)
+    writer.journal.write('1')
+    writer.journal.close()
+    return scan_map
+
+def test_checkpoint_of_truncated_journal(tmp_path):
+    fname = str(tmp_path / 'scan')
+    scan_map = interrupted_scan(fname, [(0, 0), (0, 1), (0, 2), (1, 0)])
+    loaded, metadata, completed = scan_io.load_checkpoint(fname + '.npy')
+    # The cut off line is not a completed row
+    assert completed == {(0, 0), (0, 1), (0, 2), (1, 0)}
+    assert metadata['rows_completed'] == 4 and not metadata['complete']
+    assert np.array_equal(loaded.O4A[0], scan_map.O4A[0])
+    assert np.all(loaded.O4A[1,1:] == 0)
+
+    # The resumed writer continues the same file with the missing rows
+    writer = scan_io.scan_writer(fname, loaded, resume=True)
+    assert writer.completed == completed
+    for idz, idy in [(1, 1), (1, 2)]:
+        loaded.O4A[idz,idy] = scan_map.O4A[idz,idy]
+        writer.write_row(idz, idy)
+    writer.close()
+    assert writer.metadata['complete'] and len(writer.metadata['resumed']) == 1
+    assert not os.path.exists(fname + '.rows')
+    assert np.array_equal(scan_io.load_scan(fname).O4A, scan_map.O4A)
+
+def test_checkpoint_without_journal(tmp_path):
+    fname = str(tmp_path / 'scan')
+    interrupted_scan(fname, [(0, 0)])
+    os.remove(fname + '.rows')
+    with pytest.raises(ValueError, match='no row journal'):
+        scan_io.load_checkpoint(fname)
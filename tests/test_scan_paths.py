@@ -0,0 +1,56 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan_paths import scan_paths, plan, planned_travel, row_path, grid_axes
+from mirror_scan import mirror_scan
+
+xs = np.arange(5)*100.0
+ys = np.arange(4)*100.0
+zs = np.arange(3)*100.0
+
+def test_every_planner_visits_every_index_once():
+    for name in scan_paths:
+        path = plan(name, xs, ys, zs, (150, 120, 0))
+        indices = [(idz, idy, idx) for idz, idy, idx, _ in path]
+        assert len(indices) == len(xs)*len(ys)*len(zs), name
+        assert set(indices) == {(idz, idy, idx) for idz in range(3) for idy in range(4) for idx in range(5)}, name
+        for idz, idy, idx, target in path:
+            assert tuple(target) == (xs[idx], ys[idy], zs[idz]), name
+
+def test_serpentine_travel():
+    # Rows of 400 nm, 3 row changes and 2 plane changes of 100 nm each, the
+    # Z-serpentine starts the next plane where the last one ended
+    assert planned_travel(plan('Serpentine', xs, ys, zs)) > planned_travel(plan('Z-serpentine', xs, ys, zs))
+    assert np.isclose(planned_travel(plan('Z-serpentine', xs, ys, zs)), 3*(4*400 + 3*100) + 2*100)
+    assert planned_travel(plan('Raster', xs, ys, zs)) > planned_travel(plan('Serpentine', xs, ys, zs))
+
+def test_planned_travel_from_start():
+    path = [(0, 0, 0, (0, 0, 0)), (0, 0, 1, (300, 400, 0))]
+    assert planned_travel(path) == 500
+    assert planned_travel(path, start=(0, 0, 0)) == 500
+    assert planned_travel(path, start=(0, -400, 0, 1)) == 900
+    assert planned_travel(path[:1]) == 0
+
+def test_spiral_starts_next_to_position():
+    path = plan('Spiral', xs, ys, zs[:1], (310, 190))
+    assert path[0][1:3] == (2, 3)
+
+def test_row_path_matches_planners():
+    # Row order and direction of the fly scan follow the step scan planners
+    for name in ('Raster', 'Serpentine', 'Z-serpentine'):
+        path = plan(name, xs, ys, zs)
+        rows = [(idz, idy, path[n+1][2] > idx) for n, (idz, idy, idx, _) in enumerate(path[:-1])
+                if n % len(xs) == 0]
+        assert row_path(name, len(ys), len(zs)) == rows, name
+
+def test_grid_axes_span_the_scan():
+    scan_map = mirror_scan()
+    scan_map.sizeX, scan_map.sizeY, scan_map.sizeZ = 2000, 1000, 0
+    scan_map.step_sizeX = scan_map.step_sizeY = scan_map.step_sizeZ = 200
+    scan_map.recalc_size()
+    x, y, z = grid_axes(scan_map, (10, 20, 30))
+    assert len(x) == 10 and len(y) == 5
+    assert x[0] == -990 and x[-1] == 1010
+    assert list(z) == [30]
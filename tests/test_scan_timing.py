@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scan_timing
+from scan_timing import scan_timer, step_phases, fly_phases, format_summary
+
+class clock:
+    # Replaces the timer of scan_timing, advanced by the test
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def step_path(Nz=2, Ny=3, Nx=4):
+    return [(idz, idy, idx) for idz in range(Nz) for idy in range(Ny) for idx in range(Nx)]
+
+def run_steps(timing, time, steps, durations):
+    # durations: {phase: s} of every step
+    for _ in range(steps):
+        for phase, duration in durations.items():
+            time.now += duration
+            timing.mark(phase)
+        timing.end_step()
+
+def test_kinds_of_steps():
+    timing = scan_timer(step_phases, step_path())
+    assert list(timing.kinds[:6]) == [2, 0, 0, 0, 1, 0]
+    assert list(timing.kinds[12:14]) == [2, 0]
+    # Remaining steps of every kind from the first step on
+    assert list(timing.remaining[:,0]) == [18, 4, 2]
+
+def test_phases_and_eta(monkeypatch):
+    time = clock()
+    monkeypatch.setattr(scan_timing, 'timer', time)
+    timing = scan_timer(step_phases, step_path(), alpha=0.5)
+    assert timing.eta() is None and timing.pixel_rate() is None
+    run_steps(timing, time, 2, {'readout': 0.02, 'move': 0.08})
+    # Pixel steps are known, the others fall back to them
+    assert np.isclose(timing.pixel_rate(), 10)
+    assert np.isclose(timing.eta(), 22*0.1)
+    run_steps(timing, time, 3, {'readout': 0.02, 'move': 0.38})
+    # A new row with a slow first step, the EWMA follows the later steps
+    assert np.isclose(timing.ewma[1], 0.4)
+    assert np.isclose(timing.ewma[0], 0.1 + 0.5*0.3 + 0.25*0.3)
+    summary = timing.summary()
+    assert summary['steps'] == 5 and summary['total_steps'] == 24
+    assert np.isclose(summary['elapsed'], 1.4)
+    assert np.isclose(summary['phases']['readout']['total'], 0.1)
+    assert np.isclose(summary['phases']['move']['share'], 1.3/1.4)
+    assert np.isclose(summary['phases']['move']['max'], 0.38)
+    assert summary['phases']['settle']['total'] == 0
+    assert '5/24 steps' in format_summary(summary)
+
+def test_export(tmp_path, monkeypatch):
+    time = clock()
+    monkeypatch.setattr(scan_timing, 'timer', time)
+    rows = [(0, idy) for idy in range(3)]
+    timing = scan_timer(fly_phases, rows, pixels_per_step=10)
+    run_steps(timing, time, 2, {'move_to_row': 0.5, 'fly': 1.0, 'write': 0.01})
+    stem = str(tmp_path / 'scan')
+    timing.export(stem, {'settle': {'moves': 0}})
+    table = np.loadtxt(stem + '.timing.csv', delimiter=',', skiprows=1)
+    with open(stem + '.timing.csv') as file:
+        assert file.readline().strip() == ','.join(['idz', 'idy', 'end', 'total'] + fly_phases)
+    assert table.shape == (2, 4 + len(fly_phases))
+    assert np.allclose(table[:,3], 1.51)
+    with open(stem + '.timing.json') as file:
+        values = json.load(file)
+    assert values['settle'] == {'moves': 0}
+    assert np.allclose(values['rows'], [[0, 0, 1, 1.51], [0, 1, 1, 1.51]])
+    assert np.isclose(values['pixel_rate'], 10/1.51)
+    assert sum(values['step_histogram']) == 2
@@ -0,0 +1,70 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sparse_scan
+from mirror_scan import mirror_scan, sparse_channels
+from scan_paths import grid_axes
+
+def test_sample_mask():
+    mask = sparse_scan.sample_mask(2, 5, 20, 0.25, seed=3)
+    assert mask.shape == (2, 5, 20)
+    # Five samples per row, one in each fifth of the row
+    assert np.all(mask.sum(axis=2) == 5)
+    for segment in range(5):
+        assert np.all(mask[..., 4*segment:4*segment+4].sum(axis=2) == 1)
+    assert np.array_equal(mask, sparse_scan.sample_mask(2, 5, 20, 0.25, seed=3))
+    assert not np.array_equal(mask, sparse_scan.sample_mask(2, 5, 20, 0.25, seed=4))
+    assert np.all(sparse_scan.sample_mask(1, 3, 20, 0.001).sum(axis=2) == 1)
+    assert np.all(sparse_scan.sample_mask(1, 3, 20, 1))
+
+def sparse_map(fraction=0.3):
+    # Smooth amplitude and a phase crossing +-180 deg, measured on a sparse mask
+    scan_map = mirror_scan(['X', 'Y', 'Z', 'O3A', 'O3P'] + sparse_channels, 'float64')
+    scan_map.sizeX = scan_map.sizeY = 3000
+    scan_map.sizeZ = 0
+    scan_map.step_sizeX = scan_map.step_sizeY = scan_map.step_sizeZ = 100
+    scan_map.recalc_size()
+    scan_map.center_point = [500.0, 600.0, 700.0]
+    scan_map.create_array()
+    xs, ys, zs = grid_axes(scan_map)
+    X, Y = np.meshgrid(xs, ys)
+    amplitude = 1 + np.exp(-(X**2 + Y**2)/(2*1000**2))
+    phase = (180 + 0.02*X + 0.01*Y + 180) % 360 - 180
+    mask = sparse_scan.sample_mask(scan_map.Nz, scan_map.Ny, scan_map.Nx, fraction)
+    sparse_scan.clear_unmeasured(scan_map, mask)
+    scan_map.O3A[mask] = np.broadcast_to(amplitude, mask.shape)[mask]
+    scan_map.O3P[mask] = np.broadcast_to(phase, mask.shape)[mask]
+    scan_map.X[mask] = (500 + X[None] + 7)[mask]
+    return scan_map, mask, amplitude, phase
+
+def test_unmeasured_pixels_are_cleared():
+    scan_map, mask, _, _ = sparse_map()
+    assert np.all(np.isnan(scan_map.O3A[~mask]))
+    assert np.all(scan_map.confidence[mask] == 1)
+
+def test_reconstruction():
+    scan_map, mask, amplitude, phase = sparse_map()
+    measured = scan_map.O3A[mask].copy()
+    sparse_scan.reconstruct(scan_map, mask)
+    # Measured pixels keep their values and positions
+    assert np.array_equal(scan_map.O3A[mask], measured)
+    assert np.allclose(scan_map.X[mask], np.broadcast_to(507 + grid_axes(scan_map)[0], mask.shape)[mask])
+    assert np.array_equal(sparse_scan.measured(scan_map), mask)
+    xs, ys, _ = grid_axes(scan_map, scan_map.center_point)
+    assert np.allclose(scan_map.X[~mask], np.broadcast_to(xs, mask.shape)[~mask])
+    assert np.allclose(scan_map.Y[~mask], np.broadcast_to(ys[:,None], mask.shape)[~mask])
+    assert np.all(np.isfinite(scan_map.O3A))
+    # Within a few percent of the spot height of 1
+    error = scan_map.O3A[0] - amplitude
+    assert np.sqrt(np.mean(error**2)) < 0.025 and np.max(np.abs(error)) < 0.1
+    # Phases change by 2 deg per pixel and do not jump at +-180 deg
+    difference = (scan_map.O3P[0] - phase + 180) % 360 - 180
+    assert np.max(np.abs(difference)) < 6
+    confidence = scan_map.confidence[~mask]
+    assert np.all((confidence > 0) & (confidence < 1))
+
+def test_full_scan_has_no_samples_mask():
+    scan_map = mirror_scan(['X', 'Y', 'Z', 'O3A'])
+    assert sparse_scan.measured(scan_map) is None
@@ -0,0 +1,687 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+## Form generated from reading UI file 'mirrorApp.ui'
+##
+## Created by: Qt User Interface Compiler version 6.6.0
+##
+## WARNING! All changes made in this file will be lost when recompiling UI file!
+################################################################################
+
+from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
+    QMetaObject, QObject, QPoint, QRect,
+    QSize, QTime, QUrl, Qt)
+from PySide6.QtGui import (QAction, QBrush, QColor, QConicalGradient,
+    QCursor, QFont, QFontDatabase, QGradient,
+    QIcon, QImage, QKeySequence, QLinearGradient,
+    QPainter, QPalette, QPixmap, QRadialGradient,
+    QTransform)
+from PySide6.QtWidgets import (QApplication, QCheckBox, QComboBox, QDoubleSpinBox,
+    QGridLayout, QHBoxLayout, QLabel, QLayout,
+    QMainWindow, QPushButton, QSizePolicy, QSpacerItem,
+    QSpinBox, QStatusBar, QVBoxLayout, QWidget)
+
+from pyqtgraph import PlotWidget
+
+class Ui_MainWindow(object):
+    def setupUi(self, MainWindow):
+        if not MainWindow.objectName():
+            MainWindow.setObjectName(u"MainWindow")
+        MainWindow.resize(835, 671)
+        self.connectsnom = QAction(MainWindow)
+        self.connectsnom.setObjectName(u"connectsnom")
+        self.disconnectsnom = QAction(MainWindow)
+        self.disconnectsnom.setObjectName(u"disconnectsnom")
+        self.main_layout = QWidget(MainWindow)
+        self.main_layout.setObjectName(u"main_layout")
+        self.horizontalLayout = QHBoxLayout(self.main_layout)
+        self.horizontalLayout.setObjectName(u"horizontalLayout")
+        self.horizontalLayout.setSizeConstraint(QLayout.SetDefaultConstraint)
+        self.plot_area = PlotWidget(self.main_layout)
+        self.plot_area.setObjectName(u"plot_area")
+        self.plot_area.setMinimumSize(QSize(550, 0))
+
+        self.horizontalLayout.addWidget(self.plot_area)
+
+        self.menu_layout = QVBoxLayout()
+        self.menu_layout.setObjectName(u"menu_layout")
+        self.menu_layout.setSizeConstraint(QLayout.SetFixedSize)
+        self.menu_layout.setContentsMargins(10, -1, 10, -1)
+        self.horizontalLayout_2 = QHBoxLayout()
+        self.horizontalLayout_2.setObjectName(u"horizontalLayout_2")
+        self.display_label = QLabel(self.main_layout)
+        self.display_label.setObjectName(u"display_label")
+        font = QFont()
+        font.setPointSize(16)
+        self.display_label.setFont(font)
+
+        self.horizontalLayout_2.addWidget(self.display_label)
+
+
+        self.menu_layout.addLayout(self.horizontalLayout_2)
+
+        self.choose_file_button = QPushButton(self.main_layout)
+        self.choose_file_button.setObjectName(u"choose_file_button")
+        self.choose_file_button.setMinimumSize(QSize(130, 30))
+        self.choose_file_button.setMaximumSize(QSize(9999999, 16777215))
+        font1 = QFont()
+        font1.setPointSize(10)
+        self.choose_file_button.setFont(font1)
+
+        self.menu_layout.addWidget(self.choose_file_button)
+
+        self.verticalSpacer_3 = QSpacerItem(20, 10, QSizePolicy.Minimum, QSizePolicy.Fixed)
+
+        self.menu_layout.addItem(self.verticalSpacer_3)
+
+        self.horizontalLayout_5 = QHBoxLayout()
+        self.horizontalLayout_5.setObjectName(u"horizontalLayout_5")
+        self.datascrolling_label = QLabel(self.main_layout)
+        self.datascrolling_label.setObjectName(u"datascrolling_label")
+        self.datascrolling_label.setFont(font1)
+
+        self.horizontalLayout_5.addWidget(self.datascrolling_label)
+
+        self.datascroll_spinBox = QSpinBox(self.main_layout)
+        self.datascroll_spinBox.setObjectName(u"datascroll_spinBox")
+        sizePolicy = QSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.datascroll_spinBox.sizePolicy().hasHeightForWidth())
+        self.datascroll_spinBox.setSizePolicy(sizePolicy)
+        self.datascroll_spinBox.setMinimumSize(QSize(50, 0))
+        self.datascroll_spinBox.setMaximumSize(QSize(80, 16777215))
+        self.datascroll_spinBox.setFrame(False)
+
+        self.horizontalLayout_5.addWidget(self.datascroll_spinBox)
+
+        self.horizontalSpacer_3 = QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum)
+
+        self.horizontalLayout_5.addItem(self.horizontalSpacer_3)
+
+        self.choose_channel_label = QLabel(self.main_layout)
+        self.choose_channel_label.setObjectName(u"choose_channel_label")
+        self.choose_channel_label.setFont(font1)
+
+        self.horizontalLayout_5.addWidget(self.choose_channel_label)
+
+        self.channel_comboBox = QComboBox(self.main_layout)
+        self.channel_comboBox.setObjectName(u"channel_comboBox")
+        self.channel_comboBox.setMinimumSize(QSize(50, 0))
+        self.channel_comboBox.setMaximumSize(QSize(80, 16777215))
+
+        self.horizontalLayout_5.addWidget(self.channel_comboBox)
+
+
+        self.menu_layout.addLayout(self.horizontalLayout_5)
+
+        self.focusAnalysis_layout = QHBoxLayout()
+        self.focusAnalysis_layout.setObjectName(u"focusAnalysis_layout")
+        self.focus_checkBox = QCheckBox(self.main_layout)
+        self.focus_checkBox.setObjectName(u"focus_checkBox")
+
+        self.focusAnalysis_layout.addWidget(self.focus_checkBox)
+
+        self.focus_label = QLabel(self.main_layout)
+        self.focus_label.setObjectName(u"focus_label")
+
+        self.focusAnalysis_layout.addWidget(self.focus_label)
+
+
+        self.menu_layout.addLayout(self.focusAnalysis_layout)
+
+        self.regrid_layout = QHBoxLayout()
+        self.regrid_layout.setObjectName(u"regrid_layout")
+        self.regrid_checkBox = QCheckBox(self.main_layout)
+        self.regrid_checkBox.setObjectName(u"regrid_checkBox")
+
+        self.regrid_layout.addWidget(self.regrid_checkBox)
+
+        self.regrid_label = QLabel(self.main_layout)
+        self.regrid_label.setObjectName(u"regrid_label")
+
+        self.regrid_layout.addWidget(self.regrid_label)
+
+
+        self.menu_layout.addLayout(self.regrid_layout)
+
+        self.sparseSamples_layout = QHBoxLayout()
+        self.sparseSamples_layout.setObjectName(u"sparseSamples_layout")
+        self.sparseSamples_checkBox = QCheckBox(self.main_layout)
+        self.sparseSamples_checkBox.setObjectName(u"sparseSamples_checkBox")
+
+        self.sparseSamples_layout.addWidget(self.sparseSamples_checkBox)
+
+        self.sparseSamples_label = QLabel(self.main_layout)
+        self.sparseSamples_label.setObjectName(u"sparseSamples_label")
+
+        self.sparseSamples_layout.addWidget(self.sparseSamples_label)
+
+
+        self.menu_layout.addLayout(self.sparseSamples_layout)
+
+        self.colourScale_layout = QHBoxLayout()
+        self.colourScale_layout.setObjectName(u"colourScale_layout")
+        self.colourScale_label = QLabel(self.main_layout)
+        self.colourScale_label.setObjectName(u"colourScale_label")
+        self.colourScale_label.setFont(font1)
+
+        self.colourScale_layout.addWidget(self.colourScale_label)
+
+        self.colourScale_comboBox = QComboBox(self.main_layout)
+        self.colourScale_comboBox.setObjectName(u"colourScale_comboBox")
+        self.colourScale_comboBox.setMaximumSize(QSize(110, 16777215))
+
+        self.colourScale_layout.addWidget(self.colourScale_comboBox)
+
+        self.colourScale_spacer = QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum)
+
+        self.colourScale_layout.addItem(self.colourScale_spacer)
+
+
+        self.menu_layout.addLayout(self.colourScale_layout)
+
+        self.verticalSpacer = QSpacerItem(20, 10, QSizePolicy.Minimum, QSizePolicy.Fixed)
+
+        self.menu_layout.addItem(self.verticalSpacer)
+
+        self.horizontalLayout_6 = QHBoxLayout()
+        self.horizontalLayout_6.setObjectName(u"horizontalLayout_6")
+        self.mapping_label = QLabel(self.main_layout)
+        self.mapping_label.setObjectName(u"mapping_label")
+        font2 = QFont()
+        font2.setPointSize(16)
+        font2.setUnderline(False)
+        self.mapping_label.setFont(font2)
+
+        self.horizontalLayout_6.addWidget(self.mapping_label)
+
+        self.connect_snom_button = QPushButton(self.main_layout)
+        self.connect_snom_button.setObjectName(u"connect_snom_button")
+        self.connect_snom_button.setMinimumSize(QSize(140, 30))
+        self.connect_snom_button.setMaximumSize(QSize(130, 16777215))
+        self.connect_snom_button.setFont(font1)
+
+        self.horizontalLayout_6.addWidget(self.connect_snom_button)
+
+
+        self.menu_layout.addLayout(self.horizontalLayout_6)
+
+        self.verticalSpacer_6 = QSpacerItem(20, 10, QSizePolicy.Minimum, QSizePolicy.Fixed)
+
+        self.menu_layout.addItem(self.verticalSpacer_6)
+
+        self.label_ScanSize = QLabel(self.main_layout)
+        self.label_ScanSize.setObjectName(u"label_ScanSize")
+        font3 = QFont()
+        font3.setPointSize(12)
+        self.label_ScanSize.setFont(font3)
+
+        self.menu_layout.addWidget(self.label_ScanSize)
+
+        self.scanSize_layout = QGridLayout()
+        self.scanSize_layout.setObjectName(u"scanSize_layout")
+        self.sizeX_spinBox = QDoubleSpinBox(self.main_layout)
+        self.sizeX_spinBox.setObjectName(u"sizeX_spinBox")
+        self.sizeX_spinBox.setMinimumSize(QSize(80, 30))
+        self.sizeX_spinBox.setFrame(False)
+        self.sizeX_spinBox.setDecimals(2)
+        self.sizeX_spinBox.setMaximum(1000.000000000000000)
+        self.sizeX_spinBox.setSingleStep(0.500000000000000)
+        self.sizeX_spinBox.setValue(31.000000000000000)
+
+        self.scanSize_layout.addWidget(self.sizeX_spinBox, 1, 1, 1, 1)
+
+        self.label_sizeX = QLabel(self.main_layout)
+        self.label_sizeX.setObjectName(u"label_sizeX")
+        self.label_sizeX.setFont(font1)
+
+        self.scanSize_layout.addWidget(self.label_sizeX, 1, 0, 1, 1)
+
+        self.sizeZ_spinBox = QDoubleSpinBox(self.main_layout)
+        self.sizeZ_spinBox.setObjectName(u"sizeZ_spinBox")
+        self.sizeZ_spinBox.setMinimumSize(QSize(0, 30))
+        self.sizeZ_spinBox.setFrame(False)
+        self.sizeZ_spinBox.setDecimals(0)
+        self.sizeZ_spinBox.setMaximum(3000.000000000000000)
+
+        self.scanSize_layout.addWidget(self.sizeZ_spinBox, 2, 1, 1, 1)
+
+        self.sizeY_spinBox = QDoubleSpinBox(self.main_layout)
+        self.sizeY_spinBox.setObjectName(u"sizeY_spinBox")
+        self.sizeY_spinBox.setMinimumSize(QSize(80, 30))
+        self.sizeY_spinBox.setFrame(False)
+        self.sizeY_spinBox.setDecimals(2)
+        self.sizeY_spinBox.setMaximum(1000.000000000000000)
+        self.sizeY_spinBox.setSingleStep(0.500000000000000)
+        self.sizeY_spinBox.setValue(31.000000000000000)
+
+        self.scanSize_layout.addWidget(self.sizeY_spinBox, 1, 4, 1, 1)
+
+        self.label_sizeZ = QLabel(self.main_layout)
+        self.label_sizeZ.setObjectName(u"label_sizeZ")
+        self.label_sizeZ.setFont(font1)
+
+        self.scanSize_layout.addWidget(self.label_sizeZ, 2, 0, 1, 1)
+
+        self.label_sizeX_2 = QLabel(self.main_layout)
+        self.label_sizeX_2.setObjectName(u"label_sizeX_2")
+        self.label_sizeX_2.setFont(font1)
+
+        self.scanSize_layout.addWidget(self.label_sizeX_2, 1, 3, 1, 1)
+
+        self.linkSizeButton = QPushButton(self.main_layout)
+        self.linkSizeButton.setObjectName(u"linkSizeButton")
+        sizePolicy1 = QSizePolicy(QSizePolicy.Minimum, QSizePolicy.Minimum)
+        sizePolicy1.setHorizontalStretch(0)
+        sizePolicy1.setVerticalStretch(0)
+        sizePolicy1.setHeightForWidth(self.linkSizeButton.sizePolicy().hasHeightForWidth())
+        self.linkSizeButton.setSizePolicy(sizePolicy1)
+        self.linkSizeButton.setMinimumSize(QSize(40, 30))
+        self.linkSizeButton.setMaximumSize(QSize(40, 40))
+
+        self.scanSize_layout.addWidget(self.linkSizeButton, 1, 2, 1, 1)
+
+
+        self.menu_layout.addLayout(self.scanSize_layout)
+
+        self.verticalSpacer_7 = QSpacerItem(10, 10, QSizePolicy.Minimum, QSizePolicy.Fixed)
+
+        self.menu_layout.addItem(self.verticalSpacer_7)
+
+        self.label_6 = QLabel(self.main_layout)
+        self.label_6.setObjectName(u"label_6")
+        self.label_6.setFont(font3)
+
+        self.menu_layout.addWidget(self.label_6)
+
+        self.stepSize_layout = QGridLayout()
+        self.stepSize_layout.setObjectName(u"stepSize_layout")
+        self.stepZ_label = QLabel(self.main_layout)
+        self.stepZ_label.setObjectName(u"stepZ_label")
+        self.stepZ_label.setFont(font1)
+
+        self.stepSize_layout.addWidget(self.stepZ_label, 3, 0, 1, 1)
+
+        self.stepX_spinBox = QDoubleSpinBox(self.main_layout)
+        self.stepX_spinBox.setObjectName(u"stepX_spinBox")
+        sizePolicy2 = QSizePolicy(QSizePolicy.Minimum, QSizePolicy.Fixed)
+        sizePolicy2.setHorizontalStretch(0)
+        sizePolicy2.setVerticalStretch(0)
+        sizePolicy2.setHeightForWidth(self.stepX_spinBox.sizePolicy().hasHeightForWidth())
+        self.stepX_spinBox.setSizePolicy(sizePolicy2)
+        self.stepX_spinBox.setMinimumSize(QSize(80, 30))
+        self.stepX_spinBox.setFrame(False)
+        self.stepX_spinBox.setDecimals(2)
+        self.stepX_spinBox.setMinimum(0.500000000000000)
+        self.stepX_spinBox.setMaximum(50.000000000000000)
+        self.stepX_spinBox.setSingleStep(0.500000000000000)
+        self.stepX_spinBox.setValue(1.000000000000000)
+
+        self.stepSize_layout.addWidget(self.stepX_spinBox, 1, 1, 1, 1)
+
+        self.stepX_label = QLabel(self.main_layout)
+        self.stepX_label.setObjectName(u"stepX_label")
+        sizePolicy3 = QSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
+        sizePolicy3.setHorizontalStretch(0)
+        sizePolicy3.setVerticalStretch(0)
+        sizePolicy3.setHeightForWidth(self.stepX_label.sizePolicy().hasHeightForWidth())
+        self.stepX_label.setSizePolicy(sizePolicy3)
+        self.stepX_label.setFont(font1)
+
+        self.stepSize_layout.addWidget(self.stepX_label, 1, 0, 1, 1)
+
+        self.stepY_spinBox = QDoubleSpinBox(self.main_layout)
+        self.stepY_spinBox.setObjectName(u"stepY_spinBox")
+        self.stepY_spinBox.setMinimumSize(QSize(80, 30))
+        self.stepY_spinBox.setFrame(False)
+        self.stepY_spinBox.setDecimals(2)
+        self.stepY_spinBox.setMinimum(0.500000000000000)
+        self.stepY_spinBox.setMaximum(50.000000000000000)
+        self.stepY_spinBox.setSingleStep(0.500000000000000)
+        self.stepY_spinBox.setValue(1.000000000000000)
+
+        self.stepSize_layout.addWidget(self.stepY_spinBox, 1, 4, 1, 1)
+
+        self.stepY_label = QLabel(self.main_layout)
+        self.stepY_label.setObjectName(u"stepY_label")
+        self.stepY_label.setFont(font1)
+
+        self.stepSize_layout.addWidget(self.stepY_label, 1, 3, 1, 1)
+
+        self.stepZ_spinBox = QDoubleSpinBox(self.main_layout)
+        self.stepZ_spinBox.setObjectName(u"stepZ_spinBox")
+        self.stepZ_spinBox.setMinimumSize(QSize(0, 30))
+        self.stepZ_spinBox.setFrame(False)
+        self.stepZ_spinBox.setDecimals(2)
+        self.stepZ_spinBox.setMinimum(0.500000000000000)
+        self.stepZ_spinBox.setMaximum(100.000000000000000)
+        self.stepZ_spinBox.setSingleStep(0.500000000000000)
+        self.stepZ_spinBox.setValue(10.000000000000000)
+
+        self.stepSize_layout.addWidget(self.stepZ_spinBox, 3, 1, 1, 1)
+
+        self.linkStepSizeButton = QPushButton(self.main_layout)
+        self.linkStepSizeButton.setObjectName(u"linkStepSizeButton")
+        sizePolicy1.setHeightForWidth(self.linkStepSizeButton.sizePolicy().hasHeightForWidth())
+        self.linkStepSizeButton.setSizePolicy(sizePolicy1)
+        self.linkStepSizeButton.setMinimumSize(QSize(40, 30))
+        self.linkStepSizeButton.setMaximumSize(QSize(40, 40))
+        font4 = QFont()
+        font4.setPointSize(11)
+        self.linkStepSizeButton.setFont(font4)
+        self.linkStepSizeButton.setToolTipDuration(0)
+
+        self.stepSize_layout.addWidget(self.linkStepSizeButton, 1, 2, 1, 1)
+
+
+        self.menu_layout.addLayout(self.stepSize_layout)
+
+        self.label_acquisition = QLabel(self.main_layout)
+        self.label_acquisition.setObjectName(u"label_acquisition")
+        self.label_acquisition.setFont(font3)
+
+        self.menu_layout.addWidget(self.label_acquisition)
+
+        self.acquisition_layout = QGridLayout()
+        self.acquisition_layout.setObjectName(u"acquisition_layout")
+        self.samplingTime_label = QLabel(self.main_layout)
+        self.samplingTime_label.setObjectName(u"samplingTime_label")
+
+        self.acquisition_layout.addWidget(self.samplingTime_label, 0, 0, 1, 1)
+
+        self.samplingTime_spinBox = QSpinBox(self.main_layout)
+        self.samplingTime_spinBox.setObjectName(u"samplingTime_spinBox")
+        self.samplingTime_spinBox.setMinimumSize(QSize(0, 30))
+        self.samplingTime_spinBox.setFrame(False)
+        self.samplingTime_spinBox.setMinimum(1)
+        self.samplingTime_spinBox.setMaximum(10000)
+        self.samplingTime_spinBox.setSingleStep(10)
+        self.samplingTime_spinBox.setValue(50)
+
+        self.acquisition_layout.addWidget(self.samplingTime_spinBox, 0, 1, 1, 1)
+
+        self.samples_label = QLabel(self.main_layout)
+        self.samples_label.setObjectName(u"samples_label")
+
+        self.acquisition_layout.addWidget(self.samples_label, 1, 0, 1, 1)
+
+        self.samples_spinBox = QSpinBox(self.main_layout)
+        self.samples_spinBox.setObjectName(u"samples_spinBox")
+        self.samples_spinBox.setMinimumSize(QSize(0, 30))
+        self.samples_spinBox.setFrame(False)
+        self.samples_spinBox.setMinimum(1)
+        self.samples_spinBox.setMaximum(1000)
+        self.samples_spinBox.setSingleStep(1)
+        self.samples_spinBox.setValue(1)
+
+        self.acquisition_layout.addWidget(self.samples_spinBox, 1, 1, 1, 1)
+
+        self.settleTime_label = QLabel(self.main_layout)
+        self.settleTime_label.setObjectName(u"settleTime_label")
+
+        self.acquisition_layout.addWidget(self.settleTime_label, 2, 0, 1, 1)
+
+        self.settleTime_spinBox = QSpinBox(self.main_layout)
+        self.settleTime_spinBox.setObjectName(u"settleTime_spinBox")
+        self.settleTime_spinBox.setMinimumSize(QSize(0, 30))
+        self.settleTime_spinBox.setFrame(False)
+        self.settleTime_spinBox.setMinimum(0)
+        self.settleTime_spinBox.setMaximum(10000)
+        self.settleTime_spinBox.setSingleStep(10)
+        self.settleTime_spinBox.setValue(0)
+
+        self.acquisition_layout.addWidget(self.settleTime_spinBox, 2, 1, 1, 1)
+
+        self.reduction_label = QLabel(self.main_layout)
+        self.reduction_label.setObjectName(u"reduction_label")
+
+        self.acquisition_layout.addWidget(self.reduction_label, 3, 0, 1, 1)
+
+        self.reduction_comboBox = QComboBox(self.main_layout)
+        self.reduction_comboBox.setObjectName(u"reduction_comboBox")
+        self.reduction_comboBox.setMinimumSize(QSize(0, 30))
+
+        self.acquisition_layout.addWidget(self.reduction_comboBox, 3, 1, 1, 1)
+
+
+        self.menu_layout.addLayout(self.acquisition_layout)
+
+        self.scanPath_layout = QHBoxLayout()
+        self.scanPath_layout.setObjectName(u"scanPath_layout")
+        self.scanPath_label = QLabel(self.main_layout)
+        self.scanPath_label.setObjectName(u"scanPath_label")
+
+        self.scanPath_layout.addWidget(self.scanPath_label)
+
+        self.scanPath_comboBox = QComboBox(self.main_layout)
+        self.scanPath_comboBox.setObjectName(u"scanPath_comboBox")
+        self.scanPath_comboBox.setMinimumSize(QSize(0, 30))
+
+        self.scanPath_layout.addWidget(self.scanPath_comboBox)
+
+
+        self.menu_layout.addLayout(self.scanPath_layout)
+
+        self.flyScan_layout = QHBoxLayout()
+        self.flyScan_layout.setObjectName(u"flyScan_layout")
+        self.flyscan_checkBox = QCheckBox(self.main_layout)
+        self.flyscan_checkBox.setObjectName(u"flyscan_checkBox")
+
+        self.flyScan_layout.addWidget(self.flyscan_checkBox)
+
+        self.flyVelocity_spinBox = QDoubleSpinBox(self.main_layout)
+        self.flyVelocity_spinBox.setObjectName(u"flyVelocity_spinBox")
+        self.flyVelocity_spinBox.setMinimumSize(QSize(0, 30))
+        self.flyVelocity_spinBox.setFrame(False)
+        self.flyVelocity_spinBox.setDecimals(2)
+        self.flyVelocity_spinBox.setMinimum(0.010000000000000)
+        self.flyVelocity_spinBox.setMaximum(100.000000000000000)
+        self.flyVelocity_spinBox.setSingleStep(0.500000000000000)
+        self.flyVelocity_spinBox.setValue(5.000000000000000)
+
+        self.flyScan_layout.addWidget(self.flyVelocity_spinBox)
+
+
+        self.menu_layout.addLayout(self.flyScan_layout)
+
+        self.adaptiveScan_layout = QHBoxLayout()
+        self.adaptiveScan_layout.setObjectName(u"adaptiveScan_layout")
+        self.adaptive_checkBox = QCheckBox(self.main_layout)
+        self.adaptive_checkBox.setObjectName(u"adaptive_checkBox")
+
+        self.adaptiveScan_layout.addWidget(self.adaptive_checkBox)
+
+        self.resolution_spinBox = QDoubleSpinBox(self.main_layout)
+        self.resolution_spinBox.setObjectName(u"resolution_spinBox")
+        self.resolution_spinBox.setMinimumSize(QSize(0, 30))
+        self.resolution_spinBox.setFrame(False)
+        self.resolution_spinBox.setDecimals(2)
+        self.resolution_spinBox.setMinimum(0.010000000000000)
+        self.resolution_spinBox.setMaximum(10.000000000000000)
+        self.resolution_spinBox.setSingleStep(0.050000000000000)
+        self.resolution_spinBox.setValue(0.100000000000000)
+
+        self.adaptiveScan_layout.addWidget(self.resolution_spinBox)
+
+
+        self.menu_layout.addLayout(self.adaptiveScan_layout)
+
+        self.sparseScan_layout = QHBoxLayout()
+        self.sparseScan_layout.setObjectName(u"sparseScan_layout")
+        self.sparse_checkBox = QCheckBox(self.main_layout)
+        self.sparse_checkBox.setObjectName(u"sparse_checkBox")
+
+        self.sparseScan_layout.addWidget(self.sparse_checkBox)
+
+        self.sparse_spinBox = QSpinBox(self.main_layout)
+        self.sparse_spinBox.setObjectName(u"sparse_spinBox")
+        self.sparse_spinBox.setMinimumSize(QSize(0, 30))
+        self.sparse_spinBox.setFrame(False)
+        self.sparse_spinBox.setMinimum(5)
+        self.sparse_spinBox.setMaximum(100)
+        self.sparse_spinBox.setSingleStep(5)
+        self.sparse_spinBox.setValue(25)
+
+        self.sparseScan_layout.addWidget(self.sparse_spinBox)
+
+
+        self.menu_layout.addLayout(self.sparseScan_layout)
+
+        self.verticalSpacer_5 = QSpacerItem(20, 10, QSizePolicy.Minimum, QSizePolicy.Fixed)
+
+        self.menu_layout.addItem(self.verticalSpacer_5)
+
+        self.scan_button = QPushButton(self.main_layout)
+        self.scan_button.setObjectName(u"scan_button")
+        self.scan_button.setMinimumSize(QSize(0, 70))
+        self.scan_button.setFont(font3)
+
+        self.menu_layout.addWidget(self.scan_button)
+
+        self.verticalSpacer_4 = QSpacerItem(20, 10, QSizePolicy.Minimum, QSizePolicy.Fixed)
+
+        self.menu_layout.addItem(self.verticalSpacer_4)
+
+        self.move_to_button = QPushButton(self.main_layout)
+        self.move_to_button.setObjectName(u"move_to_button")
+
+        self.menu_layout.addWidget(self.move_to_button)
+
+        self.resume_button = QPushButton(self.main_layout)
+        self.resume_button.setObjectName(u"resume_button")
+
+        self.menu_layout.addWidget(self.resume_button)
+
+        self.label_timing = QLabel(self.main_layout)
+        self.label_timing.setObjectName(u"label_timing")
+        self.label_timing.setFont(font3)
+
+        self.menu_layout.addWidget(self.label_timing)
+
+        self.timing_label = QLabel(self.main_layout)
+        self.timing_label.setObjectName(u"timing_label")
+        font5 = QFont()
+        font5.setFamilies([u"Monospace"])
+        font5.setPointSize(8)
+        self.timing_label.setFont(font5)
+
+        self.menu_layout.addWidget(self.timing_label)
+
+        self.verticalSpacer_2 = QSpacerItem(20, 20, QSizePolicy.Minimum, QSizePolicy.MinimumExpanding)
+
+        self.menu_layout.addItem(self.verticalSpacer_2)
+
+        self.horizontalLayout_3 = QHBoxLayout()
+        self.horizontalLayout_3.setObjectName(u"horizontalLayout_3")
+        self.save_button = QPushButton(self.main_layout)
+        self.save_button.setObjectName(u"save_button")
+
+        self.horizontalLayout_3.addWidget(self.save_button)
+
+        self.saveFormat_comboBox = QComboBox(self.main_layout)
+        self.saveFormat_comboBox.setObjectName(u"saveFormat_comboBox")
+
+        self.horizontalLayout_3.addWidget(self.saveFormat_comboBox)
+
+        self.horizontalSpacer_2 = QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum)
+
+        self.horizontalLayout_3.addItem(self.horizontalSpacer_2)
+
+        self.AutosaveCheckBox = QCheckBox(self.main_layout)
+        self.AutosaveCheckBox.setObjectName(u"AutosaveCheckBox")
+        self.AutosaveCheckBox.setChecked(True)
+
+        self.horizontalLayout_3.addWidget(self.AutosaveCheckBox)
+
+
+        self.menu_layout.addLayout(self.horizontalLayout_3)
+
+
+        self.horizontalLayout.addLayout(self.menu_layout)
+
+        self.horizontalLayout.setStretch(0, 1)
+        MainWindow.setCentralWidget(self.main_layout)
+        self.statusbar = QStatusBar(MainWindow)
+        self.statusbar.setObjectName(u"statusbar")
+        MainWindow.setStatusBar(self.statusbar)
+
+        self.retranslateUi(MainWindow)
+
+        QMetaObject.connectSlotsByName(MainWindow)
+    # setupUi
+
+    def retranslateUi(self, MainWindow):
+        MainWindow.setWindowTitle(QCoreApplication.translate("MainWindow", u"MainWindow", None))
+        self.connectsnom.setText(QCoreApplication.translate("MainWindow", u"Connect neaSNOM", None))
+        self.disconnectsnom.setText(QCoreApplication.translate("MainWindow", u"Disconnect neaSNOM", None))
+        self.display_label.setText(QCoreApplication.translate("MainWindow", u"Display", None))
+        self.choose_file_button.setText(QCoreApplication.translate("MainWindow", u"Load file", None))
+        self.datascrolling_label.setText(QCoreApplication.translate("MainWindow", u"Z slice", None))
+        self.choose_channel_label.setText(QCoreApplication.translate("MainWindow", u"Channel", None))
+#if QT_CONFIG(tooltip)
+        self.focus_checkBox.setToolTip(QCoreApplication.translate("MainWindow", u"Peak, centroid, FWHM and Gaussian fit of the spot in every Z plane", None))
+#endif // QT_CONFIG(tooltip)
+        self.focus_checkBox.setText(QCoreApplication.translate("MainWindow", u"Focus analysis", None))
+        self.focus_label.setText("")
+#if QT_CONFIG(tooltip)
+        self.regrid_checkBox.setToolTip(QCoreApplication.translate("MainWindow", u"Interpolate the channels from the measured mirror positions onto the nominal grid; adds the position error maps dX, dY, dZ and gap", None))
+#endif // QT_CONFIG(tooltip)
+        self.regrid_checkBox.setText(QCoreApplication.translate("MainWindow", u"Regrid positions", None))
+        self.regrid_label.setText("")
+#if QT_CONFIG(tooltip)
+        self.sparseSamples_checkBox.setToolTip(QCoreApplication.translate("MainWindow", u"Mark the measured pixels of a sparse scan; the others are reconstructed", None))
+#endif // QT_CONFIG(tooltip)
+        self.sparseSamples_checkBox.setText(QCoreApplication.translate("MainWindow", u"Show samples", None))
+        self.sparseSamples_label.setText("")
+        self.colourScale_label.setText(QCoreApplication.translate("MainWindow", u"Colour scale", None))
+#if QT_CONFIG(tooltip)
+        self.colourScale_comboBox.setToolTip(QCoreApplication.translate("MainWindow", u"Levels of the displayed plane, of the whole Z stack, or of the 1st to 99th percentile of the stack", None))
+#endif // QT_CONFIG(tooltip)
+        self.mapping_label.setText(QCoreApplication.translate("MainWindow", u"Map", None))
+        self.connect_snom_button.setText(QCoreApplication.translate("MainWindow", u"Connect neaSNOM", None))
+        self.label_ScanSize.setText(QCoreApplication.translate("MainWindow", u"Scan size [\u03bcm]", None))
+        self.label_sizeX.setText(QCoreApplication.translate("MainWindow", u"X", None))
+        self.label_sizeZ.setText(QCoreApplication.translate("MainWindow", u"Z", None))
+        self.label_sizeX_2.setText(QCoreApplication.translate("MainWindow", u"Y", None))
+        self.linkSizeButton.setText(QCoreApplication.translate("MainWindow", u"Link", None))
+        self.label_6.setText(QCoreApplication.translate("MainWindow", u"Step size [\u03bcm]", None))
+        self.stepZ_label.setText(QCoreApplication.translate("MainWindow", u"Z", None))
+        self.stepX_label.setText(QCoreApplication.translate("MainWindow", u"X", None))
+        self.stepY_label.setText(QCoreApplication.translate("MainWindow", u"Y", None))
+        self.linkStepSizeButton.setText(QCoreApplication.translate("MainWindow", u"Link", None))
+        self.label_acquisition.setText(QCoreApplication.translate("MainWindow", u"Acquisition", None))
+        self.samplingTime_label.setText(QCoreApplication.translate("MainWindow", u"Sampling", None))
+        self.samplingTime_spinBox.setSuffix(QCoreApplication.translate("MainWindow", u" ms", None))
+        self.samples_label.setText(QCoreApplication.translate("MainWindow", u"Samples", None))
+        self.settleTime_label.setText(QCoreApplication.translate("MainWindow", u"Settle", None))
+        self.settleTime_spinBox.setSuffix(QCoreApplication.translate("MainWindow", u" ms", None))
+        self.reduction_label.setText(QCoreApplication.translate("MainWindow", u"Reduction", None))
+        self.scanPath_label.setText(QCoreApplication.translate("MainWindow", u"Path", None))
+        self.flyscan_checkBox.setText(QCoreApplication.translate("MainWindow", u"Fly scan", None))
+        self.flyVelocity_spinBox.setSuffix(QCoreApplication.translate("MainWindow", u" \u03bcm/s", None))
+#if QT_CONFIG(tooltip)
+        self.adaptive_checkBox.setToolTip(QCoreApplication.translate("MainWindow", u"Refine the scan around the maximum of the displayed channel", None))
+#endif // QT_CONFIG(tooltip)
+        self.adaptive_checkBox.setText(QCoreApplication.translate("MainWindow", u"Adaptive", None))
+        self.resolution_spinBox.setSuffix(QCoreApplication.translate("MainWindow", u" \u03bcm", None))
+#if QT_CONFIG(tooltip)
+        self.sparse_checkBox.setToolTip(QCoreApplication.translate("MainWindow", u"Step scans measure only this fraction of the pixels and reconstruct the others", None))
+#endif // QT_CONFIG(tooltip)
+        self.sparse_checkBox.setText(QCoreApplication.translate("MainWindow", u"Sparse", None))
+        self.sparse_spinBox.setSuffix(QCoreApplication.translate("MainWindow", u" %", None))
+        self.scan_button.setText(QCoreApplication.translate("MainWindow", u"SCAN", None))
+        self.move_to_button.setText(QCoreApplication.translate("MainWindow", u"Move to", None))
+#if QT_CONFIG(tooltip)
+        self.resume_button.setToolTip(QCoreApplication.translate("MainWindow", u"Continue an interrupted scan from its first incomplete row", None))
+#endif // QT_CONFIG(tooltip)
+        self.resume_button.setText(QCoreApplication.translate("MainWindow", u"Resume scan", None))
+        self.label_timing.setText(QCoreApplication.translate("MainWindow", u"Scan timing", None))
+#if QT_CONFIG(tooltip)
+        self.timing_label.setToolTip(QCoreApplication.translate("MainWindow", u"Mean and 95th percentile time per pixel (per row in fly scans) of every phase of the running scan", None))
+#endif // QT_CONFIG(tooltip)
+        self.timing_label.setText("")
+        self.save_button.setText(QCoreApplication.translate("MainWindow", u"Save scan", None))
+        self.AutosaveCheckBox.setText(QCoreApplication.translate("MainWindow", u"Autosave", None))
+    # retranslateUi
+